@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Import time benchmark of the gff-toolbox command line.
+
+Each command is started in fresh interpreters, as the CLI runs it (only its help is
+asked for, so nothing but the startup is measured). This is compared with loading
+every command module first, as the CLI did before commands were loaded on demand.
+
+usage:
+    python benchmarks/import_time.py [ <repeats> ]
+
+Copyright 2020 Felipe Almeida (almeidafmarques@gmail.com)
+https://github.com/fmalmeida/gff-toolbox
+
+This file is part of gff-toolbox. gff-toolbox is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by the Free Software Foundation,
+either version 3 of the License, or (at your option) any later version. gff-toolbox is distributed
+in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+details. You should have received a copy of the GNU General Public License along with gff-toolbox.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import sys
+import json
+import subprocess
+
+#######################
+### Benchmark setup ###
+#######################
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Command lines timed, and the dependencies looked for once they are done
+command_lines = [["--version"], ["filter", "-h"], ["overview", "-h"], ["convert", "-h"],
+                 ["mongo-ingest", "-h"], ["mongo-query", "-h"], ["plot", "-h"]]
+heavy_modules = ["pandas", "matplotlib", "dna_features_viewer", "pymongo", "Bio.SeqIO", "BCBio", "numpy"]
+
+# Run in the fresh interpreter: the time from the first import to the end of main()
+timer = """
+import sys, time, json, io, contextlib
+start = time.perf_counter()
+if {eager}:
+    from gfftoolbox.__main__ import commands, load_command
+    for command in commands:
+        load_command(command)
+from gfftoolbox.__main__ import main
+sys.argv = ["gff-toolbox"] + {argv}
+try:
+    with contextlib.redirect_stdout(io.StringIO()):
+        main()
+except SystemExit:
+    pass
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [name for name in {heavy} if name in sys.modules]]))
+"""
+
+##################################
+### Function to time a command ###
+##################################
+def time_command(argv, eager, repeats):
+
+    # The fastest run is kept, the others only differ by noise
+    code = timer.format(eager=eager, argv=json.dumps(argv), heavy=json.dumps(heavy_modules))
+    env  = dict(os.environ, PYTHONPATH=repository + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    runs = [json.loads(subprocess.run([sys.executable, "-c", code], env=env, check=True,
+                                      capture_output=True, text=True).stdout) for n in range(repeats)]
+    return min(seconds for seconds, modules in runs), runs[0][1]
+
+################
+### Def main ###
+################
+def main():
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    print(f"{'command':<20}{'on demand (s)':>15}{'all loaded (s)':>16}{'speedup':>10}   dependencies loaded")
+    for argv in command_lines:
+        lazy, modules = time_command(argv, eager=False, repeats=repeats)
+        eager, _      = time_command(argv, eager=True, repeats=repeats)
+        print(f"{' '.join(argv):<20}{lazy:>15.3f}{eager:>16.3f}{eager / lazy:>9.1f}x   {', '.join(modules) or '-'}")
+
+if __name__ == '__main__':
+    main()
@@ -34,6 +34,7 @@ commands:
     convert                                                 Converts a GFF file into another formats
     plot                                                    Useful command to plot genomic regions from a GFF file
     mongo-ingest                                            Useful to include new or update annotations in existing GFF mongo databases
+    mongo-query                                             Reads back, as GFF or JSON, the features of a region, type or attribute from GFF mongo databases
 
 Use: `gff-toolbox <commmand> -h` to get more help and see examples.
 """
@@ -42,24 +43,34 @@ Use: `gff-toolbox <commmand> -h` to get more help and see examples.
 ### Loading Necessary Packages ###
 ##################################
 from docopt import docopt
-from subprocess import call
+from importlib import import_module
 import sys
+from .version import *
 
 ########################
-### Import functions ###
+### Command registry ###
 ########################
-from .overview import *
-from .filter import *
-from .version import *
-from .convert import *
-from .plot import *
-from .ingest import *
+# Each command lives in its own module, only imported when that command runs. So
+# `gff-toolbox filter` or `--version` never load matplotlib, pymongo, etc.
+commands = {
+    "overview"     : "overview",
+    "filter"       : "filter",
+    "convert"      : "convert",
+    "plot"         : "plot",
+    "mongo-ingest" : "ingest",
+    "mongo-query"  : "query"
+}
+
+def load_command(command):
+    return import_module(f".{commands[command]}", __package__)
 
 ## Defining main
 def main():
     # Parse docopt
     __version__ = get_version()
     arguments = docopt(usage, version=__version__, help=False, options_first=True)
+    if arguments['<command>'] in commands:
+        command = load_command(arguments['<command>'])
 
     ############################
     ### GFF overview command ###
@@ -67,16 +78,18 @@ def main():
     if arguments['<command>'] == 'overview':
         
         # Parse docopt
-        args_overview = docopt(usage_overview, version=__version__, help=False)
+        args_overview = docopt(command.usage_overview, version=__version__, help=False)
         
         if args_overview['overview'] and args_overview['--help']:
-            print(usage_overview.strip())
+            print(command.usage_overview.strip())
 
         elif args_overview['overview'] and args_overview['--input']:
-            overview(args_overview['--input'])
+            command.overview(args_overview['--input'], format=args_overview['--format'], threads=args_overview['--threads'],
+                             sample=args_overview['--sample'], sample_bytes=args_overview['--sample_bytes'], seed=args_overview['--seed'],
+                             cache=not args_overview['--no-cache'], statistics=args_overview['--statistics'])
 
         else:
-            print(usage_overview.strip())
+            print(command.usage_overview.strip())
 
     ##########################
     ### GFF filter command ###
@@ -84,23 +97,27 @@ def main():
     elif arguments['<command>'] == 'filter':
 
         # Parse docopt
-        args_filter = docopt(usage_filter, version=__version__, help=False)
+        args_filter = docopt(command.usage_filter, version=__version__, help=False)
 
         if args_filter['filter'] and args_filter['--help']:
-            print(usage_filter.strip())
+            print(command.usage_filter.strip())
 
         ## Run it
         elif args_filter['filter'] and args_filter['--input'] and not args_filter['--help']:
-            filter(input_gff=args_filter['--input'], column=args_filter['--column'],
-                   pattern=args_filter['--pattern'], sort=args_filter['--sort'],
-                   header=args_filter['--header'], mode=args_filter['--mode'],
-                   chr_limits=args_filter['--chr'], source_limits=args_filter['--source'],
-                   type_limits=args_filter['--type'], start_pos=args_filter['--start'],
-                   end_pos=args_filter['--end'], strand=args_filter['--strand'],
-                   att_file=args_filter['--attributes'])
+            command.filter(input_gff=args_filter['--input'], column=args_filter['--column'],
+                           pattern=args_filter['--pattern'], sort=args_filter['--sort'],
+                           header=args_filter['--header'], mode=args_filter['--mode'],
+                           chr_limits=args_filter['--chr'], source_limits=args_filter['--source'],
+                           type_limits=args_filter['--type'], start_pos=args_filter['--start'],
+                           end_pos=args_filter['--end'], strand=args_filter['--strand'],
+                           att_file=args_filter['--attributes'], chunk_size=args_filter['--chunk_size'],
+                           memory_report=args_filter['--memory_report'], fixed_strings=args_filter['--fixed-strings'],
+                           threads=args_filter['--threads'],
+                           use_index=not args_filter['--no_index'],
+                           output=args_filter['--output'], compress=args_filter['--compress'])
 
         else:
-            print(usage_filter.strip())
+            print(command.usage_filter.strip())
 
     ###########################
     ### GFF convert command ###
@@ -108,19 +125,22 @@ def main():
     elif arguments['<command>'] == 'convert':
 
         # Parse docopt
-        args_convert = docopt(usage_convert, version=__version__, help=False)
+        args_convert = docopt(command.usage_convert, version=__version__, help=False)
 
         if args_convert['convert'] and args_convert['--help']:
-            print(usage_convert.strip())
+            print(command.usage_convert.strip())
 
         ## Run it
         elif args_convert['convert'] and args_convert['--input'] and args_convert['--format'] and not args_convert['--help']:
-            convert(filename=args_convert['--input'], format=args_convert['--format'], fasta=args_convert['--fasta'],
-                    fasta_features=args_convert['--fasta_features'], translation_table=args_convert['--translation_table'],
-                    db_name=args_convert['--db_name'], genome_name=args_convert['--genome_name'], mongo_path=args_convert['--mongo_path'])
+            command.convert(filename=args_convert['--input'], format=args_convert['--format'], fasta=args_convert['--fasta'],
+                            fasta_features=args_convert['--fasta_features'], translation_table=args_convert['--translation_table'],
+                            db_name=args_convert['--db_name'], genome_name=args_convert['--genome_name'], mongo_path=args_convert['--mongo_path'],
+                            output=args_convert['--output'], compress=args_convert['--compress'], twobit=args_convert['--twobit'],
+                            batch_size=args_convert['--batch_size'], background_insert=args_convert['--background_insert'],
+                            mongo_uri=args_convert['--mongo_uri'], timeout=args_convert['--mongo_timeout'])
 
         else:
-            print(usage_convert.strip())
+            print(command.usage_convert.strip())
 
     ###########################
     ### GFF ingest command ###
@@ -128,20 +148,44 @@ def main():
     elif arguments['<command>'] == 'mongo-ingest':
 
         # Parse docopt
-        args_ingest = docopt(usage_ingest, version=__version__, help=False)
+        args_ingest = docopt(command.usage_ingest, version=__version__, help=False)
 
         if args_ingest['mongo-ingest'] and args_ingest['--help']:
-            print(usage_ingest.strip())
+            print(command.usage_ingest.strip())
 
         ## Run it
         elif args_ingest['mongo-ingest'] and args_ingest['--input'] and args_ingest['--db_name'] and not args_ingest['--help']:
             
-            ingestAttributes(filename=args_ingest['--input'], feature_type=args_ingest['--gff_feature'],
-             db_name=args_ingest['--db_name'], collection_name=args_ingest['--genome_name'],
-              mongo_path=args_ingest['--mongo_path'], has_header=True)
+            command.ingest(filename=args_ingest['--input'], feature_type=args_ingest['--gff_feature'],
+                           db_name=args_ingest['--db_name'], genome_name=args_ingest['--genome_name'],
+                           mongo_path=args_ingest['--mongo_path'], batch_size=args_ingest['--batch_size'],
+                           threads=args_ingest['--threads'], mongo_uri=args_ingest['--mongo_uri'],
+                           timeout=args_ingest['--mongo_timeout'])
+
+        else:
+            print(command.usage_ingest.strip())
+
+    #########################
+    ### GFF query command ###
+    #########################
+    elif arguments['<command>'] == 'mongo-query':
+
+        # Parse docopt
+        args_query = docopt(command.usage_query, version=__version__, help=False)
+
+        if args_query['mongo-query'] and args_query['--help']:
+            print(command.usage_query.strip())
+
+        ## Run it
+        elif args_query['mongo-query']:
+            command.mongo_query(db_name=args_query['--db_name'], genome_name=args_query['--genome_name'], mongo_path=args_query['--mongo_path'],
+                                contig=args_query['--contig'], start=args_query['--start'], end=args_query['--end'],
+                                feature_type=args_query['--type'], attributes=args_query['--attribute'], format=args_query['--format'],
+                                output=args_query['--output'], batch_size=args_query['--batch_size'],
+                                mongo_uri=args_query['--mongo_uri'], timeout=args_query['--mongo_timeout'])
 
         else:
-            print(usage_ingest.strip())
+            print(command.usage_query.strip())
 
     ########################
     ### GFF plot command ###
@@ -149,33 +193,33 @@ def main():
     elif arguments['<command>'] == 'plot':
 
         # Parse docopt
-        args_plot = docopt(usage_plot, version=__version__, help=False)
+        args_plot = docopt(command.usage_plot, version=__version__, help=False)
 
         ## Check GFF
         if args_plot['check-gff'] and args_plot['--input']:
-            check_gff(args_plot['--input'])
+            command.check_gff(args_plot['--input'], cache=not args_plot['--no-cache'])
 
         ## Single GFF
         if args_plot['--input'] and args_plot['--start'] and args_plot['--end'] and args_plot['--contig'] and not args_plot['--fofn']:
             print("Executing the pipeline for a single GFF input")
-            single_gff(infile=args_plot['--input'], start=args_plot['--start'], end=args_plot['--end'],
-                       contig=args_plot['--contig'], feature=args_plot['--feature'], coloring=args_plot['--color'],
-                       custom_label=args_plot['--label'], outfile=args_plot['--output'], plot_title=args_plot['--title'],
-                       qualifier=args_plot['--identification'], plot_width=args_plot['--width'], plot_height=args_plot['--height'])
+            command.single_gff(infile=args_plot['--input'], start=args_plot['--start'], end=args_plot['--end'],
+                               contig=args_plot['--contig'], feature=args_plot['--feature'], coloring=args_plot['--color'],
+                               custom_label=args_plot['--label'], outfile=args_plot['--output'], plot_title=args_plot['--title'],
+                               qualifier=args_plot['--identification'], plot_width=args_plot['--width'], plot_height=args_plot['--height'])
             print("Done, checkout the results in {}".format(args_plot['--output']))
 
         ## Multiple GFFs
         elif args_plot['--fofn'] and args_plot['--start'] and args_plot['--end'] and args_plot['--contig']:
             print("Executing the pipeline for multiple GFF inputs")
-            multiple_gff(input_fofn=args_plot['--fofn'], start=args_plot['--start'], end=args_plot['--end'],
-                         contig=args_plot['--contig'], feature=args_plot['--feature'], outfile=args_plot['--output'],
-                         qualifier=args_plot['--identification'], plot_title=args_plot['--title'],
-                         plot_width=args_plot['--width'], plot_height=args_plot['--height'])
+            command.multiple_gff(input_fofn=args_plot['--fofn'], start=args_plot['--start'], end=args_plot['--end'],
+                                 contig=args_plot['--contig'], feature=args_plot['--feature'], outfile=args_plot['--output'],
+                                 qualifier=args_plot['--identification'], plot_title=args_plot['--title'],
+                                 plot_width=args_plot['--width'], plot_height=args_plot['--height'])
             print("Done, checkout the results in {}".format(args_plot['--output']))
 
         ## None
         else:
-            print(usage_plot.strip())
+            print(command.usage_plot.strip())
 
     #####################
     ### Check license ###
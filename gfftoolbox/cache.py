@@ -0,0 +1,102 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import json
+import pickle
+import hashlib
+import tempfile
+from .inputs import is_stdin
+from .outputs import replace_file
+from .version import __version__
+
+##########################
+### Result cache setup ###
+##########################
+# Results of overview and plot check-gff are kept here, one file per input and options,
+# with the GFF indexes built by filter and plot (see gffindex). They are only used
+# while the GFF keeps the same path, size and modification time.
+cache_dir    = os.environ.get("GFFTOOLBOX_CACHE_DIR",
+                              os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "gff-toolbox"))
+cache_suffix = ".pickle"
+index_suffix = ".gffidx"
+
+# Once the cache holds more than this, the least recently used results are removed
+cache_size_limit = 256 * 1024 * 1024
+
+##################################
+### Functions to name a result ###
+##################################
+def cache_key(command, input, options=None):
+
+    # Stdin can't be told apart from one run to the next, it is never cached
+    if is_stdin(input) or not os.path.isfile(str(input)):
+        return None
+
+    stat = os.stat(input)
+    key  = [__version__, command, os.path.realpath(input), stat.st_size, stat.st_mtime_ns, options or {}]
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+def _cache_path(key):
+    return os.path.join(cache_dir, key + cache_suffix)
+
+##################################
+### Function to reuse a result ###
+##################################
+def cached(command, input, compute, options=None, enabled=True):
+
+    # The result of compute() is saved once and given back while the GFF is unchanged.
+    # A broken or unwritable cache never stops the command, the result is just computed.
+    key = cache_key(command, input, options) if enabled else None
+    if key is None:
+        return compute()
+
+    path = _cache_path(key)
+    try:
+        with open(path, 'rb') as handle:
+            result = pickle.load(handle)
+        os.utime(path)
+        return result
+    except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        pass
+
+    result = compute()
+    try:
+        _save(result, path)
+        evict(cache_size_limit)
+    except OSError:
+        pass
+
+    return result
+
+def _save(result, path):
+
+    # Written to a temporary file first, so a broken result is never left behind
+    os.makedirs(cache_dir, exist_ok=True)
+    handle = tempfile.NamedTemporaryFile(mode="wb", dir=cache_dir, delete=False)
+    try:
+        with handle:
+            pickle.dump(result, handle, protocol=pickle.HIGHEST_PROTOCOL)
+        replace_file(handle.name, path)
+    except BaseException:
+        os.remove(handle.name)
+        raise
+
+def evict(limit):
+
+    # Each use touches the result, so the oldest modification times are the least recently used
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith((cache_suffix, index_suffix)) and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    size = sum(entry[1] for entry in entries)
+    for mtime, entry_size, path in sorted(entries):
+        if size <= limit:
+            break
+        try:
+            os.remove(path)
+            size -= entry_size
+        except FileNotFoundError:
+            pass
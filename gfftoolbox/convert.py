@@ -8,9 +8,9 @@ This command uses several python libraries to provide an easy way to convert you
 
 usage:
     gff-toolbox convert [ -h|--help ]
-    gff-toolbox convert [ --input <gff> --fasta <genome_file> --translation_table <int> ] [ --format json|genbank ]
-    gff-toolbox convert [ --input <gff> --fasta <genome_file> --translation_table <int> ] [ --format fasta --fasta_features <feature_types> ]
-    gff-toolbox convert [ --input <gff> --fasta <genome_file> --translation_table <int> ] [--format mongodb --db_name <db_name> --genome_name <genome_name> --mongo_path <mongo_path> ]
+    gff-toolbox convert [ --input <gff> --fasta <genome_file> --translation_table <int> --twobit --output <file> --compress <format> ] [ --format json|genbank ]
+    gff-toolbox convert [ --input <gff> --fasta <genome_file> --translation_table <int> --twobit --output <file> --compress <format> ] [ --format fasta --fasta_features <feature_types> ]
+    gff-toolbox convert [ --input <gff> --fasta <genome_file> --translation_table <int> ] [--format mongodb --db_name <db_name> --genome_name <genome_name> --mongo_path <mongo_path> --mongo_uri <uri> --mongo_timeout <seconds> --batch_size <int> --background_insert ]
 
 options:
                                                       General
@@ -18,18 +18,34 @@ options:
     -h --help                                               Show this screen
     -i, --input=<gff>                                       Input GFF file. GFF file must not contain recuences with it. [Default: stdin].
     -f, --format=<out_format>                               Convert to which format? Options: json, mongodb, fasta-nt, fasta-aa, genbank. [Default: genbank]
-    --fasta=<genome_file>                                   Genomic fasta file to extract features from.
+                                                            JSON is written as JSON Lines: one feature (object) per line, written as it is converted.
+    --fasta=<genome_file>                                   Genomic fasta file to extract features from. It is read through a samtools-like index
+                                                            (<fasta>.fai, plus <fasta>.gzi when bgzipped), built on first use, so only the needed
+                                                            sequences and slices are loaded. Plain gzip is decompressed once to a temporary file.
+                                                            A UCSC .2bit genome can also be given.
+    --twobit                                                Pack the fasta with 2 bits per base (N and lowercase runs kept aside) into <fasta>.2bit,
+                                                            reused by the next conversions while it is newer than the fasta. Sequence names are
+                                                            kept, but not the rest of the fasta headers.
     -t, --translation_table=<int>                           NCBI's translation table number. For converting nucleotide sequences to protein.
                                                             Read more at https://www.ncbi.nlm.nih.gov/Taxonomy/Utils/wprintgc.cgi. [Default: 1]
+    -o, --output=<file>                                     Write the converted features to this file instead of the stdout. Not used for mongodb. [Default: stdout].
+    --compress=<format>                                     Compress the output: none or bgzf (blocked gzip of bgzip, readable by any gzip tool). Blocks are
+                                                            compressed in background threads while the features are converted. [Default: none].
 
                                                 Converting to mongoDB
-                        Obs: converted dbs are automatically added to a db in localhost 27027 ... dependent of mongo shell"
+                        Obs: converted dbs are added to the MongoDB server running in localhost 27017, or to the one of --mongo_uri.
+                        When none is running, a mongod is started with its data in <mongo_path>/<db_name> (mongod must be in the PATH).
+                        Several genomes are loaded at once with comma separated lists of inputs, genome names and (optionally) fastas.
 
     -d, --db_name=<db_name>                                 Name of mongodb database to save results. Only for mongoDB. [Default: annotation_db].
     -n, --genome_name=<genome_name>                         When converting to mongodb this will be used as collection name. [Default: Genome].
     -p, --mongo_path=<mongo_path>                           Where to save your mongoDB? [Default: ./mongodb].
                                                             If you insert a path that already have a mongoDB in it will include (append)
                                                             the GFF as new collection (<genome_name>) in a new or existing DB (<db_name>).
+    --mongo_uri=<uri>                                       Use the MongoDB server of this URI (e.g. mongodb://host:27017) instead of the local one.
+    --mongo_timeout=<seconds>                               How long to wait for the MongoDB server to answer. [Default: 30].
+    -b, --batch_size=<int>                                  Features are inserted as they are converted, this many per (unordered) insert. [Default: 1000].
+    --background_insert                                     Insert each batch in a background thread while the next one is converted.
 
                                                 Converting to FASTA
 
@@ -54,6 +70,10 @@ $ gff-toolbox convert -i Kp_ref.gff -f json --fasta Kpneumoniae_genome.fasta
 
 $ gff-toolbox convert --format mongodb -i Kp_ref.gff --fasta Kpneumoniae_genome.fasta -t 11
 
+    ## Loading two genomes, as two collections, with a single connection
+
+$ gff-toolbox convert --format mongodb -i Kp_ref.gff,Ec_ref.gff --genome_name Kp,Ec --fasta Kp_genome.fasta,Ec_genome.fasta -t 11
+
     ## Get CDS sequences from GFF to protein fasta
 
 $ gff-toolbox convert -i Kp_ref.gff -f fasta-aa --fasta Kpneumoniae_genome.fasta -t 11
@@ -77,17 +97,20 @@ import os
 import re
 import time
 import tempfile
-from collections import namedtuple
+from collections import namedtuple, Counter
 import gzip
 import urllib.request, urllib.parse, urllib.error
 import json
-import pymongo
-from pymongo import MongoClient
 from BCBio import GFF
 from Bio import SeqIO
 from io import StringIO
-import binascii
+from contextlib import nullcontext
 import pathlib
+from .inputs import gzip_opener, limit_lines
+from .twobit import genome_opener
+from .translate import translate_batch, translation_batch_size
+from .outputs import output_opener, compress_formats, write_json_lines
+from .features import parse_features, feature_nest, flatten
 
 ######################################
 ### GFF columns names -- immutable ###
@@ -124,26 +147,23 @@ def att_to_dict(attributes):
 ### Useful functions ###
 ########################
 
-# Check for stdin
-def stdin_checker(input):
-    # Checking for stdin
-    if input == "stdin":
-        tmp = tempfile.NamedTemporaryFile(mode = "w+t", delete = False) # Create tmp file to work as input
-        temp_file = open(tmp.name, 'w+t')
-        for line in sys.stdin:
-            temp_file.writelines(f"{line}")
-
-        temp_file.seek(0)
-        input = tmp.name
-
-    else:
-        pass
-
-    return input
-
 # Print fasta format
-def fasta_printer(id, seq):
-    print(f">{id}\n{seq}")
+def fasta_printer(id, seq, output=sys.stdout):
+    output.write(f">{id}\n{seq}\n")
+
+# Print, in order, the fasta of features whose sequences are translated together
+def fasta_batch_printer(batch, translation_table, output=sys.stdout):
+    proteins = translate_batch([seq for id, seq in batch], translation_table)
+    for (id, seq), protein in zip(batch, proteins):
+        fasta_printer(id, protein, output)
+    batch.clear()
+
+# Translate, together, the sequences of JSON features
+def json_batch_translator(batch, translation_table):
+    proteins = translate_batch([feature["sequence"] for feature in batch], translation_table)
+    for feature, protein in zip(batch, proteins):
+        feature["sequence"] = protein
+    batch.clear()
 
 # Get feature identifier
 def tag_getter(record, seq):
@@ -154,12 +174,19 @@ def tag_getter(record, seq):
 
     return tag
 
-# Open gzipped files
-def gzip_opener(input, mode_in):
-    if  binascii.hexlify(open(input, 'rb').read(2)) == b"1f8b" or input.endswith(".gz"):
-        return gzip.open(input, mode=mode_in)
-    else:
-        return open(input, mode=mode_in)
+# Split the GFF by sequence, so each one is parsed by BCBio (and its sequence read) at a time.
+# All the feature lines are still held in memory, grouped by sequence, which costs about
+# twice the size of the uncompressed GFF. It is much less than BCBio parsing the whole GFF,
+# the largest sequence parsed is what sets the peak memory.
+def gff_sequences(input):
+    header, lines = [], {}
+    for line in limit_lines(gzip_opener(input, "rt")):
+        if line.startswith("#") or not line.strip():
+            header.append(line)
+        else:
+            lines.setdefault(line.split('\t', 1)[0].strip(), []).append(line)
+
+    return header, lines
 
 # Remove nest from GFF
 def _flatten_features(rec):
@@ -181,59 +208,86 @@ def _flatten_features(rec):
         rec.features = out
         return rec
 
+# Features of a sequence, nest made flat, as (tag, type, start, end) with the 0-based start.
+# Compact features are used, unless their nest needs BCBio (inferred parents, GFF2, etc).
+def flat_features(seqid, text):
+    parsed   = parse_features(text)
+    toplevel = feature_nest(parsed[0]) if parsed != None else None
+    if toplevel == None:
+        for seq in GFF.parse(StringIO(text)):
+            for rec in _flatten_features(seq).features:
+                yield tag_getter(rec, seq=seq), rec.type, rec.location.start, rec.location.end
+    else:
+        for feature in flatten(toplevel):
+            yield feature.id or f"{feature.type}_{seqid}:{feature.start - 1}-{feature.end}", feature.type, feature.start - 1, feature.end
+
 #######################
 ### Convert to JSON ###
 #######################
-def gff2json(filename, fasta, translation_table):
-
-    if fasta != None:
-        genome = SeqIO.to_dict(SeqIO.parse(gzip_opener(fasta, "rt"), "fasta"))
+def gff2json(filename, fasta, translation_table, twobit=False):
 
+    # Features are given one at a time, as dicts, in the order of the GFF
     gff_dict = {} # Initialize gff as dict
-    final    = [] # Final list for JSON
+    pending  = [] # Features waiting for the proteins of their batch
+    batch    = [] # CDS/proteins waiting to be translated
 
     # Open
-    contents = gzip_opener(stdin_checker(filename), "rt")
-
-    for line in contents:
-        if line.startswith("#"): continue
-        parts = line.strip().split("\t")
-        #If this fails, the file format is not standard-compatible
-        assert len(parts) == len(gff_cols)
-        #Separate Values
-        rec        = parts[0]
-        source     = parts[1]
-        feature    = parts[2]
-        start      = parts[3]
-        end        = parts[4]
-        score      = parts[5]
-        strand     = parts[6]
-        phase      = parts[7]
-        attributes = att_to_dict(parts[8])
-
-        if not bool(re.search("region", str(feature.lower()))):
-
-            # Check sequence
-            if fasta != None:
-                contig = genome[rec].seq
-                seq    = contig[int(start)-1:int(end)] # the first base in biopython is 0, therefore we must diminish the start
-                if bool(re.search("cds|protein", str(feature.lower()))):
-                    ft_seq = seq.translate(table=translation_table)
+    contents = gzip_opener(filename, "rt")
+
+    # Sequences are read from the indexed FASTA, only the slices of the features
+    with (genome_opener(fasta, twobit) if fasta != None else nullcontext()) as genome:
+        for line in contents:
+            if line.startswith("#"): continue
+            parts = line.strip().split("\t")
+            #If this fails, the file format is not standard-compatible
+            assert len(parts) == len(gff_cols)
+            #Separate Values
+            rec        = parts[0]
+            source     = parts[1]
+            feature    = parts[2]
+            start      = parts[3]
+            end        = parts[4]
+            score      = parts[5]
+            strand     = parts[6]
+            phase      = parts[7]
+            attributes = att_to_dict(parts[8])
+
+            if not bool(re.search("region", str(feature.lower()))):
+
+                # Check sequence
+                if fasta != None:
+                    seq = genome.fetch(rec, int(start)-1, int(end)) # the first base in biopython is 0, therefore we must diminish the start
+
+                    gff_dict = {
+                        "recid"     : rec,
+                        "source"    : source,
+                        "type"      : feature,
+                        "start"     : start,
+                        "end"       : end,
+                        "score"     : score,
+                        "strand"    : strand,
+                        "phase"     : phase,
+                        "attributes": attributes,
+                        "sequence"  : seq
+                    }
+
+                    # Proteins are translated many at a time, their place in the output is kept
+                    if bool(re.search("cds|protein", str(feature.lower()))):
+                        batch.append(gff_dict)
+                        if len(batch) >= translation_batch_size:
+                            json_batch_translator(batch, translation_table)
                 else:
-                    ft_seq = seq
-
-                gff_dict = {
-                    "recid"     : rec,
-                    "source"    : source,
-                    "type"      : feature,
-                    "start"     : start,
-                    "end"       : end,
-                    "score"     : score,
-                    "strand"    : strand,
-                    "phase"     : phase,
-                    "attributes": attributes,
-                    "sequence"  : str(ft_seq)
-                }
+                    gff_dict = {
+                        "recid"     : rec,
+                        "source"    : source,
+                        "type"      : feature,
+                        "start"     : start,
+                        "end"       : end,
+                        "score"     : score,
+                        "strand"    : strand,
+                        "phase"     : phase,
+                        "attributes": attributes
+                    }
             else:
                 gff_dict = {
                     "recid"     : rec,
@@ -246,37 +300,30 @@ def gff2json(filename, fasta, translation_table):
                     "phase"     : phase,
                     "attributes": attributes
                 }
-        else:
-            gff_dict = {
-                "recid"     : rec,
-                "source"    : source,
-                "type"      : feature,
-                "start"     : start,
-                "end"       : end,
-                "score"     : score,
-                "strand"    : strand,
-                "phase"     : phase,
-                "attributes": attributes
-            }
-
-
-        final.append(gff_dict)
-
-    final = json.dumps(final, indent=4) # Converts to string
-    return final
+
+
+            pending.append(gff_dict)
+            if len(pending) >= translation_batch_size:
+                json_batch_translator(batch, translation_table)
+                yield from pending
+                pending.clear()
+
+    json_batch_translator(batch, translation_table)
+    yield from pending
 
 ##########################
 ### Convert to mongoDB ###
 ##########################
-def gff2mongo(filename, db_name, collection_name, mongo_path, fasta, translation_table):
+def gff2mongo(filename, db_name, collection_name, mongo_path, fasta, translation_table, batch_size=1000, background=False,
+              uri=None, timeout=None):
 
-    # Start mongo
-    current = pathlib.Path().absolute()
-    os.system(f"mkdir -p {mongo_path} {mongo_path}/{db_name}")
-    os.system(f"cd {mongo_path} && mongod --dbpath {db_name} --logpath mongo_{collection_name}.log &")
+    # Imported here, so the other formats never load pymongo
+    from .mongo import insert_batches, mongo_client, mongo_timeout, create_feature_indexes
+    if timeout == None:
+        timeout = mongo_timeout
 
-    # Create connection
-    client = MongoClient()
+    # Connection shared by every genome of the run (the server is started if needed)
+    client = mongo_client(uri=uri, mongo_path=mongo_path, db_name=db_name, log_name=f"mongo_{collection_name}", timeout=timeout)
 
     # Create Database
     db = client[db_name]
@@ -284,51 +331,51 @@ def gff2mongo(filename, db_name, collection_name, mongo_path, fasta, translation
     # Create Collection
     collection = db[collection_name]
 
-    # Save JSON as tmp.file
-    tmp = tempfile.NamedTemporaryFile(mode = "w+t", delete = False) # Create tmp file to work as input
-    temp_file = open(tmp.name, 'w+t')
-    for line in gff2json(filename=filename, fasta=fasta, translation_table=translation_table).strip():
-        temp_file.writelines(f"{line}")
-
-    temp_file.seek(0)
-    input = tmp.name
+    # Coordinates are stored as integers, so regions can be queried
+    keys = Counter()
+    def documents():
+        for feature in gff2json(filename=filename, fasta=fasta, translation_table=translation_table):
+            feature["start"], feature["end"] = int(feature["start"]), int(feature["end"])
+            keys.update(feature["attributes"].keys())
+            yield feature
 
-    # Add document to collection
-    contents = json.load(open(input))
-    collection.insert_many(contents)
-
-    # Close
-    client.close()
-    os.system(f"cd {current}")
+    # Add the features to collection, in batches, as they are converted.
+    # Indexes are built afterwards, which is faster than keeping them up to date.
+    insert_batches(collection, documents(), batch_size=batch_size, background=background)
+    create_feature_indexes(collection, keys)
 
 ########################
 ### Convert to FASTA ###
 ########################
-def gff2fasta(input, fasta, features, format, translation_table):
-
-    # Parse fasta
-    rec_dict = SeqIO.to_dict(SeqIO.parse(gzip_opener(fasta, "rt"), "fasta"))
-
-    # Read the gff
-    for seq in GFF.parse(gzip_opener(stdin_checker(input), "rt"), base_dict=rec_dict):
-
-        genome = seq.seq
-
-        for rec in _flatten_features(seq).features:
-
-            if bool(re.search("|".join(list(features.split(','))).lower(), str(rec.type.lower()))):
-                tag = tag_getter(rec, seq=seq)
-                if format == "fasta-aa":
-                    fasta_printer(tag, genome[rec.location.start:rec.location.end].translate(table=translation_table))
+def gff2fasta(input, fasta, features, format, translation_table, output=sys.stdout, twobit=False):
+
+    # Lines of the gff grouped by sequence, each one parsed at a time (sorted by id, as BCBio gives them)
+    header, sequences = gff_sequences(input)
+
+    # Only the slices of the features are read from the indexed (or packed) fasta.
+    # Proteins are translated many at a time, and printed in the same order.
+    batch = []
+    with genome_opener(fasta, twobit) as genome:
+        for seqid in sorted(sequences):
+            for tag, type, start, end in flat_features(seqid, "".join(header + sequences[seqid])):
+
+                if bool(re.search("|".join(list(features.split(','))).lower(), str(type.lower()))):
+                    sequence = genome.fetch(seqid, start, end)
+                    if format == "fasta-aa":
+                        batch.append((tag, sequence))
+                        if len(batch) >= translation_batch_size:
+                            fasta_batch_printer(batch, translation_table, output)
+                    else:
+                        fasta_printer(tag, sequence, output)
                 else:
-                    fasta_printer(tag, genome[rec.location.start:rec.location.end])
-            else:
-                pass
+                    pass
+
+    fasta_batch_printer(batch, translation_table, output)
 
 ##########################
 ### Convert to Genbank ###
 ##########################
-def gff2gbk(input, fasta, translation_table):
+def gff2gbk(input, fasta, translation_table, output=sys.stdout, twobit=False):
 
     def _seq_getter(rec, fasta, translation_table):
 
@@ -345,38 +392,94 @@ def gff2gbk(input, fasta, translation_table):
 
         return rec
 
-    genome = SeqIO.to_dict(SeqIO.parse(gzip_opener(fasta, "rt"), "fasta"))
+    # Lines of the gff grouped by sequence, each one parsed at a time (sorted by id, as BCBio gives them)
+    header, sequences = gff_sequences(input)
 
-    for seq in GFF.parse(gzip_opener(stdin_checker(input), "rt"), base_dict=genome):
+    # Only one sequence of the indexed (or packed) fasta is held in memory at a time
+    with genome_opener(fasta, twobit) as genome:
+        for seqid in sorted(set(genome) | set(sequences)):
+            base_dict = {seqid: genome.record(seqid)} if seqid in genome else {}
 
-        seq.annotations["molecule_type"] = "DNA"
+            # Sequences without features are given as they are in the fasta
+            if seqid in sequences:
+                records = GFF.parse(StringIO("".join(header + sequences[seqid])), base_dict=base_dict)
+            else:
+                records = base_dict.values()
 
-        out = []
+            for seq in records:
+
+                seq.annotations["molecule_type"] = "DNA"
+
+                out = []
 
-        for f in _flatten_features(seq).features:
-            record = _seq_getter(f, seq.seq, translation_table)
-            record.name = seq.name
-            out.append(record)
-        seq.features = out
-        SeqIO.write(seq, sys.stdout, "genbank")
+                for f in _flatten_features(seq).features:
+                    record = _seq_getter(f, seq.seq, translation_table)
+                    record.name = seq.name
+                    out.append(record)
+                seq.features = out
+                SeqIO.write(seq, output, "genbank")
 
 ################
 ### Def main ###
 ################
-def convert(filename, format, fasta, fasta_features, translation_table, db_name, genome_name, mongo_path):
+def convert(filename, format, fasta, fasta_features, translation_table, db_name, genome_name, mongo_path, output=None, compress=None,
+            twobit=False, batch_size=1000, background_insert=False, mongo_uri=None, timeout=None):
 
-    if format == "json" :
-        print(gff2json(filename=filename, fasta=fasta, translation_table=translation_table).replace("[", "{").replace("]", "}"))
+    if compress != None and str(compress).lower() not in compress_formats:
+        print(f"""
+Error: --compress must be either 'none' or 'bgzf'. {compress} is incorrect.
+        """)
+
+    elif not str(batch_size).isdigit() or int(batch_size) == 0:
+        print(f"""
+Error: --batch_size must be a positive integer. {batch_size} is incorrect.
+        """)
+
+    elif format == "json" :
+        with output_opener(output, compress) as out:
+            write_json_lines(gff2json(filename=filename, fasta=fasta, translation_table=translation_table,
+                                      twobit=twobit), out)
+
+    elif timeout != None and not str(timeout).replace(".", "", 1).isdigit():
+        print(f"""
+Error: --mongo_timeout must be a number of seconds. {timeout} is incorrect.
+        """)
 
     elif format == "mongodb" :
-        gff2mongo(filename=filename, db_name=db_name, collection_name=genome_name, mongo_path=mongo_path,
-                  fasta=fasta, translation_table=translation_table)
+        from .mongo import close_clients
+
+        # One collection per genome, all through the same connection
+        inputs = str(filename).split(",")
+        names  = str(genome_name).split(",")
+        fastas = [None] * len(inputs) if fasta == None else str(fasta).split(",")
+        if len(fastas) == 1:
+            fastas = fastas * len(inputs)
+
+        if len(names) != len(inputs) or len(fastas) != len(inputs):
+            print(f"""
+Error: --input, --genome_name and --fasta must have the same number of comma separated values.
+        """)
+            return
+
+        try:
+            for input, name, genome in zip(inputs, names, fastas):
+                gff2mongo(filename=input, db_name=db_name, collection_name=name, mongo_path=mongo_path,
+                          fasta=genome, translation_table=translation_table, batch_size=int(batch_size),
+                          background=background_insert, uri=mongo_uri, timeout=None if timeout == None else float(timeout))
+        except ConnectionError as error:
+            print(f"""
+Error: {error}.
+        """)
+        finally:
+            close_clients()
 
     elif format == "fasta-nt" or format == "fasta-aa":
-        gff2fasta(input=filename, fasta=fasta, features=fasta_features,
-                  format=format, translation_table=translation_table)
+        with output_opener(output, compress) as out:
+            gff2fasta(input=filename, fasta=fasta, features=fasta_features,
+                      format=format, translation_table=translation_table, output=out, twobit=twobit)
     elif format == "genbank":
-        gff2gbk(input=filename, fasta=fasta, translation_table=translation_table)
+        with output_opener(output, compress) as out:
+            gff2gbk(input=filename, fasta=fasta, translation_table=translation_table, output=out, twobit=twobit)
 
     else:
         print(f"""
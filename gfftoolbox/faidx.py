@@ -0,0 +1,255 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import gzip
+import struct
+import tempfile
+from bisect import bisect_right
+from contextlib import contextmanager
+from Bio import bgzf
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from .inputs import is_stdin, is_bgzf, gzip_opener, GZIP_MAGIC
+
+################################
+### FASTA index (.fai) setup ###
+################################
+# Same files as 'samtools faidx': <fasta>.fai, plus <fasta>.gzi for bgzipped FASTA.
+# They are reused while they are newer than the FASTA, otherwise they are rebuilt.
+fai_suffix = ".fai"
+gzi_suffix = ".gzi"
+
+# Line width used when a FASTA has to be rewritten to be indexed
+fasta_line_width = 80
+
+#############################################
+### Function to build the .fai of a FASTA ###
+#############################################
+def build_fai(handle):
+
+    # One entry per sequence: name, length, offset of the first base,
+    # bases per line and bytes per line (newline included)
+    entries  = {}
+    name     = None
+    ended    = False
+    position = 0
+    for line in handle:
+        size = len(line)
+
+        if line.startswith(b">"):
+            words = line[1:].split()
+            name  = words[0].decode() if len(words) > 0 else ""
+            ended = False
+            entries[name] = [0, position + size, 0, 0]
+
+        elif name is not None:
+            entry = entries[name]
+            bases = len(line.rstrip(b"\r\n"))
+
+            # Every line but the last must have the same width, as samtools requires
+            if bases > 0 and (ended or (entry[2] > 0 and (bases > entry[2] or (bases == entry[2] and size != entry[3])))):
+                raise ValueError(f"Different line length in sequence '{name}'")
+            if entry[2] == 0:
+                if bases == 0:
+                    raise ValueError(f"Empty line at the start of sequence '{name}'")
+                entry[2], entry[3] = bases, size
+            ended = ended or bases < entry[2]
+            entry[0] += bases
+
+        position += size
+
+    return {name: tuple(entry) for name, entry in entries.items()}
+
+def write_fai(entries, path):
+    with open(path, 'wt') as handle:
+        for name, (length, offset, linebases, linewidth) in entries.items():
+            handle.write(f"{name}\t{length}\t{offset}\t{linebases}\t{linewidth}\n")
+
+def read_fai(path):
+    entries = {}
+    with open(path, 'rt') as handle:
+        for line in handle:
+            parts = line.rstrip("\r\n").split("\t")
+            entries[parts[0]] = tuple(int(value) for value in parts[1:5])
+    return entries
+
+#################################################
+### Functions for the BGZF block index (.gzi) ###
+#################################################
+def build_gzi(path):
+
+    # Compressed and uncompressed offsets where each block starts (the first one is implicit)
+    with open(path, 'rb') as handle:
+        return [(raw_start, data_start) for raw_start, raw_length, data_start, data_length in bgzf.BgzfBlocks(handle)
+                if raw_start > 0 and data_length > 0]
+
+def write_gzi(blocks, path):
+    with open(path, 'wb') as handle:
+        handle.write(struct.pack("<Q", len(blocks)))
+        for raw_start, data_start in blocks:
+            handle.write(struct.pack("<QQ", raw_start, data_start))
+
+def read_gzi(path):
+    with open(path, 'rb') as handle:
+        data = handle.read()
+    count, = struct.unpack_from("<Q", data, 0)
+    values = struct.unpack_from(f"<{2 * count}Q", data, 8)
+    return list(zip(values[0::2], values[1::2]))
+
+def _fresh(path, input):
+    return os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(input)
+
+##########################
+### Indexed FASTA file ###
+##########################
+class FastaIndex:
+    """Random access to the sequences of a plain or bgzipped FASTA through its .fai.
+
+    Only the bytes of the requested slices are read, the genome is never loaded as a whole.
+    """
+
+    def __init__(self, path, save=True):
+        self.path = str(path)
+        self.bgzf = is_bgzf(self.path)
+
+        # Index files are reused, or built and kept for the next runs when possible
+        fai, gzi = self.path + fai_suffix, self.path + gzi_suffix
+        if _fresh(fai, self.path):
+            self.entries = read_fai(fai)
+        else:
+            with (gzip.open(self.path, 'rb') if self.bgzf else open(self.path, 'rb')) as handle:
+                self.entries = build_fai(handle)
+            _try_save(write_fai, self.entries, fai, save)
+
+        self.blocks = [(0, 0)]
+        if self.bgzf:
+            if _fresh(gzi, self.path):
+                self.blocks += read_gzi(gzi)
+            else:
+                blocks = build_gzi(self.path)
+                _try_save(write_gzi, blocks, gzi, save)
+                self.blocks += blocks
+        self.block_starts = [data_start for raw_start, data_start in self.blocks]
+
+        self.handle = bgzf.BgzfReader(self.path, 'rb') if self.bgzf else open(self.path, 'rb')
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def length(self, name):
+        return self.entries[name][0]
+
+    def _read(self, position, size):
+
+        # Uncompressed position to a virtual offset, from the block holding it
+        if self.bgzf:
+            raw_start, data_start = self.blocks[bisect_right(self.block_starts, position) - 1]
+            self.handle.seek(bgzf.make_virtual_offset(raw_start, position - data_start))
+        else:
+            self.handle.seek(position)
+        return self.handle.read(size)
+
+    def fetch(self, name, start=0, end=None):
+
+        # Bases [start, end) of a sequence (0-based, as python slices)
+        length, offset, linebases, linewidth = self.entries[name]
+        start = min(max(int(start), 0), length)
+        end   = length if end is None else min(max(int(end), start), length)
+        if start == end:
+            return ""
+
+        first = offset + (start // linebases) * linewidth + start % linebases
+        last  = offset + ((end - 1) // linebases) * linewidth + (end - 1) % linebases
+        data  = self._read(first, last - first + 1)
+        return data.replace(b"\n", b"").replace(b"\r", b"").decode()
+
+    def description(self, name):
+
+        # The header line ends right before the first base
+        offset = self.entries[name][1]
+        start  = max(offset - 65536, 0)
+        header = self._read(start, offset - start).rstrip(b"\r\n")
+        return header[header.rfind(b"\n") + 1:].decode()[1:].rstrip()
+
+    def record(self, name):
+
+        # Whole sequence as a SeqRecord, named as SeqIO names FASTA records
+        return SeqRecord(Seq(self.fetch(name)), id=name, name=name, description=self.description(name))
+
+    def close(self):
+        self.handle.close()
+
+def _try_save(writer, value, path, save):
+    if save:
+        try:
+            writer(value, path)
+        except OSError:
+            pass
+
+################################################
+### Function to rewrite an unindexable FASTA ###
+################################################
+def _normalised_copy(input, output):
+
+    # Sequences are rewrapped with a single line width, read as a stream
+    with gzip_opener(input, "rt") as handle:
+        pending = ""
+        for line in handle:
+            if line.startswith(">"):
+                if pending:
+                    output.write(pending + "\n")
+                output.write(line if line.endswith("\n") else line + "\n")
+                pending = ""
+                continue
+
+            # Whole lines are written by offset, only the last partial one is kept
+            pending += line.strip()
+            whole   = len(pending) - len(pending) % fasta_line_width
+            for i in range(0, whole, fasta_line_width):
+                output.write(pending[i:i + fasta_line_width] + "\n")
+            pending = pending[whole:]
+
+        if pending:
+            output.write(pending + "\n")
+
+####################
+### FASTA opener ###
+####################
+@contextmanager
+def fasta_opener(input):
+
+    # Plain or bgzipped FASTA files on disk are indexed in place. Stdin,
+    # plain gzip and FASTA with uneven lines are first written to a temporary
+    # plain file (one pass, no sequence held in memory) that is indexed instead.
+    genome = None
+    if not is_stdin(input):
+        with open(input, 'rb') as handle:
+            gzipped = handle.read(2) == GZIP_MAGIC
+        try:
+            if not gzipped or is_bgzf(input):
+                genome = FastaIndex(input)
+        except ValueError:
+            genome = None
+
+    if genome is not None:
+        try:
+            yield genome
+        finally:
+            genome.close()
+        return
+
+    tmp = tempfile.NamedTemporaryFile(mode="wt", prefix="gfftoolbox_", suffix=".fasta", delete=False)
+    try:
+        with tmp:
+            _normalised_copy(input, tmp)
+        genome = FastaIndex(tmp.name, save=False)
+        try:
+            yield genome
+        finally:
+            genome.close()
+    finally:
+        os.remove(tmp.name)
@@ -0,0 +1,237 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import re
+import sys
+import urllib.parse
+import numpy as np
+from collections import Counter
+from Bio.Seq import Seq
+
+##########################
+### Compact GFF models ###
+##########################
+# Strands as BCBio gives them (anything else is None), and as int8 in the batches (None is 0)
+strand_map = {"+": 1, "-": -1}
+
+# Attributes are GFF3 (key=value) when the first one matches, as BCBio tells them apart
+gff3_key = re.compile(r"\w+=")
+
+class Feature:
+    """A GFF feature line, without Biopython objects.
+
+    Sequence, source and type are interned (shared by all the features with the
+    same value) and the 9th column is only parsed, as BCBio does, when asked for.
+    Children are kept in 'sub_features', as in the BCBio SeqFeatures.
+    """
+
+    __slots__ = ["seqid", "source", "type", "start", "end", "score", "strand", "phase", "attributes",
+                 "number", "sub_features", "_qualifiers"]
+
+    def __init__(self, parts, number):
+        self.seqid      = sys.intern(parts[0])
+        self.source     = sys.intern(parts[1])
+        self.type       = sys.intern(parts[2])
+        self.start      = int(parts[3])
+        self.end        = int(parts[4])
+        self.score      = parts[5]
+        self.strand     = strand_map.get(parts[6])
+        self.phase      = parts[7]
+        self.attributes = parts[8] if len(parts) > 8 else None
+        self.number     = number
+        self.sub_features = []
+        self._qualifiers  = None
+
+    @property
+    def qualifiers(self):
+
+        # Same as the SeqFeature qualifiers of BCBio: lists of values, with the source, score and phase
+        if self._qualifiers is None:
+            quals = _split_attributes(self.attributes) if self.attributes is not None else {}
+            for key, value in [("source", self.source), ("score", self.score), ("phase", self.phase)]:
+                if value and value != ".":
+                    quals.setdefault(key, []).append(value)
+            self._qualifiers = dict(quals)
+        return self._qualifiers
+
+    def attribute(self, key):
+
+        # Values of one attribute. Only quoted values and " ; " separators need all the 9th column parsed
+        if self.attributes is None or key not in self.attributes:
+            return []
+        if self._qualifiers is None and '"' not in self.attributes and " ; " not in self.attributes:
+            return _attribute_values(self.attributes, key)
+        return self.qualifiers.get(key, [])
+
+    @property
+    def id(self):
+        return next(iter(self.attribute("ID")), "")
+
+    @property
+    def parents(self):
+        return self.attribute("Parent")
+
+    def nest(self):
+        # The feature and all its (kept) nest, depth-first
+        yield self
+        for child in self.sub_features:
+            yield from child.nest()
+
+class FeatureBatch:
+    """Columnar form of many features: coordinates and strands as numpy arrays,
+    so the region and strand filters are tested on all of them at once."""
+
+    __slots__ = ["features", "start", "end", "strand"]
+
+    def __init__(self, features):
+        self.features = list(features)
+        self.start  = np.fromiter((feature.start for feature in self.features), dtype=np.int64, count=len(self.features))
+        self.end    = np.fromiter((feature.end for feature in self.features), dtype=np.int64, count=len(self.features))
+        self.strand = np.fromiter((feature.strand or 0 for feature in self.features), dtype=np.int8, count=len(self.features))
+
+    def __len__(self):
+        return len(self.features)
+
+    def select(self, mask):
+        return [feature for feature, keep in zip(self.features, mask) if keep]
+
+def _split_attributes(attributes):
+
+    # The GFF3 part of the BCBio attribute parser (which is local to its line parser):
+    # values split at commas and unquoted, quoted values with semicolons put back together
+    if attributes[-1] == ";":
+        attributes = attributes[:-1]
+    parts = attributes.split(" ; ")
+    if len(parts) == 1:
+        parts = [part.strip() for part in attributes.split(";")]
+
+    key_vals = []
+    for index, part in enumerate(part.split("=") for part in parts):
+        if index > 0 and len(part) == 1 and part[0].endswith('"') and not part[0].startswith('"'):
+            if key_vals[-1][-1].startswith('"'):
+                key_vals[-1][-1] = "%s; %s" % (key_vals[-1][-1], part[0])
+        else:
+            key_vals.append(part)
+
+    quals = {}
+    for item in key_vals:
+        if len(item) == 2:
+            key, value = item
+        else:
+            assert len(item) == 1, item
+            key, value = item[0], ""
+        values = quals.setdefault(key, [])
+        if len(value) > 0 and value[0] == '"' and value[-1] == '"':
+            values.append(value[1:-1])
+        elif value:
+            values.extend([v for v in value.split(",") if v])
+        else:
+            values.append("true")
+
+    return {key: [urllib.parse.unquote(v) for v in values] for key, values in quals.items()}
+
+def _attribute_values(attributes, key):
+
+    # The values _split_attributes would give to a key, for attributes without quotes
+    values = []
+    for part in attributes.split(";"):
+        name, equal, value = part.strip().partition("=")
+        if name == key:
+            values.extend([urllib.parse.unquote(v) for v in value.split(",") if v] if value else ["true"])
+    return values
+
+#################################################
+### Functions to read features from GFF lines ###
+#################################################
+def parse_features(text):
+
+    # Features of a chunk of GFF lines, and the positions of the other lines (directives,
+    # comments and features without coordinates, which BCBio keeps as record annotations).
+    # None is given when the lines need BCBio itself: GFF2 attributes, broken lines, etc.
+    features, others = [], []
+    for number, line in enumerate(text.splitlines(keepends=True)):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            others.append(number)
+            continue
+
+        parts = stripped.split("\t")
+        if len(parts) < 8:
+            return None
+        if len(parts) > 8 and (parts[8] in ["", "."] or parts[8][0].isspace() or not gff3_key.match(parts[8])):
+            return None
+        if parts[3] in ["", "."] or parts[4] in ["", "."]:
+            others.append(number)
+            continue
+        if not parts[3].isdigit() or not parts[4].isdigit():
+            return None
+
+        features.append(Feature(parts, number))
+
+    return features, others
+
+def feature_nest(features):
+
+    # Top level features, with their children, in the same order BCBio gives them:
+    # features without ID nor Parent, then parents (ID but no Parent), then children
+    # whose parent is not in the lines. None when BCBio would have to infer parents,
+    # remap duplicated IDs or split self references, which is left to BCBio.
+    flat, parents, groups, ids = [], [], {}, Counter()
+    for feature in features:
+        feature.sub_features = []
+        id, parent = feature.id, feature.parents
+        if id:
+            ids[id] += 1
+        if len(parent) > 0:
+            if len(parent) > 1 or id in parent:
+                return None
+            groups.setdefault(parent[0], []).append(feature)
+        elif id:
+            parents.append((id, feature))
+        else:
+            flat.append(feature)
+
+    if any(ids[id] > 1 for id, parent in parents) or any(ids[id] > 1 for id in groups):
+        return None
+
+    def attach(id, feature):
+        for child in groups.pop(id, []):
+            attach(child.id, child)
+            feature.sub_features.append(child)
+
+    for id, parent in parents:
+        attach(id, parent)
+
+    # Children of missing parents are top level, unless many share it (BCBio infers that parent)
+    if any(len(group) > 1 for group in groups.values()):
+        return None
+
+    return flat + [parent for id, parent in parents] + [group[0] for group in groups.values()]
+
+def flatten(features):
+
+    # Each top level feature followed by its nest, a level at a time
+    for feature in features:
+        level = [feature]
+        while len(level) > 0:
+            yield from level
+            level = [child for current in level for child in current.sub_features]
+
+def sequence_lengths(features):
+
+    # Lengths BCBio gives the records: the largest end of their top level features
+    lengths = {}
+    for feature in features:
+        lengths[feature.seqid] = max(lengths.get(feature.seqid, 1), feature.end)
+    return lengths
+
+##############################################
+### Function to give Biopython the records ###
+##############################################
+def restore_lengths(records, lengths):
+
+    # Records parsed from a subset of the lines keep the length they have with all of them
+    for record in records:
+        if record.id in lengths:
+            record.seq = Seq(None, length=lengths[record.id])
+        yield record
@@ -9,8 +9,8 @@ attributes column of the GFF.
 
 usage:
     gff-toolbox filter [-h|--help ]
-    gff-toolbox filter [ --mode loose ] [ --input <gff> ] [ --pattern <string> --column <int> --start <start_position> --end <end_position> --strand <strand> --sort --header ]
-    gff-toolbox filter [ --mode exact ] [ --input <gff> ] [ --chr <chr_limits> --source <source_limits> --type <type_limits> --start <start_position> --end <end_position> --strand <strand> --attributes <file_with_attributes> ]
+    gff-toolbox filter [ --mode loose ] [ --input <gff> ] [ --pattern <string> --column <int> --start <start_position> --end <end_position> --strand <strand> --sort --header --chunk_size <int> --memory_report --fixed-strings --output <file> --compress <format> ]
+    gff-toolbox filter [ --mode exact ] [ --input <gff> ] [ --chr <chr_limits> --source <source_limits> --type <type_limits> --start <start_position> --end <end_position> --strand <strand> --attributes <file_with_attributes> --fixed-strings --threads <int> --no_index --output <file> --compress <format> ]
 
 options:
                                     ##########################
@@ -25,7 +25,15 @@ options:
                                             The loose mode, scans the GFF in a grep-like manner via pandas dataframes in which the user must specify
                                             a pattern and a column to search it. Recommended for simple searches were nest structure is not a must.
                                             The exact mode scans the GFF with Biopython and BCBio packages, treating it as python dictionary. It is
-                                            recommended for more complex searches and complex GFFs, such as nested GFFs. [Default: exact]
+                                            recommended for more complex searches and complex GFFs, such as nested GFFs. The GFF is read one sequence
+                                            at a time, each with all the directives (e.g. ##sequence-region) of the file. Stdin is first copied to a
+                                            temporary file, to be read ahead. [Default: exact]
+
+    -o, --output=<file>                     Write the filtered GFF to this file instead of the stdout [Default: stdout].
+
+    --compress=<format>                     Compress the output: none or bgzf. BGZF is the blocked gzip of bgzip, readable by any gzip tool
+                                            and indexable by tabix or by gff-toolbox itself. Blocks are compressed in background threads
+                                            while the GFF is being filtered. [Default: none].
                                                 
                                     #############################
                                     ### Filter for BOTH modes ###
@@ -51,10 +59,21 @@ options:
     -p, --pattern=<string>                  Pattern to search in the GFF file. Can be a list of patterns separated by commas.
                                             Must be used with the loose mode.
 
+    -F, --fixed-strings                     Interpret --pattern (loose mode) and --source/--type (exact mode) as literal strings instead of regular
+                                            expressions. They are searched all at once with an Aho-Corasick automaton, built once, which is much
+                                            faster for long lists of patterns (e.g. thousands of products).
+
     --sort                                  Sort the GFF by the contig and start position. Be aware, it can disorganize nested gffs.
+                                            Chunks are sorted and merged on disk, thus it works for GFFs larger than the memory.
 
     --header                                Print GFF header (##gff-version 3)? Some programs require this header.
 
+    --chunk_size=<int>                      Number of lines read, filtered and written at a time. Memory usage depends on it,
+                                            not on the size of the GFF. [Default: 100000].
+
+    --memory_report                         Report, in the stderr, the memory used by the GFF columns (categorical and fixed-width integer dtypes)
+                                            compared with the same columns stored as python objects.
+
                                     ##################################################################
                                     ### Exact search mode parameters (Very useful for nested GFFs) ###
                                     ##################################################################
@@ -84,6 +103,16 @@ options:
                                                             desired gene id 2
                                                             ...
 
+    -t, --threads=<int>                     Number of processes used to filter the sequences (chr/contigs) in parallel. The GFF is split by
+                                            sequence and the results are written in the original sequence order. [Default: 1].
+
+    --no_index                              Do not use the GFF index. By default, when filtering a plain or bgzipped (BGZF, as made by bgzip)
+                                            GFF file by chr, source, type, start or end, an index (.gffidx) is saved in the user cache, as the
+                                            overview results, with the byte offsets, coordinates, sources, types and ID/Parent links of its features.
+                                            An index already next to the GFF (<gff>.gffidx) is used first. It is reused while the GFF keeps the same
+                                            size and modification time, thus only the lines (or compressed blocks) that can pass the filters are read.
+                                            Plain gzip files are always read from the start.
+
 
 example:
 
@@ -116,403 +145,504 @@ $ gff-toolbox filter -i Athaliana_ref.gff.gz --attributes atts2.txt --start 5900
 ### Loading Necessary Packages ###
 ##################################
 import sys
-import pandas as pd
-import re
-from BCBio import GFF
-from BCBio.GFF import GFFExaminer
-import subprocess
+import os
+import heapq
 import tempfile
-import binascii
-import gzip
-
-#######################
-### Def error class ###
-#######################
-class Error(Exception):
-    """Base class for other exceptions"""
-    pass
-
-class noChild(Error):
-    """it has no childs"""
-    pass
-
-class goChild(Error):
-    """let's check the child"""
-    pass
-
-###################
-### Stdin Check ###
-###################
-def stdin_checker(input, sys_contents):
-    # Checking for stdin
-    if input == "stdin":
-        tmp = tempfile.NamedTemporaryFile(mode = "w+t", delete = False) # Create tmp file to work as input
-        temp_file = open(tmp.name, 'w')
-        for line in sys_contents:
-            temp_file.writelines(f"{line}")
-
-        temp_file.seek(0)
-        input = tmp.name
-
-    else:
-        pass
-
-    return input
+import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
+from BCBio import GFF
+from .inputs import gzip_opener, spill_stdin, limit_lines, contig_chunks, gff_layout, grouped_lines
+from .matcher import compile_patterns, pattern_matcher, series_matcher
+from .gffindex import load_index, select, indexed_lines
+from .outputs import output_opener, compress_formats
+from .features import FeatureBatch, parse_features, feature_nest, sequence_lengths, restore_lengths
 
-###################
-### Gzip opener ###
-###################
-def gzip_opener(input, mode_in):
-    if  binascii.hexlify(open(input, 'rb').read(2)) == b"1f8b" or input.endswith(".gz"):
-        return gzip.open(input, mode=mode_in)
-    else:
-        return open(input, mode=mode_in)
+######################################
+### GFF columns for the loose mode ###
+######################################
+# Guide: ['Chr', 'Source', 'Type', 'Start', 'End', 'Score', 'Strand', 'Phase', 'Attributes'
+# The repeated, low-cardinality, columns are categorical and coordinates are fixed-width integers
+# (nullable, thus missing coordinates are kept). Coordinates are read as 64-bit integers, since
+# large contigs can go past 4 Gb, and kept as 32-bit ones in the chunks where they fit. The
+# attributes column is kept as raw text, it is only searched, never parsed.
+gff_df_cols   = ['1', '2', '3', '4', '5', '6', '7', '8', '9']
+gff_df_dtypes = {'1': 'category', '2': 'category', '3': 'category', '4': 'UInt64', '5': 'UInt64',
+                 '6': 'category', '7': 'category', '8': 'category', '9': str}
+max_uint32    = 2**32 - 1
+
+# Maximum number of sorted runs merged at once when sorting on disk
+max_merge_runs = 64
 
 ####################################
 ### Function to import gff as df ###
 ####################################
-def read_gff_df(input, strand, start_pos, end_pos):
+def read_gff_df(input, strand, start_pos, end_pos, chunk_size, memory_usage=None):
 
-    # Stdin
-    sys_contents = ""
-    if input == "stdin":
-        sys_contents = sys.stdin.readlines()
-    else:
-        pass
+    # The GFF is read in chunks of a fixed number of lines, thus memory stays bounded.
+    # Values are kept as text (but coordinates) so every chunk is written back as it was read.
+    # Pandas is only loaded by the loose mode, the exact mode starts without it.
+    import pandas as pd
+    chunks = pd.read_csv(gzip_opener(input, 'rt'), sep = "\t", comment = "#", names=gff_df_cols,
+                         dtype=gff_df_dtypes, chunksize=int(chunk_size))
 
-    # Guide: ['Chr', 'Source', 'Type', 'Start', 'End', 'Score', 'Strand', 'Phase', 'Attributes'
-    df = pd.read_csv(gzip_opener(stdin_checker(input, sys_contents), 'rt'), sep = "\t", comment = "#", names=['1', '2', '3', '4', '5', '6', '7', '8', '9'])
+    for df in chunks:
 
-    ## Wants plus strand
-    if strand == "plus":
-        df = df[ df['7'] != "-" ]
-
-    ## Wants minus strand
-    elif strand == "minus":
-        df = df[ df['7'] != "+" ]
+        # Coordinates narrowed to 32-bit when the chunk allows it
+        df = df.astype({col: 'UInt32' for col in ['4', '5'] if not (df[col] > max_uint32).any()})
 
-    # Remove features based on position
-    ## Min (start)
-    if start_pos != None:
-        df = df [ df['4'] >= int(start_pos) ]
-
-    ## Max (end)
-    if end_pos != None:
-        df = df[ df['5'] <= int(end_pos) ]
+        # Memory report?
+        if memory_usage != None:
+            df_memory_usage(df, memory_usage)
 
-    return df
-
-#####################################################
-### Function to check common member between lists ###
-#####################################################
-def common_member(a, b):
+        ## Wants plus strand
+        if strand == "plus":
+            df = df[ df['7'] != "-" ]
 
-    result = not set(a).isdisjoint(set(b))
-    return result
+        ## Wants minus strand
+        elif strand == "minus":
+            df = df[ df['7'] != "+" ]
 
-######################################
-### Function to import gff as dict ###
-######################################
-def read_gff_dict(input, chr_limits, source_limits, type_limits, strand, start_pos, end_pos, att_file):
+        # Remove features based on position, those without the coordinate are removed too
+        ## Min (start)
+        if start_pos != None:
+            df = df [ (df['4'] >= int(start_pos)).fillna(False) ]
 
-    # Stdin
-    sys_contents = ""
-    if input == "stdin":
-        sys_contents = sys.stdin.readlines()
-    else:
-        pass
+        ## Max (end)
+        if end_pos != None:
+            df = df[ (df['5'] <= int(end_pos)).fillna(False) ]
+
+        yield df
+
+#############################################
+### Function to measure the df memory use ###
+#############################################
+def df_memory_usage(df, memory_usage):
+
+    # Compares the compact layout with the one where every column but the coordinates is
+    # a python object and coordinates are int64 (float64 when missing, as pandas reads them)
+    wide      = {col: 'float64' if df[col].hasnans else 'int64' for col in ['4', '5']}
+    object_df = df.astype({col: object for col in gff_df_cols if col not in ['4', '5']}).astype(wide)
+
+    memory_usage['compact'] = memory_usage.get('compact', 0) + int(df.memory_usage(deep=True).sum())
+    memory_usage['object']  = memory_usage.get('object', 0) + int(object_df.memory_usage(deep=True).sum())
+
+def memory_reporter(memory_usage):
+
+    compact = memory_usage.get('compact', 0)
+    objects = memory_usage.get('object', 0)
+    ratio   = objects / compact if compact > 0 else 0
+
+    print(f"Memory used by the GFF chunks: {compact / 1024**2:.2f} MB with compact dtypes, "
+          f"{objects / 1024**2:.2f} MB with object dtypes ({objects - compact} bytes saved, {ratio:.1f}x smaller).", file=sys.stderr)
+
+#############################################
+### Functions to sort the GFF on the disk ###
+#############################################
+def _sort_key(line):
+
+    # Features without start go last, as pandas sorts them in each run
+    parts = line.split('\t', 4)
+    return (parts[0], int(parts[3]) if parts[3] else float('inf'))
+
+def _merge_runs(runs, output):
+    handles = [open(run, 'rt') for run in runs]
+    try:
+        output.writelines(heapq.merge(*handles, key=_sort_key))
+    finally:
+        for handle in handles:
+            handle.close()
+
+def external_sort(chunks, output):
+
+    # Each chunk is sorted by contig and start position and saved as a run
+    # in a temporary directory, then the runs are merged (in rounds, so that
+    # only a few files are opened at once) straight into the output.
+    with tempfile.TemporaryDirectory(prefix="gfftoolbox_") as tmpdir:
+        runs = []
+        for df in chunks:
+            run = os.path.join(tmpdir, f"run_{len(runs)}.gff")
+            df.sort_values(by=['1', '4'], kind='mergesort').to_csv(run, sep='\t', index=False, header=False)
+            runs.append(run)
+
+        merged = 0
+        while len(runs) > max_merge_runs:
+            next_runs = []
+            for n in range(0, len(runs), max_merge_runs):
+                run = os.path.join(tmpdir, f"merged_{merged}.gff")
+                with open(run, 'wt') as merge_output:
+                    _merge_runs(runs[n:n + max_merge_runs], merge_output)
+                for old_run in runs[n:n + max_merge_runs]:
+                    os.remove(old_run)
+                next_runs.append(run)
+                merged += 1
+            runs = next_runs
+
+        _merge_runs(runs, output)
+
+#################################################
+### Function to load the attributes file once ###
+#################################################
+def read_att_file(att_file):
+
+    # Each '##key' header opens a hashed set of desired values
+    att_filter = {}
+    key = None
+    with open(att_file, "r") as handle:
+        for line in handle:
+            line = line.strip()
+            if line.startswith("#"): # Is a header?
+                key = line.replace("##", "")
+                att_filter.setdefault(key, set())
+            elif line and key is not None:
+                att_filter[key].add(line)
+
+    return att_filter
+
+###################################################
+### Function to check a feature attribute match ###
+###################################################
+def att_match(feature, att_filter):
+
+    for field, values in att_filter.items():
+        if not values.isdisjoint(feature.qualifiers.get(field, ())):
+            return True
+
+    return False
+
+########################################################
+### Function to keep the matches in the feature nest ###
+########################################################
+def att_prune(feature, att_filter):
+
+    # BCBio already links children to parents (ID / Parent) as sub_features,
+    # thus the nest is walked at any depth: a matching feature is kept with all
+    # its descendants, otherwise it is only kept as the ancestor of a match.
+    if att_match(feature, att_filter):
+        return True
+
+    feature.sub_features = [sub for sub in feature.sub_features if att_prune(sub, att_filter)]
+    return len(feature.sub_features) > 0
+
+###############################################
+### Function to read the GFF, sequence-wise ###
+###############################################
+def gff_chunks(input, chr_limits, source_limits, type_limits, fixed_strings=False, start_pos=None, end_pos=None, use_index=True):
 
     # Check for the limits imposed by the user
-    limit_info = {}
-
-    # Chr limit?
+    ## Chr limit? Only full-matches
+    chr_list = None
     if chr_limits != None:
-        chr_list = list(chr_limits.split(','))
-        limit_info['gff_id'] = chr_list
-
-    # GFF limits
-    ## Module
-    examiner = GFFExaminer()
-
-    ## Open connections
-    summary = examiner.available_limits(gzip_opener(stdin_checker(input, sys_contents), "rt"))
-    gff_sources = []
-    gff_types = []
-
-    ## Get sources
-    for keys in summary['gff_source'].keys():
-        key = str(keys).replace("('", "").replace("',)", "")
-        gff_sources.append(key)
+        chr_list = set(chr_limits.split(','))
 
-    ## Get types
-    for keys in summary['gff_type'].keys():
-        key = str(keys).replace("('", "").replace("',)", "")
-        gff_types.append(key)
-
-    # Source limits?
+    ## Source limits? Full or partial matches, resolved while streaming the GFF
+    source_match = None
     if source_limits != None:
-        src_definitive  = [] # The real patterns in the GFF
-        src_list = list(source_limits.split(',')) # Patterns given by user
-        for source in gff_sources:
-            if bool(re.search('|'.join(src_list), str(source))): # Check wheter the pattern given by user is present in the GFF
-                src_definitive.append(str(source)) # Select the real pattern that have the pattern given by user, for biopython dict
-
-            limit_info['gff_source'] = list(set(src_definitive))
+        source_match = pattern_matcher(source_limits.split(','), fixed_strings=fixed_strings)
 
-    # Type limits?
+    ## Type limits? Full or partial matches, resolved while streaming the GFF
+    type_match = None
     if type_limits != None:
-        type_definitive = [] # The real patterns in the GFF
-        type_list = list(type_limits.split(',')) # Patterns given by user
-        for type in gff_types:
-            if bool(re.search('|'.join(type_list), str(type))): # Check wheter the pattern given by user is present in the GFF
-                type_definitive.append(str(type)) # Select the real pattern that have the pattern given by user, for biopython dict
-
-        limit_info['gff_type'] = list(set(type_definitive))
-
-    # Open GFF for more customisable / exact filters
-    records = []
-
-    for rec in GFF.parse(gzip_opener(stdin_checker(input, sys_contents), "rt"), limit_info=limit_info):
-
-        ###############################################
-        ### Complex search: loop in attributes nest ###
-        ### Remove features based on attributes it  ###
-        ### tries to maintain the nestness of the   ###
-        ### GFF, which means, it searchs the value  ###
-        ### in the first, second and third level of ###
-        ### the nest, respectively. If found in     ###
-        ### first, all its childs are given; If     ###
-        ### found in second, its parent and its     ###
-        ### childs are given; If found in the third,###
-        ### its parents and grand-parents are given ###
-        ###############################################
-
-        if att_file != None:
-
-            indexes = [] # Indexes to be saved by this filter -- only applies if given by user
-
-            att_filter = {} # Store data from file
-            for line in open(att_file, "r"):
-                line = line.strip()
-                if line.startswith("#"): # Is a header?
-                    key = line.replace("##", "")
-                    att_filter[key] = []
-                else:
-                    att_filter[key].append(line)
-
-            # Parse GFF based on file data
-            for field in att_filter:
-
-                for index, f in enumerate(rec.features):
-
-                    #############################
-                    ### PARENT / MAIN feature ###
-                    #############################
-
-                    # Checking the value of the attribute key in the main feature
-                    try:
-                        if len(f.qualifiers[field]) > 0:
-
-                            if common_member(f.qualifiers[field], list(set(att_filter[field]))):
-                                indexes.append(int(index)) # Save this feature and its childs.
-
-                            else:
-                                # Despite having the same attribute-key, the value is not what the
-                                # user wants. Maybe it refers to the same key in a child feature?
-                                raise goChild
-
-                    except (goChild, KeyError):
-
-                        ###############################
-                        ### 1st level child feature ###
-                        ###############################
-
-                        sub_index_list = [] # Create a list for saved indexes
-
-                        # Checking the value of the attribute key in the 1st level child feature
-                        for sub_index, sub in enumerate(f.sub_features):
-
-                            try:
-
-                                if len(sub.qualifiers[field]) > 0:
-
-                                    if common_member(sub.qualifiers[field], list(set(att_filter[field]))):
-                                        indexes.append(int(index)) # Save the main feature
-                                        sub_index_list.append(int(sub_index)) # Save the subfeature
-
-                                    else:
-                                        # Despite having the same attribute-key, the value is not what the
-                                        # user wants. Maybe it refers to the same key in a child feature?
-                                        raise goChild
+        type_match = pattern_matcher(type_limits.split(','), fixed_strings=fixed_strings)
+
+    # Open GFF for more customisable / exact filters. The limits are applied line by line,
+    # the directives of the whole GFF are read ahead, thus stdin is spilled to disk first.
+    with spill_stdin(input) as input:
+        gff_lines = gzip_opener(input, "rt")
+        header    = None
+
+        # With the GFF index (.gffidx) only the lines that can pass the limits are read.
+        # Features are taken sequence by sequence, in the order the sequences first appear.
+        if use_index == True and any(limit != None for limit in [chr_limits, source_limits, type_limits, start_pos, end_pos]):
+            index = load_index(input)
+            if index != None:
+                features  = select(index, seqids=chr_list, source_match=source_match, type_match=type_match, start=start_pos, end=end_pos)
+                features  = features[np.argsort(index["seq"][features], kind="stable")]
+                gff_lines = indexed_lines(input, index, features)
+                header    = [directive for position, directive in index["meta"]["directives"]]
+
+        gff_lines = limit_lines(gff_lines, chr_list=chr_list, source_match=source_match, type_match=type_match)
+
+        # Sequences whose lines are not all together are grouped before being split
+        if header == None:
+            header, grouped = gff_layout(input)
+            if not grouped:
+                gff_lines = grouped_lines(gff_lines)
+
+        yield from contig_chunks(gff_lines, header=header)
+
+############################################
+### Function to filter a sequence record ###
+############################################
+def filter_record(rec, att_filter, strand, start_pos, end_pos):
+
+    ###############################################
+    ### Complex search: loop in attributes nest ###
+    ### Remove features based on attributes it  ###
+    ### tries to maintain the nestness of the   ###
+    ### GFF, which means, it searchs the value  ###
+    ### in all levels of the nest. If found in  ###
+    ### a feature, all its childs are given     ###
+    ### together with its parents, grand-       ###
+    ### parents, and so on.                     ###
+    ###############################################
+
+    if att_filter != None:
+        rec.features = [f for f in rec.features if att_prune(f, att_filter)]
+
+    ##############################################################################
+    ### START of simpler filters, it is better to put it after the complex one ###
+    ### based on the loop in attributes of parents and childs since it depends ###
+    ### on it                                                                  ###
+    ##############################################################################
+
+
+    # Simpler filters: start, end, strand
+    simpler_filtered_out_indexes = [] # Indexes that must be removed by the simpler filters
+
+    # Remove features based on strand
+    ## Wants plus strand
+    if strand == "plus":
+        for index, f in enumerate(rec.features):
+            try:
+                if int(f.location.strand) == -1:
+                    # Strand equals to the minus strand, thus remove
+                    simpler_filtered_out_indexes.append(int(index))
+            except:
+                # There is a problem ... the strand columns is not correct
+                # Thus we let it stay since we cannot assure is procedence
+                # And the user can check it.
+                pass
 
-                            except(goChild, KeyError):
+    ## Wants minus strand
+    elif strand == "minus":
+        for index, f in enumerate(rec.features):
+            try:
+                if int(f.location.strand) == 1:
+                    # Strand equals to the plus strand, thus remove
+                    simpler_filtered_out_indexes.append(int(index))
+            except:
+                # There is a problem ... the strand columns is not correct
+                # Thus we let it stay since we cannot assure is procedence
+                # And the user can check it.
+                pass
 
-                                ###############################
-                                ### 2nd level child feature ###
-                                ###############################
+    # Remove features based on position
+    ## Min (start)
+    if start_pos != None:
+        for index, f in enumerate(rec.features):
+            if int(f.location.start) + 1 < int(start_pos): # Biopython is zero-based
+                simpler_filtered_out_indexes.append(int(index))
 
-                                subsub_index_list = [] # Create a list for saved indexes
+    ## Max (end)
+    if end_pos != None:
+        for index, f in enumerate(rec.features):
+            if int(f.location.end) > int(end_pos):
+                simpler_filtered_out_indexes.append(int(index))
 
-                                # Checking the value of the attribute key in the 2nd level child feature
-                                for subsub_index, subsub in enumerate(sub.sub_features):
+    # Filter out the features that do not passed the simpler filters
+    simpler_filtered_out_indexes = set(simpler_filtered_out_indexes)
+    rec.features = [i for j, i in enumerate(rec.features) if j not in simpler_filtered_out_indexes]
 
-                                    # Inside the 2nd level child
+    return rec
 
-                                    try:
+###################################################
+### Function to filter the compact GFF features ###
+###################################################
+def filter_features(features, att_filter, strand, start_pos, end_pos):
 
-                                        if len(subsub.qualifiers[field]) > 0:
+    # Same filters as filter_record, on the top level features (and their nest). Compact
+    # features keep their children in 'sub_features' too, thus att_prune works on both.
+    if att_filter != None:
+        features = [f for f in features if att_prune(f, att_filter)]
 
-                                            if common_member(subsub.qualifiers[field], list(set(att_filter[field]))) == True:
-                                                indexes.append(int(index)) # Save the main feature
-                                                sub_index_list.append(int(sub_index)) # Save the subfeature
-                                                subsub_index_list.append(int(subsub_index)) # Save this subsubfeature
+    # Simpler filters, with the coordinates and strands as columns
+    batch = FeatureBatch(features)
+    keep  = np.ones(len(batch), dtype=bool)
+    if strand == "plus":
+        keep &= batch.strand != -1
+    elif strand == "minus":
+        keep &= batch.strand != 1
+    if start_pos != None:
+        keep &= batch.start >= int(start_pos)
+    if end_pos != None:
+        keep &= batch.end <= int(end_pos)
 
-                                            else:
-                                                pass
+    return batch.select(keep)
 
-                                    except:
-                                        pass
+def filter_chunk(chunk, att_filter, strand, start_pos, end_pos):
 
-                                # Finish the parsing for subsubfeatures
-                                # Remove childs that were not selected -- after the loop in all childs
-                                # outside the for loop. Change the subfeatures of this parent in the main object
-                                rec.features[index].sub_features[sub_index].sub_features = [ i for j, i in enumerate(sub.sub_features) if j in list(set(subsub_index_list)) ]
+    # Without filters on the features, all the lines of the sequence are written
+    if att_filter == None and strand not in ["plus", "minus"] and start_pos == None and end_pos == None:
+        yield from GFF.parse(StringIO(chunk))
+        return
 
-                        # Finish the parsing for subfeatures
-                        # Remove childs that were not selected -- after the loop in all childs
-                        # outside the for loop. Change the subfeatures of this parent in the main object
-                        rec.features[index].sub_features = [ i for j, i in enumerate(f.sub_features) if j in list(set(sub_index_list)) ]
+    # The features are filtered in their compact form and only the lines kept are given
+    # to BCBio, so Biopython objects are only built for what is written. GFFs whose nest
+    # BCBio has to fix (inferred parents, duplicated IDs, GFF2) are filtered as before.
+    parsed   = parse_features(chunk)
+    toplevel = feature_nest(parsed[0]) if parsed != None else None
+    if toplevel == None:
+        for rec in GFF.parse(StringIO(chunk)):
+            yield filter_record(rec, att_filter=att_filter, strand=strand, start_pos=start_pos, end_pos=end_pos)
+        return
 
-            # Filter out the features that do not pass the filter
-            rec.features = [i for j, i in enumerate(rec.features) if j in list(set(indexes))]
+    lengths = sequence_lengths(toplevel)
+    kept    = set(parsed[1])
+    for feature in filter_features(toplevel, att_filter=att_filter, strand=strand, start_pos=start_pos, end_pos=end_pos):
+        kept.update(f.number for f in feature.nest())
 
-        ##############################################################################
-        ### START of simpler filters, it is better to put it after the complex one ###
-        ### based on the loop in attributes of parents and childs since it depends ###
-        ### on it                                                                  ###
-        ##############################################################################
+    lines = [line for number, line in enumerate(chunk.splitlines(keepends=True)) if number in kept]
+    yield from restore_lengths(GFF.parse(StringIO("".join(lines))), lengths)
 
+######################################
+### Function to import gff as dict ###
+######################################
+def read_gff_dict(input, chr_limits, source_limits, type_limits, strand, start_pos, end_pos, att_file, fixed_strings=False, use_index=True):
 
-        # Simpler filters: start, end, strand
-        simpler_filtered_out_indexes = [] # Indexes that must be removed by the simpler filters
+    # The attributes file is loaded only once, for all the sequences
+    att_filter = None
+    if att_file != None:
+        att_filter = read_att_file(att_file)
 
-        # Remove features based on strand
-        ## Wants plus strand
-        if strand == "plus":
-            for index, f in enumerate(rec.features):
-                try:
-                    if int(f.location.strand) == -1:
-                        # Strand equals to the minus strand, thus remove
-                        simpler_filtered_out_indexes.append(int(index))
-                except:
-                    # There is a problem ... the strand columns is not correct
-                    # Thus we let it stay since we cannot assure is procedence
-                    # And the user can check it.
-                    pass
+    # Each sequence record is given as soon as it is filtered
+    for chunk in gff_chunks(input, chr_limits, source_limits, type_limits, fixed_strings=fixed_strings,
+                            start_pos=start_pos, end_pos=end_pos, use_index=use_index):
+        yield from filter_chunk(chunk, att_filter=att_filter, strand=strand, start_pos=start_pos, end_pos=end_pos)
 
-        ## Wants minus strand
-        elif strand == "minus":
-            for index, f in enumerate(rec.features):
-                try:
-                    if int(f.location.strand) == 1:
-                        # Strand equals to the plus strand, thus remove
-                        simpler_filtered_out_indexes.append(int(index))
-                except:
-                    # There is a problem ... the strand columns is not correct
-                    # Thus we let it stay since we cannot assure is procedence
-                    # And the user can check it.
-                    pass
-
-        # Remove features based on position
-        ## Min (start)
-        if start_pos != None:
-            for index, f in enumerate(rec.features):
-                if int(f.location.start) + 1 < int(start_pos): # Biopython is zero-based
-                    simpler_filtered_out_indexes.append(int(index))
+#################################################
+### Functions to filter sequences in parallel ###
+#################################################
+def _filter_chunk(chunk, att_filter, strand, start_pos, end_pos):
 
-        ## Max (end)
-        if end_pos != None:
-            for index, f in enumerate(rec.features):
-                if int(f.location.end) > int(end_pos):
-                    simpler_filtered_out_indexes.append(int(index))
+    # Runs in a worker process: filters one sequence and gives it back as GFF text
+    out = StringIO()
+    for rec in filter_chunk(chunk, att_filter=att_filter, strand=strand, start_pos=start_pos, end_pos=end_pos):
+        if len(rec.features) > 0:
+            GFF.write([rec], out)
 
-        # Filter out the features that do not passed the simpler filters
-        rec.features = [i for j, i in enumerate(rec.features) if j not in list(set(simpler_filtered_out_indexes))]
+    return out.getvalue()
 
-        # Save record by appending
-        records.append(rec)
+def parallel_filter(chunks, threads, att_filter, strand, start_pos, end_pos):
 
-    # Done
-    return records
+    # Sequences are sent to the workers while at most a few of them per worker
+    # are pending, and results are given back in the original sequence order.
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=threads) as pool:
+        for chunk in chunks:
+            pending.append(pool.submit(_filter_chunk, chunk, att_filter, strand, start_pos, end_pos))
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().result()
 
+        while pending:
+            yield pending.popleft().result()
 
 ###################################
 ### Filter df by column pattern ###
 ###################################
-def df_col_filter(df, column, pattern):
+def df_col_filter(df, column, pattern, search=None):
+
+    # Literal strings, with the precompiled automaton
+    if search != None:
+        return df[ series_matcher(df[str(column)], search) ]
 
     # Split csv
     pat_list = list(pattern.split(','))
 
     # Filter
     return df[
-        df[str(column)].str.contains('|'.join(pat_list))
-    ].to_csv(sep='\t', index=False, header=False).strip()
+        df[str(column)].str.contains('|'.join(pat_list), na=False)
+    ]
 
 ######################################################
 ### Function for simple filter with single pattern ###
 ######################################################
-def filter_loose_mode(input_gff, column, pattern, sort, header, strand, start_pos, end_pos):
+def filter_loose_mode(input_gff, column, pattern, sort, header, strand, start_pos, end_pos, chunk_size, memory_report=False, fixed_strings=False,
+                      output=sys.stdout):
 
-    # Read GFF file
-    df = read_gff_df(input=input_gff, strand=strand, start_pos=start_pos, end_pos=end_pos)
+    # Read GFF file, chunk by chunk
+    memory_usage = {} if memory_report == True else None
+    chunks = read_gff_df(input=input_gff, strand=strand, start_pos=start_pos, end_pos=end_pos, chunk_size=chunk_size,
+                         memory_usage=memory_usage)
 
-    # Sort
-    if sort == True:
-        df = df.sort_values(by=['1', '4'])
+    # Filter
+    if pattern != None:
+        search = None
+        if fixed_strings == True: # The automaton is built once for all chunks
+            search = compile_patterns(str(pattern).split(','), fixed_strings=True)
+        chunks = (df_col_filter(df=df, column=str(column), pattern=str(pattern), search=search) for df in chunks)
 
     # header
     if header == True:
-        print("##gff-version 3")
+        output.write("##gff-version 3\n")
 
-    # Filter
-    if pattern != None:
-        print(df_col_filter(df=df, column=str(column), pattern=str(pattern)))
+    # Sort, on disk, or write each chunk as soon as it is filtered
+    if sort == True:
+        external_sort(chunks, output)
     else:
-        print(df.to_csv(sep='\t', index=False, header=False).strip())
+        for df in chunks:
+            df.to_csv(output, sep='\t', index=False, header=False)
+
+    # Report memory?
+    if memory_report == True:
+        memory_reporter(memory_usage)
 
 #######################################################
 ### Function for complex filter with single pattern ###
 #######################################################
-def filter_exact_mode(input_gff, chr_limits, source_limits, type_limits, start_pos, end_pos, strand, att_file):
+def filter_exact_mode(input_gff, chr_limits, source_limits, type_limits, start_pos, end_pos, strand, att_file, fixed_strings=False, threads=1,
+                      use_index=True, output=sys.stdout):
+
+    # Filter each sequence in a worker process
+    if int(threads) > 1:
+        att_filter = None
+        if att_file != None:
+            att_filter = read_att_file(att_file)
+
+        chunks = gff_chunks(input_gff, chr_limits, source_limits, type_limits, fixed_strings=fixed_strings,
+                            start_pos=start_pos, end_pos=end_pos, use_index=use_index)
+        for text in parallel_filter(chunks, int(threads), att_filter=att_filter, strand=strand, start_pos=start_pos, end_pos=end_pos):
+            output.write(text)
+
+        return
 
     # Parse fields
     gff_dict = read_gff_dict(input=input_gff, chr_limits=chr_limits, source_limits=source_limits,
-                             type_limits=type_limits, strand=strand, start_pos=start_pos, end_pos=end_pos, att_file=att_file)
+                             type_limits=type_limits, strand=strand, start_pos=start_pos, end_pos=end_pos, att_file=att_file,
+                             fixed_strings=fixed_strings, use_index=use_index)
 
-    # Print the records filtered (each record is a sequence)
+    # Print the records filtered (each record is a sequence) as they come
     for record in gff_dict:
         if len(record.features) > 0:
-            GFF.write([record], sys.stdout) # Write filtered gff
+            GFF.write([record], output) # Write filtered gff
 
 ################
 ### Def main ###
 ################
-def filter(input_gff, column, pattern, sort, header, mode, chr_limits, source_limits, type_limits, start_pos, end_pos, strand, att_file):
+def filter(input_gff, column, pattern, sort, header, mode, chr_limits, source_limits, type_limits, start_pos, end_pos, strand, att_file, chunk_size=100000, memory_report=False, fixed_strings=False, threads=1,
+           use_index=True, output=None, compress=None):
 
     # Check for error
     if mode == "exact" and pattern != None:
         print(f"""\n-> Error: -p (pattern) must be used with --mode loose.""")
 
+    elif compress != None and str(compress).lower() not in compress_formats:
+        print(f"""\n-> Error: --compress must be either 'none' or 'bgzf'. {compress} is incorrect.""")
+
     # Simple filter
     elif mode == "loose":
-        filter_loose_mode(input_gff=input_gff, column=column, pattern=pattern, sort=sort, header=header,
-                          start_pos=start_pos, end_pos=end_pos, strand=strand)
+        with output_opener(output, compress) as out:
+            filter_loose_mode(input_gff=input_gff, column=column, pattern=pattern, sort=sort, header=header,
+                              start_pos=start_pos, end_pos=end_pos, strand=strand, chunk_size=chunk_size,
+                              memory_report=memory_report, fixed_strings=fixed_strings, output=out)
 
     # Complex filter
     elif mode == "exact":
-        filter_exact_mode(input_gff=input_gff, chr_limits=chr_limits, source_limits=source_limits, type_limits=type_limits,
-                          start_pos=start_pos, end_pos=end_pos, strand=strand, att_file=att_file)
+        with output_opener(output, compress) as out:
+            filter_exact_mode(input_gff=input_gff, chr_limits=chr_limits, source_limits=source_limits, type_limits=type_limits,
+                              start_pos=start_pos, end_pos=end_pos, strand=strand, att_file=att_file,
+                              fixed_strings=fixed_strings, threads=threads, use_index=use_index, output=out)
 
     # Error
     else:
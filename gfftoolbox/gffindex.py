@@ -0,0 +1,405 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+from array import array
+from io import BytesIO
+from Bio import bgzf
+from .inputs import is_stdin, is_bgzf, gzip_opener, limit_lines, GZIP_MAGIC
+from .tabix import tabix_index_path, tabix_lines
+from .outputs import replace_file
+from . import cache
+
+###########################
+### Sidecar index setup ###
+###########################
+# A built index is kept in the user cache (see cache), not next to the GFF,
+# so reading a GFF never writes to its directory. An index already next to
+# the GFF (<gff>.gffidx) is used first. Either is only trusted while the GFF
+# keeps the same size and modification time.
+index_suffix  = cache.index_suffix
+index_version = 2
+
+#################################
+### Can this file be indexed? ###
+#################################
+def indexable(input):
+
+    # Plain and BGZF files on disk: stdin can't be re-read and a plain
+    # gzip file has no blocks to seek to, it is decompressed from the start
+    if is_stdin(input) or not os.path.isfile(str(input)):
+        return False
+
+    with open(input, 'rb') as handle:
+        return handle.read(2) != GZIP_MAGIC or is_bgzf(input)
+
+def index_path(input):
+    return str(input) + index_suffix
+
+def cached_index_path(input):
+    key = hashlib.sha256(os.path.realpath(input).encode()).hexdigest()
+    return os.path.join(cache.cache_dir, key + index_suffix)
+
+def _open_indexable(input):
+
+    # BGZF files are read block-wise, positions are virtual offsets
+    # (block offset << 16 | offset within the uncompressed block)
+    if isinstance(input, bytes):
+        return BytesIO(input)
+    elif is_bgzf(input):
+        return bgzf.BgzfReader(input, 'rb')
+    else:
+        return open(input, 'rb')
+
+def _file_stamp(input):
+    stat = os.stat(input)
+    return stat.st_size, stat.st_mtime_ns
+
+##########################################
+### Function to parse ID and Parent(s) ###
+##########################################
+def _id_and_parents(attributes):
+
+    feature_id, parents = "", []
+    for att in attributes.split(b";"):
+        att = att.strip()
+        if att.startswith(b"ID="):
+            feature_id = att[3:].decode()
+        elif att.startswith(b"Parent="):
+            parents = att[7:].decode().split(",")
+
+    return feature_id, parents
+
+##############################################
+### Function to build the index of the GFF ###
+##############################################
+def build_index(input):
+
+    # A GFF file, or GFF lines already in memory (bytes) for indexes built on the fly
+    with _open_indexable(input) as handle:
+        index = _index_handle(handle, virtual=isinstance(handle, bgzf.BgzfReader))
+
+    if not isinstance(input, bytes):
+        index["meta"]["stamp"] = list(_file_stamp(input))
+
+    return index
+
+def _index_handle(handle, virtual=False):
+
+    # Codes for the repeated values of the first three columns
+    seqids, sources, types = {}, {}, {}
+
+    # One entry per feature line, in file order
+    seq, source, ftype = array('i'), array('i'), array('i')
+    start, end        = array('q'), array('q')
+    offset, length    = array('q'), array('i')
+    voffset           = array('q')
+    ids, parent_ids   = [], []
+    directives        = []
+
+    # Offsets count the uncompressed bytes, virtual offsets are where to seek
+    position = 0
+    while True:
+        where = handle.tell() if virtual else position
+        line  = handle.readline()
+        if not line:
+            break
+        size = len(line)
+
+        # Directives and comments are kept, by offset, to be given back with the features
+        if line.startswith(b"#"):
+            if line.startswith(b"##FASTA"):
+                break
+            directives.append([position, line.decode()])
+
+        elif line.strip():
+            parts = line.rstrip(b"\r\n").split(b"\t", 8)
+            seq.append(seqids.setdefault(parts[0].strip().decode(), len(seqids)))
+            source.append(sources.setdefault(parts[1].strip().decode(), len(sources)))
+            ftype.append(types.setdefault(parts[2].strip().decode(), len(types)))
+            start.append(int(parts[3]))
+            end.append(int(parts[4]))
+            offset.append(position)
+            voffset.append(where)
+            length.append(size)
+
+            feature_id, parents = _id_and_parents(parts[8] if len(parts) > 8 else b"")
+            ids.append(feature_id)
+            parent_ids.append(parents)
+
+        position += size
+
+    seq, start, end = np.frombuffer(seq, dtype=np.int32), np.frombuffer(start, dtype=np.int64), np.frombuffer(end, dtype=np.int64)
+
+    # Sorted interval arrays: features of each sequence sorted by start, with
+    # the running maximum of their ends, so overlaps are found by bisection
+    order     = np.lexsort((start, seq)).astype(np.int64)
+    seq_bound = np.searchsorted(seq[order], np.arange(len(seqids) + 1)).astype(np.int64)
+    max_end   = np.empty(len(order), dtype=np.int64)
+    for n in range(len(seqids)):
+        lo, hi = seq_bound[n], seq_bound[n + 1]
+        max_end[lo:hi] = np.maximum.accumulate(end[order[lo:hi]])
+
+    # ID -> Parent graph, as compressed lists of parent and child feature indexes.
+    # IDs may be shared by several lines (e.g. multi-line CDS), all of them are linked.
+    by_id = {}
+    for n, feature_id in enumerate(ids):
+        if feature_id:
+            by_id.setdefault(feature_id, []).append(n)
+
+    child_of = [[p for parent in parents for p in by_id.get(parent, ())] for parents in parent_ids]
+    parent_ptr, parent_idx = _csr(child_of)
+
+    parent_of = [[] for _ in child_of]
+    for child, parents in enumerate(child_of):
+        for parent in parents:
+            parent_of[parent].append(child)
+    child_ptr, child_idx = _csr(parent_of)
+
+    meta = {
+        "version"    : index_version,
+        "stamp"      : None,
+        "seqids"     : list(seqids),
+        "sources"    : list(sources),
+        "types"      : list(types),
+        "directives" : directives
+    }
+
+    return {
+        "meta"       : meta,
+        "ids"        : ids,
+        "seq"        : seq,
+        "source"     : np.frombuffer(source, dtype=np.int32),
+        "type"       : np.frombuffer(ftype, dtype=np.int32),
+        "start"      : start,
+        "end"        : end,
+        "offset"     : np.frombuffer(offset, dtype=np.int64),
+        "voffset"    : np.frombuffer(voffset, dtype=np.int64),
+        "length"     : np.frombuffer(length, dtype=np.int32),
+        "order"      : order,
+        "seq_bound"  : seq_bound,
+        "max_end"    : max_end,
+        "parent_ptr" : parent_ptr,
+        "parent_idx" : parent_idx,
+        "child_ptr"  : child_ptr,
+        "child_idx"  : child_idx
+    }
+
+def _csr(lists):
+    ptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum([len(items) for items in lists])
+    idx = np.fromiter((item for items in lists for item in items), dtype=np.int64, count=int(ptr[-1]))
+    return ptr, idx
+
+####################################
+### Functions to save/load index ###
+####################################
+def _as_bytes(value):
+    return np.frombuffer(json.dumps(value).encode(), dtype=np.uint8)
+
+def save_index(index, path):
+
+    # Written to a temporary file first, so a broken index is never left behind
+    arrays = {key: value for key, value in index.items() if key not in ["meta", "ids"]}
+    handle = tempfile.NamedTemporaryFile(mode="wb", dir=os.path.dirname(os.path.abspath(path)), delete=False)
+    try:
+        with handle:
+            np.savez(handle, meta=_as_bytes(index["meta"]), ids=_as_bytes(index["ids"]), **arrays)
+        replace_file(handle.name, path)
+    except BaseException:
+        os.remove(handle.name)
+        raise
+
+def read_index(path, ids=False):
+
+    # Feature IDs are only decoded when asked for, the graph itself uses indexes
+    with np.load(path) as data:
+        index = {key: data[key] for key in data.files if ids or key != "ids"}
+
+    index["meta"] = json.loads(index["meta"].tobytes())
+    if ids:
+        index["ids"] = json.loads(index["ids"].tobytes())
+    return index
+
+def load_index(input, build=True):
+
+    # Indexes are not available for stdin and plain gzip files
+    if not indexable(input):
+        return None
+
+    # The sidecar or cached index is reused while the GFF is unchanged
+    for path in [index_path(input), cached_index_path(input)]:
+        if os.path.isfile(path):
+            try:
+                index = read_index(path)
+                if index["meta"]["version"] == index_version and index["meta"]["stamp"] == list(_file_stamp(input)):
+                    # Each use touches the cached index, as the cached results, so it is evicted last
+                    if path != index_path(input):
+                        os.utime(path)
+                    return index
+            except (OSError, ValueError, KeyError):
+                pass
+
+    if not build:
+        return None
+
+    # Lines whose coordinates are not numbers can't be indexed, the GFF is then read as it is
+    try:
+        index = build_index(input)
+    except (ValueError, IndexError):
+        return None
+
+    # Build it once, and keep it in the user cache for the next queries if it is writable
+    try:
+        os.makedirs(cache.cache_dir, exist_ok=True)
+        save_index(index, cached_index_path(input))
+        cache.evict(cache.cache_size_limit)
+    except OSError:
+        pass
+
+    return index
+
+################################
+### Functions to query index ###
+################################
+def seqid_codes(index, seqids=None):
+
+    names = index["meta"]["seqids"]
+    if seqids is None:
+        return list(range(len(names)))
+
+    return [code for code, name in enumerate(names) if name in seqids]
+
+def value_codes(index, column, match):
+
+    # Codes of the sources/types (column: "sources" or "types") accepted by a matcher
+    return [code for code, name in enumerate(index["meta"][column]) if match(name)]
+
+def overlapping(index, seqids=None, start=None, end=None):
+
+    # Indexes of the features overlapping the [start, end] region (1-based, inclusive)
+    start = -np.inf if start is None else int(start)
+    end   =  np.inf if end is None else int(end)
+
+    order, max_end, starts, ends = index["order"], index["max_end"], index["start"], index["end"]
+    found = []
+    for code in seqid_codes(index, seqids):
+        lo, hi = int(index["seq_bound"][code]), int(index["seq_bound"][code + 1])
+
+        # Sorted by start: every feature after 'last' starts after the region ends.
+        # Running max end: every feature before 'first' ends before the region starts.
+        last  = lo + int(np.searchsorted(starts[order[lo:hi]], end, side="right"))
+        first = lo + int(np.searchsorted(max_end[lo:last], start, side="left"))
+
+        candidates = order[first:last]
+        found.append(candidates[ends[candidates] >= start])
+
+    if len(found) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    return np.sort(np.concatenate(found))
+
+def related(index, features):
+
+    # Closes a set of features over the ID -> Parent graph: their ancestors and
+    # the descendants of all of them, at any depth, so whole nests are kept
+    keep = np.zeros(len(index["seq"]), dtype=bool)
+
+    def walk(todo, ptr, idx):
+        while len(todo) > 0:
+            keep[todo] = True
+            nexts = [idx[ptr[n]:ptr[n + 1]] for n in todo]
+            todo  = np.concatenate(nexts) if len(nexts) > 0 else np.empty(0, dtype=np.int64)
+            todo  = np.unique(todo[~keep[todo]])
+
+    walk(np.asarray(features, dtype=np.int64), index["parent_ptr"], index["parent_idx"])
+    walk(np.flatnonzero(keep), index["child_ptr"], index["child_idx"])
+
+    return np.flatnonzero(keep)
+
+def select(index, seqids=None, source_match=None, type_match=None, start=None, end=None):
+
+    # Wanted sequences, sources and types
+    wanted = np.isin(index["seq"], seqid_codes(index, seqids))
+    if source_match is not None:
+        wanted &= np.isin(index["source"], value_codes(index, "sources", source_match))
+    if type_match is not None:
+        wanted &= np.isin(index["type"], value_codes(index, "types", type_match))
+
+    if start is None and end is None:
+        return np.flatnonzero(wanted)
+
+    # With a region, the features overlapping it plus their whole nest, thus it does
+    # not matter which one ends up as the top-level. The wanted feature ending last in
+    # each sequence is also kept since BCBio takes the sequence length from it.
+    features = overlapping(index, seqids, start, end)
+    candidates = np.flatnonzero(wanted)
+    if len(candidates) > 0:
+        by_end = candidates[np.lexsort((index["end"][candidates], index["seq"][candidates]))]
+        codes  = index["seq"][by_end]
+        last   = np.append(codes[1:] != codes[:-1], True)
+        features = np.concatenate([features, by_end[last]])
+
+    features = related(index, features)
+    return features[wanted[features]]
+
+def indexed_lines(input, index, features):
+
+    # Gives back, in file order, the directives and the lines of the selected features.
+    # Neighbouring lines are read at once, so only the needed bytes (or blocks) are read.
+    directives = index["meta"]["directives"]
+    offsets, lengths, voffsets = index["offset"][features], index["length"][features], index["voffset"][features]
+    next_directive = 0
+
+    with _open_indexable(input) as handle:
+        n = 0
+        while n < len(offsets):
+            first = int(offsets[n])
+            seek  = int(voffsets[n])
+            size  = int(lengths[n])
+            n += 1
+            while n < len(offsets) and int(offsets[n]) == first + size:
+                size += int(lengths[n])
+                n += 1
+
+            while next_directive < len(directives) and directives[next_directive][0] < first:
+                yield directives[next_directive][1]
+                next_directive += 1
+
+            handle.seek(seek)
+            for line in BytesIO(handle.read(size)):
+                yield line.decode()
+
+    for position, directive in directives[next_directive:]:
+        yield directive
+
+def region_lines(input, seqids=None, source_match=None, type_match=None, start=None, end=None):
+
+    # Lines of a region, through the saved index when the input can have one.
+    # A bgzipped GFF with a tabix index and no saved index yet is read only in the
+    # blocks of the region. Otherwise (stdin, gzip) the lines of the wanted
+    # sequences, sources and types are indexed on the fly, in memory, and
+    # only the ones in the region are given.
+    index, lines = load_index(input, build=False), None
+    if index is None and seqids is not None and tabix_index_path(input) is not None:
+        lines = list(limit_lines(tabix_lines(input, seqids, start=start, end=end), source_match=source_match, type_match=type_match))
+    elif index is None:
+        index = load_index(input)
+
+    if index is None and lines is None:
+        lines = list(limit_lines(gzip_opener(input, "rt"), chr_list=seqids, source_match=source_match, type_match=type_match))
+
+    # Lines whose coordinates are not numbers can't be indexed, then all of them are given
+    if index is None:
+        input = "".join(lines).encode()
+        try:
+            index = build_index(input)
+        except (ValueError, IndexError):
+            return iter(lines)
+
+    return indexed_lines(input, index, select(index, seqids=seqids, source_match=source_match, type_match=type_match,
+                                              start=start, end=end))
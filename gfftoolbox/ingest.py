@@ -7,7 +7,7 @@ gff-toolbox:
 This command add annotations into an already created GFF mongo database.
 
 usage:
-    gff-toolbox mongo-ingest --input <tsv> [--gff_feature gene --db_name <db_name> --genome_name <genome_name> --mongo_path <mongo_path> ]
+    gff-toolbox mongo-ingest --input <tsv> [--gff_feature gene --db_name <db_name> --genome_name <genome_name> --mongo_path <mongo_path> --mongo_uri <uri> --mongo_timeout <seconds> --batch_size <int> --threads <int> ]
     gff-toolbox mongo-ingest -h | --help
 
 options:
@@ -23,6 +23,12 @@ options:
     -p, --mongo_path=<mongo_path>                           Where to load your mongoDB? [Default: ./mongodb].
                                                             If you insert a path that already have a mongoDB in it will include (append)
                                                             the GFF as new collection (<genome_name>) in a new or existing DB (<db_name>).
+    --mongo_uri=<uri>                                       Use the MongoDB server of this URI (e.g. mongodb://host:27017) instead of the local one.
+                                                            Without it, a server running in localhost 27017 is used, or a mongod is started in <mongo_path>.
+    --mongo_timeout=<seconds>                               How long to wait for the MongoDB server to answer. [Default: 30].
+    -b, --batch_size=<int>                                  Annotations are grouped per feature, and this many features are updated by each
+                                                            (unordered) bulk write. [Default: 1000].
+    -t, --threads=<int>                                     Number of bulk writes sent to the database at the same time. [Default: 1].
 
 
 example:
@@ -52,12 +58,11 @@ from collections import namedtuple
 import gzip
 import urllib.request, urllib.parse, urllib.error
 import json
-import pymongo
-from pymongo import MongoClient
-from pymongo import collection
+from pymongo import UpdateOne
 from io import StringIO
-import binascii
 import pathlib
+from .inputs import gzip_opener
+from .mongo import bulk_write_batches, throughput_report, mongo_client, close_clients, mongo_timeout
 
 ######################################
 ### GFF columns names -- immutable ###
@@ -84,23 +89,6 @@ def att_to_dict(attributes):
 ### Useful functions ###
 ########################
 
-# Check for stdin
-def stdin_checker(input):
-    # Checking for stdin
-    if input == "stdin":
-        tmp = tempfile.NamedTemporaryFile(mode = "w+t", delete = False) # Create tmp file to work as input
-        temp_file = open(tmp.name, 'w+t')
-        for line in sys.stdin:
-            temp_file.writelines(f"{line}")
-
-        temp_file.seek(0)
-        input = tmp.name
-
-    else:
-        pass
-
-    return input
-
 # Print fasta format
 def fasta_printer(id, seq):
     print(f">{id}\n{seq}")
@@ -114,13 +102,6 @@ def tag_getter(record, seq):
 
     return tag
 
-# Open gzipped files
-def gzip_opener(input, mode_in):
-    if  binascii.hexlify(open(input, 'rb').read(2)) == b"1f8b" or input.endswith(".gz"):
-        return gzip.open(input, mode=mode_in)
-    else:
-        return open(input, mode=mode_in)
-
 # Remove nest from GFF
 def _flatten_features(rec):
         """Make sub_features in an input rec flat for output.
@@ -142,15 +123,72 @@ def _flatten_features(rec):
         return rec
 
 
-def ingestAttributes(filename, db_name, collection_name, mongo_path, feature_type, has_header):
+# Group the annotations of each feature into a single update
+def annotation_updates(contents, feature_type, has_header, batch_size, counts):
+
+    groups = {} # feature id -> {field: [annotations]}, in the order of the file
+    for idxline, line in enumerate(contents):
+
+        if idxline == 0 and has_header: continue
 
-    # Start mongo
-    current = pathlib.Path().absolute()
-    # os.system(f"mkdir -p {mongo_path} {mongo_path}/{db_name}")
-    os.system(f"cd {mongo_path} && mongod --dbpath {db_name} --logpath mongo_{collection_name}.log &")
+        try:
+                gene_name, iddb, idType, description = line.strip("\n").split("\t")
+        except ValueError:
+                print("Error: Could not unpack the values in line number {}: {}.\n \
+                The file with the set of attributes to ingest into GFF must have 4 \
+                 columns and be tab-delimited.".format(str(idxline), line.strip("\n").split("\t")))
+                continue
 
-    # Create connection
-    client = MongoClient()
+        if idType != "GO":
+            field = "attributes.Dbxref"
+            obj   = {"DBTAG": idType, "ID": iddb}
+        else:
+            field = "attributes.Ontology_term"
+            obj   = {"DBTAG": "GO", "ID": iddb}
+        if len(description) > 0:
+            obj["Description"] = description
+
+        # Lines of a feature are usually together, so groups are sent a batch at a time,
+        # when the next feature starts (a feature is never split across two updates)
+        if gene_name not in groups and len(groups) >= batch_size:
+            yield from _group_updates(groups, feature_type, counts)
+            groups = {}
+
+        values = groups.setdefault(gene_name, {}).setdefault(field, [])
+        if obj not in values:
+            values.append(obj)
+        counts["annotations"] += 1
+
+    yield from _group_updates(groups, feature_type, counts)
+
+def _group_updates(groups, feature_type, counts):
+    for gene_name, fields in groups.items():
+        counts["features"] += 1
+        yield UpdateOne(
+            # query
+            {'type': feature_type, 'attributes.ID': gene_name},
+            # update, all the annotations of the feature at once
+            {"$addToSet": {field: {"$each": values} for field, values in fields.items()}}
+        )
+
+# Apply the annotations of a TSV file to a collection
+def ingest_annotations(collection, filename, feature_type, has_header=True, batch_size=1000, threads=1):
+
+    counts   = {"annotations": 0, "features": 0}
+    start    = time.perf_counter()
+    contents = gzip_opener(filename, "rt")
+    matched  = bulk_write_batches(collection, annotation_updates(contents, feature_type, has_header, batch_size, counts),
+                                  batch_size=batch_size, threads=threads)
+
+    throughput_report("Ingested", counts["annotations"], time.perf_counter() - start, unit="annotations")
+    print(f"{matched} of {counts['features']} annotated {feature_type} features were found in the collection", file=sys.stderr)
+    return matched
+
+def ingestAttributes(filename, db_name, collection_name, mongo_path, feature_type, has_header, batch_size=1000, threads=1,
+                     uri=None, timeout=mongo_timeout):
+
+    # Connection to a running server, or to one started (and waited for) in mongo_path
+    client = mongo_client(uri=uri, mongo_path=mongo_path, db_name=db_name, log_name=f"mongo_{collection_name}", timeout=timeout)
 
     # Create Database
     db = client[db_name]
@@ -162,51 +200,8 @@ def ingestAttributes(filename, db_name, collection_name, mongo_path, feature_typ
     # requires pymongo
     collection.create_index( [ ("type", 1),  ("attributes.ID", 1) ])
 
-
-    # Open
-    contents = gzip_opener(stdin_checker(filename), "rt")
-
-
-
-    for idxline, line in enumerate(contents):
-        
-        if idxline == 0 and has_header: continue
-        
-        try:
-                gene_name, iddb, idType, description = line.strip("\n").split("\t")
-        except ValueError:
-                print("Error: Could not unpack the values in line number {}: {}.\n \
-                The file with the set of attributes to ingest into GFF must have 4 \
-                 columns and be tab-delimited.".format(str(idxline), line.strip("\n").split("\t")))
-        
-        if (idxline % 1000) == 0:
-            print("Update Col 9 N=", str(idxline))
-        if idType != "GO":
-            if len(description) == 0:
-                obj = {"DBTAG": idType, "ID": iddb}
-            else:
-                obj = {"DBTAG": idType, "ID": iddb, "Description": description}
-            
-            collection.update_one(
-                # query                 
-                {'type': 'gene', 'attributes.ID': gene_name},
-                # update
-                {"$addToSet": {"attributes.Dbxref": obj}}
-                # update options (Optional)
-            )
-        else:
-            if len(description) == 0:
-                obj = {"DBTAG": "GO", "ID": iddb}
-            else:
-                obj = {"DBTAG": "GO", "ID": iddb, "Description": description}
-            collection.update_one(
-                {'type': 'gene', 'attributes.ID': gene_name},
-                {"$addToSet": {"attributes.Ontology_term": obj}}
-            )
-
-    # Close
-    client.close()
-    os.system(f"cd {current}")
+    # Updates are grouped per feature and sent in bulk
+    ingest_annotations(collection, filename, feature_type, has_header=has_header, batch_size=batch_size, threads=threads)
 
 
 
@@ -214,6 +209,30 @@ def ingestAttributes(filename, db_name, collection_name, mongo_path, feature_typ
 ### Def main ###
 ################
 # (filename, db_name, collection_name, mongo_path, feature_type, has_header)
-def ingest(filename, feature_type, db_name, genome_name, mongo_path):
+def ingest(filename, feature_type, db_name, genome_name, mongo_path, batch_size=1000, threads=1, mongo_uri=None, timeout=mongo_timeout):
+
+    if not str(batch_size).isdigit() or int(batch_size) == 0:
+        print(f"""
+Error: --batch_size must be a positive integer. {batch_size} is incorrect.
+        """)
 
-    ingestAttributes(filename=filename, db_name=db_name, collection_name=genome_name, mongo_path=mongo_path, feature_type=feature_type, has_header=True)
+    elif not str(threads).isdigit() or int(threads) == 0:
+        print(f"""
+Error: --threads must be a positive integer. {threads} is incorrect.
+        """)
+
+    elif not str(timeout).replace(".", "", 1).isdigit():
+        print(f"""
+Error: --mongo_timeout must be a number of seconds. {timeout} is incorrect.
+        """)
+
+    else:
+        try:
+            ingestAttributes(filename=filename, db_name=db_name, collection_name=genome_name, mongo_path=mongo_path, feature_type=feature_type,
+                             has_header=True, batch_size=int(batch_size), threads=int(threads), uri=mongo_uri, timeout=float(timeout))
+        except ConnectionError as error:
+            print(f"""
+Error: {error}.
+        """)
+        finally:
+            close_clients()
@@ -0,0 +1,182 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import sys
+import os
+import gzip
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+###########################
+### Compression markers ###
+###########################
+GZIP_MAGIC = b"\x1f\x8b"
+
+# BGZF (bgzip) files are gzip members whose extra field holds a 'BC' subfield
+BGZF_EXTRA = b"BC"
+
+#######################
+### Stdin detection ###
+#######################
+def is_stdin(input):
+    return input is None or str(input) == "stdin" or str(input) == "-"
+
+######################
+### BGZF detection ###
+######################
+def is_bgzf(input):
+
+    # Header: magic, method, flags (FEXTRA = 4), ..., extra length, then the subfield id
+    if is_stdin(input) or not os.path.isfile(str(input)):
+        return False
+
+    with open(input, 'rb') as handle:
+        header = handle.read(14)
+
+    return len(header) == 14 and header[:2] == GZIP_MAGIC and header[3] & 4 != 0 and header[12:14] == BGZF_EXTRA
+
+###################
+### Gzip opener ###
+###################
+def gzip_opener(input, mode_in="rt"):
+
+    # Stdin is streamed as it comes, it is never copied to disk here.
+    # Peeking does not consume the bytes, so the readers below still see them.
+    if is_stdin(input):
+        stream = sys.stdin.buffer
+        if stream.peek(2)[:2] == GZIP_MAGIC:
+            return gzip.open(stream, mode=mode_in)
+        elif "b" in mode_in:
+            return stream
+        else:
+            return sys.stdin
+
+    # Regular files
+    with open(input, 'rb') as handle:
+        magic = handle.read(2)
+
+    if magic == GZIP_MAGIC or str(input).endswith(".gz"):
+        return gzip.open(input, mode=mode_in)
+    else:
+        return open(input, mode=mode_in)
+
+#####################################
+### Spill stdin for multiple pass ###
+#####################################
+@contextmanager
+def spill_stdin(input):
+
+    # Files can be read as many times as needed
+    if not is_stdin(input):
+        yield input
+        return
+
+    # Stdin is written once, as raw bytes (compressed or not), to a temporary
+    # file that only exists while the command needs to go over it again.
+    tmp = tempfile.NamedTemporaryFile(mode="wb", prefix="gfftoolbox_", suffix=".gff", delete=False)
+    try:
+        with tmp:
+            shutil.copyfileobj(sys.stdin.buffer, tmp)
+        yield tmp.name
+    finally:
+        os.remove(tmp.name)
+
+##########################################
+### Function to keep the limited lines ###
+##########################################
+def limit_lines(handle, chr_list=None, source_match=None, type_match=None):
+
+    for line in handle:
+
+        # Directives, comments and empty lines are always kept
+        if line.startswith("#") or not line.strip():
+            yield line
+
+            # Sequences are not features, nothing after it is needed
+            if line.startswith("##FASTA"):
+                return
+            continue
+
+        parts = line.split('\t', 3)
+        if chr_list is not None and parts[0].strip() not in chr_list:
+            continue
+        if source_match is not None and not source_match(parts[1].strip()):
+            continue
+        if type_match is not None and not type_match(parts[2].strip()):
+            continue
+
+        yield line
+
+##############################################
+### Functions to split the GFF by sequence ###
+##############################################
+def gff_layout(input):
+
+    # Directives and comments of the whole GFF (up to ##FASTA), read ahead of the features,
+    # and whether the lines of each sequence are all together. GFF3 does not require it
+    # (e.g. gene and ncRNA GFFs concatenated), then the lines are grouped first.
+    header, seen, prefix, grouped = [], set(), None, True
+    with gzip_opener(input, "rt") as handle:
+        for line in handle:
+            if line.startswith("#"):
+                if line.startswith("##FASTA"):
+                    break
+                header.append(line)
+            elif grouped and line.strip() and (prefix is None or not line.startswith(prefix)):
+                seqid = line.split('\t', 1)[0].strip()
+                if prefix is not None and seqid + "\t" == prefix:
+                    continue
+                grouped = seqid not in seen
+                seen.add(seqid)
+                prefix = seqid + "\t"
+
+    return header, grouped
+
+def grouped_lines(lines):
+
+    # Feature lines of each sequence together, in the order the sequences first appear.
+    # All of them are held in memory, thus it is only used when the GFF needs it.
+    sequences = {}
+    for line in lines:
+        if line.startswith("##FASTA"):
+            break
+        if not line.startswith("#") and line.strip():
+            sequences.setdefault(line.split('\t', 1)[0].strip(), []).append(line)
+
+    for sequence in sequences.values():
+        yield from sequence
+
+def contig_chunks(lines, header=None):
+
+    # Consecutive lines of the same sequence are handed to BCBio together with the
+    # directives (e.g. ##sequence-region), so only one sequence is held in memory at a
+    # time instead of the whole GFF. The lines of each sequence must be together (see
+    # gff_layout and grouped_lines). With the 'header' of the whole GFF, every sequence
+    # gets all of them, as when BCBio parses the whole file. Otherwise, only those seen
+    # so far are given.
+    fixed  = header is not None
+    header = list(header) if fixed else []
+    chunk  = []
+    seqid  = None
+
+    for line in lines:
+        if line.startswith("##FASTA"):
+            break
+
+        if line.startswith("#") or not line.strip():
+            if not fixed:
+                header.append(line)
+            continue
+
+        current = line.split('\t', 1)[0].strip()
+        if current != seqid:
+            if len(chunk) > 0:
+                yield "".join(header + chunk)
+            seqid = current
+            chunk = []
+
+        chunk.append(line)
+
+    if len(chunk) > 0:
+        yield "".join(header + chunk)
@@ -0,0 +1,141 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import re
+import numpy as np
+from collections import deque
+
+# The C implementation of the automaton is used when available
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+##########################################
+### Aho-Corasick literal string search ###
+##########################################
+class LiteralMatcher:
+    """Aho-Corasick automaton telling whether a text contains any of the literal patterns.
+
+    It is built once, and each text is scanned a single time whatever the number of patterns.
+    """
+
+    def __init__(self, patterns):
+        patterns = set(patterns)
+
+        # The empty string is found in any text
+        self.match_all = "" in patterns
+        patterns.discard("")
+
+        if ahocorasick is not None:
+            self._build_native(patterns)
+        else:
+            self._build(patterns)
+
+    def _build_native(self, patterns):
+        self.automaton = None
+        if len(patterns) > 0:
+            self.automaton = ahocorasick.Automaton()
+            for pattern in patterns:
+                self.automaton.add_word(pattern, pattern)
+            self.automaton.make_automaton()
+        self.search = self._search_native
+
+    def _build(self, patterns):
+
+        # Trie of the patterns
+        goto, fail, out = [{}], [0], [False]
+        for pattern in patterns:
+            node = 0
+            for char in pattern:
+                child = goto[node].get(char)
+                if child is None:
+                    child = len(goto)
+                    goto[node][char] = child
+                    goto.append({})
+                    fail.append(0)
+                    out.append(False)
+                node = child
+            out[node] = True
+
+        # Failure links, breadth-first. A node also matches if its failure link does.
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(char, 0)
+                out[child] = out[child] or out[fail[child]]
+
+        self.goto, self.fail, self.out = goto, fail, out
+        self.search = self._search
+
+    def _search_native(self, text):
+        if self.match_all:
+            return True
+        if self.automaton is None:
+            return False
+        return next(self.automaton.iter(text), None) is not None
+
+    def _search(self, text):
+        if self.match_all:
+            return True
+
+        goto, fail, out = self.goto, self.fail, self.out
+        node = 0
+        for char in text:
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if out[node]:
+                return True
+
+        return False
+
+#############################################
+### Function to compile the user patterns ###
+#############################################
+def compile_patterns(patterns, fixed_strings=False):
+
+    # Literal strings are searched with the automaton, otherwise
+    # the patterns are joined as a single regular expression
+    if fixed_strings:
+        return LiteralMatcher(patterns).search
+    else:
+        regex = re.compile('|'.join(patterns))
+        return lambda value: regex.search(value) is not None
+
+#################################################
+### Cached pattern matching for column limits ###
+#################################################
+def pattern_matcher(patterns, fixed_strings=False):
+
+    # Each distinct value (source, type, ...) is searched with the user
+    # patterns only the first time it appears, then the answer is cached
+    search = compile_patterns(patterns, fixed_strings=fixed_strings)
+    cache = {}
+
+    def matches(value):
+        try:
+            return cache[value]
+        except KeyError:
+            cache[value] = search(value)
+            return cache[value]
+
+    return matches
+
+##############################################
+### Function to match a pandas text column ###
+##############################################
+def series_matcher(series, search):
+
+    # Categorical columns are matched once per category, not once per row.
+    # Missing values (code -1) take the trailing False.
+    if hasattr(series, "cat"):
+        hits = np.array([search(str(category)) for category in series.cat.categories] + [False], dtype=bool)
+        return hits[series.cat.codes.to_numpy()]
+
+    return series.map(lambda value: isinstance(value, str) and search(value)).astype(bool).to_numpy()
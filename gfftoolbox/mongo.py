@@ -0,0 +1,203 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import sys
+import time
+import shutil
+import subprocess
+import queue
+import threading
+from collections import deque, Counter
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+################################
+### MongoDB connection setup ###
+################################
+# Server used when no URI is given, a mongod is started there when nothing answers
+default_mongo_uri = "mongodb://localhost:27017"
+
+# Seconds to wait for a server to answer
+mongo_timeout = 30
+
+# One pooled client per server, kept for the whole run
+_clients = {}
+
+# Attribute keys indexed at most, the most common first (a collection can't have more than 64 indexes)
+max_attribute_indexes = 32
+
+############################################
+### Functions to connect to the database ###
+############################################
+def mongo_client(uri=None, mongo_path="./mongodb", db_name="annotation_db", log_name="mongo", timeout=mongo_timeout):
+
+    # Given a URI, that server is used. Otherwise a server already running on
+    # localhost is reused, or a mongod is started with its data in <mongo_path>/<db_name>.
+    key = default_mongo_uri if uri is None else uri
+    if key in _clients:
+        return _clients[key]
+
+    if _wait_ready(key, 0 if uri is None else timeout):
+        pass
+    elif uri is None:
+        server = _start_mongod(mongo_path, db_name, log_name)
+        if not _wait_ready(key, timeout, server):
+            raise ConnectionError(f"the mongod started in {mongo_path} did not answer in {timeout} s, check {mongo_path}/{log_name}.log")
+    else:
+        raise ConnectionError(f"no MongoDB server answered at {key} in {timeout} s")
+
+    _clients[key] = MongoClient(key)
+    return _clients[key]
+
+def close_clients():
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+
+def _wait_ready(uri, timeout, server=None):
+
+    # The server is pinged until it answers, it stops (when started here) or time runs out
+    deadline = time.monotonic() + timeout
+    while True:
+        probe = MongoClient(uri, serverSelectionTimeoutMS=500)
+        try:
+            probe.admin.command("ping")
+            return True
+        except PyMongoError:
+            pass
+        finally:
+            probe.close()
+
+        if (server is not None and server.poll() is not None) or time.monotonic() >= deadline:
+            return False
+        time.sleep(0.2)
+
+def _start_mongod(mongo_path, db_name, log_name):
+
+    if shutil.which("mongod") is None:
+        raise ConnectionError(f"no MongoDB server answers at {default_mongo_uri} and mongod is not in the PATH to start one")
+
+    # Left running after the run, so the next commands reuse it
+    os.makedirs(os.path.join(mongo_path, db_name), exist_ok=True)
+    return subprocess.Popen(["mongod", "--dbpath", os.path.join(mongo_path, db_name),
+                             "--logpath", os.path.join(mongo_path, f"{log_name}.log")],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+###########################
+### MongoDB batch setup ###
+###########################
+# Documents sent to the server by each insert_many
+insert_batch_size = 1000
+
+# Batches waiting for the background writer, so parsing never runs far ahead of it
+insert_queue_size = 4
+
+########################################
+### Functions to group the documents ###
+########################################
+def batches(documents, size):
+
+    # Lists of at most 'size' documents, taken from any iterable as they come
+    documents = iter(documents)
+    while True:
+        batch = list(islice(documents, size))
+        if len(batch) == 0:
+            return
+        yield batch
+
+def throughput_report(action, count, seconds, unit="documents"):
+    rate = count / seconds if seconds > 0 else 0
+    print(f"{action} {count} {unit} in {seconds:.2f} s ({rate:.0f} {unit}/s)", file=sys.stderr)
+
+#######################################
+### Functions to insert the batches ###
+#######################################
+def insert_batches(collection, documents, batch_size=insert_batch_size, background=False):
+
+    # Unordered inserts, so the server writes each batch as fast as it can.
+    # With 'background', a thread inserts while the next batch is parsed.
+    start = time.perf_counter()
+    if background:
+        inserted = _background_insert(collection, documents, batch_size)
+    else:
+        inserted = 0
+        for batch in batches(documents, batch_size):
+            inserted += len(collection.insert_many(batch, ordered=False).inserted_ids)
+
+    throughput_report("Inserted", inserted, time.perf_counter() - start)
+    return inserted
+
+def _background_insert(collection, documents, batch_size):
+
+    pending = queue.Queue(maxsize=insert_queue_size)
+    result  = {"inserted": 0, "error": None}
+
+    # The writer keeps taking batches after an error, so the parser is never blocked
+    def writer():
+        while True:
+            batch = pending.get()
+            if batch is None:
+                return
+            if result["error"] is None:
+                try:
+                    result["inserted"] += len(collection.insert_many(batch, ordered=False).inserted_ids)
+                except Exception as error:
+                    result["error"] = error
+
+    thread = threading.Thread(target=writer, daemon=True)
+    thread.start()
+    try:
+        for batch in batches(documents, batch_size):
+            if result["error"] is not None:
+                break
+            pending.put(batch)
+    finally:
+        pending.put(None)
+        thread.join()
+
+    if result["error"] is not None:
+        raise result["error"]
+    return result["inserted"]
+
+###########################################
+### Function to send bulk write batches ###
+###########################################
+def bulk_write_batches(collection, operations, batch_size=insert_batch_size, threads=1):
+
+    # Unordered bulk writes of 'batch_size' operations. With more threads, that
+    # many batches are on their way at once (a MongoClient is thread safe).
+    matched = 0
+    if threads <= 1:
+        for batch in batches(operations, batch_size):
+            matched += collection.bulk_write(batch, ordered=False).matched_count
+        return matched
+
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for batch in batches(operations, batch_size):
+            pending.append(pool.submit(collection.bulk_write, batch, ordered=False))
+            while len(pending) > 2 * threads:
+                matched += pending.popleft().result().matched_count
+
+        while len(pending) > 0:
+            matched += pending.popleft().result().matched_count
+
+    return matched
+
+##########################################
+### Function to index the GFF features ###
+##########################################
+def create_feature_indexes(collection, attribute_keys=()):
+
+    # Region (mongo-query), type, and type + ID (mongo-ingest updates) lookups
+    collection.create_index([("recid", 1), ("start", 1), ("end", 1)])
+    collection.create_index([("type", 1)])
+    collection.create_index([("type", 1), ("attributes.ID", 1)])
+
+    # Then the most common attribute keys (those with dots or starting with $ can't be index paths)
+    keys = [key for key, count in Counter(attribute_keys).most_common() if key != "ID" and "." not in key and not key.startswith("$")]
+    for key in keys[:max_attribute_indexes]:
+        collection.create_index([(f"attributes.{key}", 1)])
@@ -0,0 +1,201 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import sys
+import os
+import zlib
+import struct
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from .inputs import is_stdin
+
+# The faster orjson serializer is used when available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+#########################
+### BGZF output setup ###
+#########################
+# Same block size as bgzip, so a block always fits the 64 kb BGZF limit once compressed
+bgzf_block_size = 65280
+compress_formats = ["none", "bgzf"]
+
+# gzip header with the 'BC' extra subfield, up to its 2 bytes holding the block size - 1 (18 bytes with them),
+# and the empty block that marks the end of a BGZF file, as written by bgzip (SAM/BAM specification, 4.1)
+bgzf_header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+bgzf_eof    = (b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+               b"\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00")
+
+# Text is gathered in a buffer and written at once, instead of once per line/feature
+write_buffer_size = 1024 * 1024
+
+# JSON Lines records encoded before each write
+json_chunk_size = 1000
+
+#########################################
+### Function to compress a BGZF block ###
+#########################################
+def bgzf_block(data, level=6):
+
+    # Raw deflate (no zlib header), wrapped in the gzip header with the 'BC' subfield
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    return (bgzf_header + struct.pack("<H", len(compressed) + 25) + compressed +
+            struct.pack("<II", zlib.crc32(data) & 0xFFFFFFFF, len(data)))
+
+#################################
+### Multithreaded BGZF writer ###
+#################################
+class BgzfTextWriter:
+    """Text handle writing BGZF (bgzip compatible) blocks to a binary stream.
+
+    Blocks are compressed by a pool of threads (zlib releases the GIL) and
+    written in order, so the output can be indexed like any bgzipped file.
+    """
+
+    def __init__(self, stream, threads=None, level=6):
+        self.stream  = stream
+        self.level   = level
+        self.threads = threads if threads is not None else min(4, os.cpu_count() or 1)
+        self.buffer  = []
+        self.size    = 0
+        self.pending = deque()
+        self.pool    = None
+
+    def write(self, text):
+        data = text.encode()
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= write_buffer_size:
+            self._submit(final=False)
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def _submit(self, final):
+
+        # Whole blocks go to the pool, the remainder waits for more text unless it is the end
+        data = b"".join(self.buffer)
+        cut  = len(data) if final else len(data) - len(data) % bgzf_block_size
+        self.buffer = [data[cut:]] if cut < len(data) else []
+        self.size   = len(data) - cut
+
+        if self.pool is None:
+            self.pool = ThreadPoolExecutor(max_workers=self.threads)
+
+        for start in range(0, cut, bgzf_block_size):
+            self.pending.append(self.pool.submit(bgzf_block, data[start:start + bgzf_block_size], self.level))
+
+        # Blocks already compressed are written, keeping a bounded number in flight
+        while len(self.pending) > 0 and (self.pending[0].done() or len(self.pending) > 2 * self.threads):
+            self.stream.write(self.pending.popleft().result())
+
+    def flush(self):
+        self._submit(final=True)
+        while len(self.pending) > 0:
+            self.stream.write(self.pending.popleft().result())
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+        self.stream.write(bgzf_eof)
+        self.stream.flush()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+##################################
+### Buffered plain text writer ###
+##################################
+class BufferedTextWriter:
+    """Text handle gathering small writes before handing them to the stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.buffer = []
+        self.size   = 0
+
+    def write(self, text):
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= write_buffer_size:
+            self.flush()
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        self.stream.write("".join(self.buffer))
+        self.buffer = []
+        self.size   = 0
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+###################################
+### Functions to write JSON Lines ###
+###################################
+def json_line(record):
+
+    # Compact and with non-ASCII characters kept, the same with both serializers
+    if orjson is not None:
+        return orjson.dumps(record).decode()
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+def write_json_lines(records, output):
+
+    # One record per line, encoded and written a chunk at a time, so the records are never all held
+    chunk = []
+    for record in records:
+        chunk.append(json_line(record))
+        if len(chunk) >= json_chunk_size:
+            output.write("\n".join(chunk) + "\n")
+            chunk = []
+
+    if len(chunk) > 0:
+        output.write("\n".join(chunk) + "\n")
+
+###############################################
+### Function to put a sidecar file in place ###
+###############################################
+def replace_file(temporary, path):
+
+    # Temporary files are private (0600), the final file gets the usual permissions
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temporary, 0o666 & ~umask)
+    os.replace(temporary, path)
+
+#####################
+### Output opener ###
+#####################
+@contextmanager
+def output_opener(output=None, compress=None):
+
+    # Stdout or a file, plain or BGZF compressed
+    compress = "none" if compress is None else str(compress).lower()
+    if compress not in compress_formats:
+        raise ValueError(f"--compress must be one of: {', '.join(compress_formats)}. {compress} is incorrect.")
+
+    to_stdout = is_stdin(output) or str(output) == "stdout"
+    if compress == "bgzf":
+        stream = sys.stdout.buffer if to_stdout else open(output, 'wb')
+        writer = BgzfTextWriter(stream)
+    else:
+        stream = sys.stdout if to_stdout else open(output, 'wt')
+        writer = BufferedTextWriter(stream)
+
+    try:
+        yield writer
+    finally:
+        writer.close()
+        if not to_stdout:
+            stream.close()
@@ -4,14 +4,33 @@ gff-toolbox:
 
             Overview
 
-This command uses BCBio library to let you get the gist of your GFF file
+This command lets you get the gist of your GFF file, reading it only once
 
 usage:
-    gff-toolbox overview [ -h|--help ] [ --input <gff> ]
+    gff-toolbox overview [ -h|--help ] [ --input <gff> --format <format> --threads <int> --statistics ] [ --sample --sample_bytes <size> --seed <int> ] [ --no-cache ]
 
 options:
     -h, --help                                               Show this screen
     -i, --input=<gff>                                        Input GFF file. GFF file must not contain sequences with it. [Default: stdin]
+    -f, --format=<format>                                    Output format: text, json or tsv (section, name, statistic and value columns). [Default: text]
+    -t, --threads=<int>                                      Blocks of the GFF summarised at once, by as many processes. [Default: 1]
+    -s, --statistics                                         Also summarise the feature lengths, strands, features per Mb, attribute keys and nest
+                                                             depth. By default only the limits (ids, sources and types) are counted, which is faster.
+
+                                                            Sampling
+
+    --sample                                                 Estimate the counts and attribute key frequencies, with 95% confidence intervals,
+                                                             from random blocks of the GFF instead of reading all of it. Plain files are read
+                                                             at random offsets, gzipped files and stdin are streamed through a reservoir of
+                                                             blocks (read to the end, but only the kept blocks are parsed).
+    --sample_bytes=<size>                                    Bytes of the GFF parsed by --sample, as a number or with a K, M or G suffix. [Default: 64M]
+    --seed=<int>                                             Seed of the random sampling, to get the same estimates again.
+
+                                                            Cache
+
+    --no-cache                                               Summarise the GFF again instead of reusing the cached result. Results are kept in
+                                                             ~/.cache/gff-toolbox (or $GFFTOOLBOX_CACHE_DIR) and reused while the GFF keeps the same
+                                                             path, size and modification time. Stdin and --sample without --seed are never cached.
 
 example:
 
@@ -20,61 +39,102 @@ example:
 $ gff-toolbox overview -i Athaliana_ref.gff.gz
 
 $ gff-toolbox overview -i Kp_ref.gff
-"""
 
-##################################
-### Loading Necessary Packages ###
-##################################
-import Bio.SeqIO
-from pprintpp import pprint
-from BCBio import GFF
-from BCBio.GFF import GFFExaminer
-import tempfile
-import sys
-import binascii
-import gzip
+    ## Getting it in a machine-readable format
 
-###################
-### Stdin Check ###
-###################
-def stdin_checker(input):
-    # Checking for stdin
-    if input == "stdin":
-        tmp = tempfile.NamedTemporaryFile(mode = "w+t", delete = False) # Create tmp file to work as input
-        temp_file = open(tmp.name, 'w')
-        for line in sys.stdin:
-            temp_file.writelines(f"{line}")
+$ gff-toolbox overview -i Kp_ref.gff --format json
 
-        temp_file.seek(0)
-        input = tmp.name
+    ## Getting the lengths, strands, attributes and nest of each feature type as well
 
-    else:
-        pass
+$ gff-toolbox overview -i Kp_ref.gff --statistics
 
-    return input
+    ## Estimating the proportions of a very large GFF from 256 Mb of it
 
-###################
-### Gzip opener ###
-###################
-def gzip_opener(input, mode_in):
+$ gff-toolbox overview -i combined.gff --sample --sample_bytes 256M
+"""
 
-    if  binascii.hexlify(open(input, 'rb').read(2)) == b"1f8b" or str(input).endswith(".gz"):
-        return gzip.open(input, mode=mode_in)
-    else:
-        return open(input, mode=mode_in)
+##################################
+### Loading Necessary Packages ###
+##################################
+from pprintpp import pprint
+import sys
+import json
+from .inputs import gzip_opener
+from .cache import cached
+from .summary import gff_summary, summary_json, summary_rows, gff_sample_summary, sample_rows
+
+##########################################
+### Function to read a size, as in 64M ###
+##########################################
+def parse_size(size):
+    size  = str(size).strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if size[-1:] in units and size[:-1].isdigit():
+        return int(size[:-1]) * units[size[-1]]
+    return int(size) if size.isdigit() else None
+
+def overview(infile, format="text", threads=1, sample=False, sample_bytes="64M", seed=None, cache=True, statistics=False):
+
+    format = str(format).lower()
+    if format not in ["text", "json", "tsv"]:
+        print(f"""
+Error: --format must be one of text, json or tsv. {format} is incorrect.
+        """)
+        return
+
+    if not str(threads).isdigit() or int(threads) == 0:
+        print(f"""
+Error: --threads must be a positive integer. {threads} is incorrect.
+        """)
+        return
+
+    if sample and not parse_size(sample_bytes):
+        print(f"""
+Error: --sample_bytes must be a positive number of bytes, optionally with a K, M or G suffix. {sample_bytes} is incorrect.
+        """)
+        return
+
+    if seed != None and not str(seed).isdigit():
+        print(f"""
+Error: --seed must be a positive integer. {seed} is incorrect.
+        """)
+        return
+
+    ## Counted natively, in a single pass over the lines or over samples of them
+    def summarise():
+        with gzip_opener(infile, "rb") as handle:
+            if sample:
+                return gff_sample_summary(handle, budget=parse_size(sample_bytes), seed=None if seed == None else int(seed), threads=int(threads))
+            return gff_summary(handle, threads=int(threads), statistics=statistics)
+
+    ## Repeated summaries of an unchanged GFF are read from the cache
+    options = {"sample_bytes": parse_size(sample_bytes), "seed": None if seed == None else int(seed)} if sample else {"statistics": statistics}
+    summary = cached("overview", infile, summarise, options=options, enabled=cache and (not sample or seed != None))
+
+    if format == "json":
+        print(json.dumps(summary_json(summary), indent=4))
+        return
+
+    if format == "tsv":
+        print("#section\tname\tstatistic\tvalue")
+        for row in (sample_rows(summary) if sample else summary_rows(summary)):
+            print("\t".join("." if value is None else str(value) for value in row))
+        return
 
-##################################################
-### Function for checking available qualifiers ###
-##################################################
-def overview(infile):
+    ## Print
+    if sample:
+        print(f"""
+Note: These are estimates, made from {summary["sample"]["bytes"]} of the {summary["sample"]["total_bytes"]} bytes of the gff
+({summary["sample"]["blocks"]} random blocks). Each count is given with its 95% confidence interval (low, high).
+Attribute keys are also given as the fraction of the features having them.
 
-    ## Module
-    examiner = GFFExaminer()
+Input: {infile} gff file.
 
-    ## Open connection
-    summary = examiner.available_limits(gzip_opener(stdin_checker(infile), "rt"))
+Estimated overview:
+    """)
+        pprint({key: value for key, value in summary.items() if key != "sample"})
+        return
 
-    ## Print
     print(f"""
 Note: This command lets you get the gist of your gff file. It summarises as a dictionary the available
 limits of your gff, which means, that it counts the ids, sources and feature types that are found in the
@@ -84,4 +144,11 @@ Input: {infile} gff file.
 
 Overview:
     """)
-    pprint(summary)
+    pprint(summary["limits"])
+    if not statistics:
+        return
+
+    print("""
+Statistics (feature lengths, strands, features per Mb, attribute keys and nest depth):
+    """)
+    pprint({key: value for key, value in summary.items() if key != "limits"})
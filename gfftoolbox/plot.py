@@ -8,7 +8,7 @@ Enabling the visualization of a genomic region from a GFF using the DNA features
 
 usage:
     gff-toolbox plot -h|--help
-    gff-toolbox plot check-gff [ --input <gff> ]
+    gff-toolbox plot check-gff [ --input <gff> --no-cache ]
     gff-toolbox plot [ --input <gff> | --fofn <file> ] ( --contig <contig_name> ) [ --start <start_base> --end <end_base> --feature <feature_type> --identification <id> --title <title> --label <label> --color <color> --output <png_out> --width <width> --height <height> ]
 
 options:
@@ -18,9 +18,12 @@ options:
 
     check-gff                               Does a simple parsing of the GFF file so the user knows the available qualifiers that
                                             can be used as gene identifiers. GFF qualifiers are retrieved from the 9th column.
-                                            Same as gff-toolbox overview command.
+                                            Same as gff-toolbox overview command. Results are cached as in the overview command.
 
-    -i, --input=<gff>                       Used to plot dna features from a single GFF file [Default: stdin].
+    --no-cache                              With check-gff, read the GFF again instead of reusing the cached result.
+
+    -i, --input=<gff>                       Used to plot dna features from a single GFF file [Default: stdin]. For plain and bgzipped GFFs only the
+                                            region is read, through a tabix index (<gff>.tbi / <gff>.csi) or the GFF index saved in the user cache.
 
     -f, --fofn=<file>                       Used to plot dna multiple features from multiple GFF files. Contents must be in csv format with 3 columns:
                                             gff,custom_label,color (HEX format). Features from each GFF will have the color set in the 3rd column.
@@ -77,90 +80,80 @@ $ gff-toolbox plot -f kp_gffs.fofn --start 10000 --end 20000 --contig NC_016845.
 ### Loading Necessary Packages ###
 ##################################
 from dna_features_viewer import *
-import Bio.SeqIO
 from pprintpp import pprint
 from BCBio import GFF
-from BCBio.GFF import GFFExaminer
 import matplotlib.patches as mpatches
 import matplotlib.pyplot as plt
-import binascii
-import gzip
-import tempfile
 import sys
-
-###################
-### Stdin Check ###
-###################
-def stdin_checker(input, sys_contents):
-    # Checking for stdin
-    if input == "stdin":
-        tmp = tempfile.NamedTemporaryFile(mode = "w+t", delete = False) # Create tmp file to work as input
-        temp_file = open(tmp.name, 'w')
-        for line in sys_contents:
-            temp_file.writelines(f"{line}")
-
-        temp_file.seek(0)
-        input = tmp.name
-
-    else:
-        pass
-
-    return input
-
-###################
-### Gzip opener ###
-###################
-def gzip_opener(input, mode_in):
-    if  binascii.hexlify(open(input, 'rb').read(2)) == b"1f8b" or input.endswith(".gz"):
-        return gzip.open(input, mode=mode_in)
-    else:
-        return open(input, mode=mode_in)
-
+from io import StringIO
+from .inputs import gzip_opener, spill_stdin, contig_chunks
+from .gffindex import region_lines
+from .summary import gff_summary
+from .cache import cached
+from .features import FeatureBatch, parse_features, feature_nest
 
 ##################################################
 ### Function for checking available qualifiers ###
 ##################################################
-def check_gff(infile):
+def check_gff(infile, cache=True):
+
+    # Stdin is spilled to disk only once since the GFF is read twice below
+    def check():
+        with spill_stdin(infile) as gff_file:
+            with gzip_opener(gff_file, "rb") as handle:
+                limits = gff_summary(handle)["limits"]
+            for rec in GFF.parse(gzip_opener(gff_file, "rt")):
+                return limits, str(rec.features[0])
+            return limits, None
 
-    # Stdin check
-    sys_contents = ""
-    if infile == "stdin":
-        sys_contents = sys.stdin.readlines()
-    else:
-        pass
+    # Unchanged GFFs are not read again
+    limits, first_feature = cached("check-gff", infile, check, enabled=cache)
 
     # GFF overview
     print("GFF overview:\n")
-    examiner = GFFExaminer()
-    pprint(examiner.available_limits(gzip_opener(stdin_checker(infile, sys_contents), "rt")))
+    pprint(limits)
     print("")
 
     # Check qualifiers
-    for rec in GFF.parse(gzip_opener(stdin_checker(infile, sys_contents), "rt")):
+    if first_feature != None:
         print("Example of the GFF's first line available qualifiers from the 9th column:\n")
-        print(rec.features[0])
+        print(first_feature)
         print("\nPlease select only one of the available qualifiers to be used as gene identification!")
         exit()
 
+######################################################
+### Function to load only the region to be plotted ###
+######################################################
+def region_features(infile, contig, feature, start_nt, end_nt):
+
+    # Subset GFF based on chr, feature type and region. The lines are looked up in
+    # the sorted intervals of the GFF index (on disk or built on the fly), thus only
+    # the features overlapping the region (and their nest) are read.
+    types = set(feature.split(','))
+    lines = region_lines(infile, seqids={contig}, type_match=types.__contains__, start=start_nt, end=end_nt)
+
+    # Top level features inside the region, as (start, end, strand, qualifiers) with the
+    # 0-based start of Biopython. They are compact features, read by BCBio only when
+    # their nest needs it (inferred parents, duplicated IDs, GFF2, etc).
+    for chunk in contig_chunks(lines):
+        parsed   = parse_features(chunk)
+        toplevel = feature_nest(parsed[0]) if parsed != None else None
+        if toplevel == None:
+            for rec in GFF.parse(StringIO(chunk)):
+                for f in rec.features:
+                    if int(f.location.start) >= start_nt and int(f.location.end) <= end_nt:
+                        yield int(f.location.start), int(f.location.end), f.location.strand, f.qualifiers
+        else:
+            batch = FeatureBatch(toplevel)
+            for f in batch.select((batch.start - 1 >= start_nt) & (batch.end <= end_nt)):
+                yield f.start - 1, f.end, f.strand, f.qualifiers
+
 ######################################################
 ### Function for execution with a single GFF input ###
 ######################################################
 
 def single_gff(infile, start, end, contig, feature, qualifier, coloring, custom_label, outfile, plot_title, plot_width, plot_height):
 
-    # Stdin check
-    sys_contents = ""
-    if infile == "stdin":
-        sys_contents = sys.stdin.readlines()
-    else:
-        pass
-
-    # Subset GFF based on chr and feature type
-    limit_info = dict(
-            gff_id   = [contig],
-            gff_type = list(feature.split(','))
-    )
-
     # Create empty features and legened list
     features = []
 
@@ -170,29 +163,24 @@ def single_gff(infile, start, end, contig, feature, qualifier, coloring, custom_
     end_nt   = int(end)
     length   = end_nt - start_nt
 
-    for rec in GFF.parse(gzip_opener(stdin_checker(infile, sys_contents), "rt"), limit_info=limit_info):
-        for i in range(0, len(rec.features)):
-            if ( int(rec.features[i].location.start) >= int(start_nt) and int(rec.features[i].location.end) <= int(end_nt) ):
+    for f_start, f_end, f_strand, qualifiers in region_features(infile, contig, feature, start_nt, end_nt):
 
-                if (str(rec.features[i].location.strand) == "+"):
-                    strand=+1
-                else:
-                    strand=-1
+        if (str(f_strand) == "+"):
+            strand=+1
+        else:
+            strand=-1
 
-                ## Label not in the gene plot
-                    if (qualifier in rec.features[i].qualifiers):
-                        if (rec.features[i].qualifiers[qualifier][0] == "true"):
-                            input= GraphicFeature(start=int(rec.features[i].location.start), end=int(rec.features[i].location.end),
-                                                  strand=int(strand), color=coloring)
-                        else: 
-                            input = GraphicFeature(start=int(rec.features[i].location.start), end=int(rec.features[i].location.end),
-                                            strand=int(strand), label=str(rec.features[i].qualifiers[qualifier][0]), color=coloring)
-                    else:
-                        input= GraphicFeature(start=int(rec.features[i].location.start), end=int(rec.features[i].location.end),
-                                          strand=int(strand), color=coloring)
+        ## Label not in the gene plot
+            if (qualifier in qualifiers):
+                if (qualifiers[qualifier][0] == "true"):
+                    input= GraphicFeature(start=f_start, end=f_end, strand=int(strand), color=coloring)
+                else: 
+                    input = GraphicFeature(start=f_start, end=f_end, strand=int(strand), label=str(qualifiers[qualifier][0]), color=coloring)
+            else:
+                input= GraphicFeature(start=f_start, end=f_end, strand=int(strand), color=coloring)
 
-                # Append
-                features.append(input)
+        # Append
+        features.append(input)
 
 
     # Draw plot
@@ -226,44 +214,33 @@ def multiple_gff(input_fofn, start, end, contig, qualifier, feature, outfile, pl
         labeling  = data[1]
         coloring  = data[2]
 
-        # Subset GFF based on chr and feature type
-        limit_info = dict(
-                gff_id   = [contig],
-                gff_type = list(feature.split(','))
-        )
-
-        # Load GFF and its sequences
-        gff = GFF.parse(gzip_opener(infile, "rt"), limit_info=limit_info)
-
         ## Populate features list
         ## Filtering by location
         start_nt = int(start)
         end_nt   = int(end)
         length   = end_nt - start_nt
 
-        for rec in gff:
-            for i in range(0, len(rec.features)):
-                if ( int(rec.features[i].location.start) >= int(start_nt) and int(rec.features[i].location.end) <= int(end_nt) ):
-
-                    if (str(rec.features[i].location.strand) == "+"):
-                        strand=+1
-                    else:
-                        strand=-1
-
-                    ## Label not in the gene plot
-                    if (qualifier in rec.features[i].qualifiers):
-                        if (rec.features[i].qualifiers[qualifier][0] == "true"):
-                            input= GraphicFeature(start=int(rec.features[i].location.start), end=int(rec.features[i].location.end),
-                                                  strand=int(strand), color=coloring)
-                        else: 
-                            input = GraphicFeature(start=int(rec.features[i].location.start), end=int(rec.features[i].location.end),
-                                            strand=int(strand), label=str(rec.features[i].qualifiers[qualifier][0]), color=coloring)
-                    else:
-                        input= GraphicFeature(start=int(rec.features[i].location.start), end=int(rec.features[i].location.end),
-                                          strand=int(strand), color=coloring)
-
-                    # Append DNA features plot
-                    features.append(input)
+        # Load the GFF region, subset based on chr and feature type
+        gff = region_features(infile, contig, feature, start_nt, end_nt)
+
+        for f_start, f_end, f_strand, qualifiers in gff:
+
+            if (str(f_strand) == "+"):
+                strand=+1
+            else:
+                strand=-1
+
+            ## Label not in the gene plot
+            if (qualifier in qualifiers):
+                if (qualifiers[qualifier][0] == "true"):
+                    input= GraphicFeature(start=f_start, end=f_end, strand=int(strand), color=coloring)
+                else: 
+                    input = GraphicFeature(start=f_start, end=f_end, strand=int(strand), label=str(qualifiers[qualifier][0]), color=coloring)
+            else:
+                input= GraphicFeature(start=f_start, end=f_end, strand=int(strand), color=coloring)
+
+            # Append DNA features plot
+            features.append(input)
 
         # Append to legend
         legend_entries.append(
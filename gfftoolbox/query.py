@@ -0,0 +1,182 @@
+## Def query help
+usage_query="""
+gff-toolbox:
+
+            Mongo-query
+
+This command reads back, as GFF or JSON, the features of a GFF mongo database created with the convert command.
+
+usage:
+    gff-toolbox mongo-query -h | --help
+    gff-toolbox mongo-query [ --db_name <db_name> --genome_name <genome_name> --mongo_path <mongo_path> --mongo_uri <uri> --mongo_timeout <seconds> ] [ --contig <contig_name> --start <int> --end <int> --type <feature_type> --attribute <key=value> --format <format> --output <file> --batch_size <int> ]
+
+options:
+                                                      General
+
+    -h, --help                                              Show this screen.
+    -d, --db_name=<db_name>                                 Name of the mongodb database to query. [Default: annotation_db].
+    -n, --genome_name=<genome_name>                         Collection (genome) to query. [Default: Genome].
+    -p, --mongo_path=<mongo_path>                           Where the mongoDB is saved, a mongod is started there when no server is running. [Default: ./mongodb].
+    --mongo_uri=<uri>                                       Use the MongoDB server of this URI (e.g. mongodb://host:27017) instead of the local one.
+    --mongo_timeout=<seconds>                               How long to wait for the MongoDB server to answer. [Default: 30].
+
+                                                      Queries
+                                Obs: all the given queries must match, without any the whole collection is given
+
+    -c, --contig=<contig_name>                              Only features of this contig (1st column).
+    -s, --start=<int>                                       With --contig, only features ending at or after this position.
+    -e, --end=<int>                                         With --contig, only features starting at or before this position.
+    -t, --type=<feature_type>                               Only features of these types (3rd column). Comma separated, eg. CDS,rRNA.
+    -a, --attribute=<key=value>                             Only features with these attributes (9th column), separated by semicolons as in the GFF,
+                                                            eg. "gbkey=CDS;product=flavodoxin". Dbxref and Ontology_term values are given as DBTAG:ID.
+
+                                                      Output
+
+    -f, --format=<format>                                   Output format: gff or json (JSON Lines, one feature per line). [Default: gff].
+    -o, --output=<file>                                     Write the features to this file instead of the stdout. [Default: stdout].
+    -b, --batch_size=<int>                                  Features fetched from the server at a time. [Default: 1000].
+
+
+example:
+
+    ## Create the GFF mongodb collection named Kp, if it doesnt exist yet
+
+    $ gff-toolbox convert --format mongodb -i Kp_ref.gff --genome_name Kp
+
+    ## Get, as GFF, the CDS features overlapping the first 10 kb of a contig
+
+    $ gff-toolbox mongo-query -n Kp --contig NC_016845.1 --start 1 --end 10000 --type CDS
+
+    ## Get, as JSON, the feature of a gene id
+
+    $ gff-toolbox mongo-query -n Kp --attribute "ID=gene-KPHS_00010" --format json
+
+"""
+
+##################################
+### Loading Necessary Packages ###
+##################################
+import urllib.parse
+from .outputs import output_opener, write_json_lines
+from .mongo import mongo_client, close_clients, mongo_timeout
+
+######################################
+### GFF columns names -- immutable ###
+######################################
+gff_cols = ["recid", "source", "type", "start", "end", "score", "strand", "phase", "attributes"]
+
+# Attributes stored as lists of {"DBTAG": ..., "ID": ...} by convert and mongo-ingest
+db_reference_keys = ["Dbxref", "Ontology_terms", "Ontology_term"]
+
+# Printable characters written as they are in attribute values, the GFF3 reserved ones
+# (;=&, and the control characters) are percent encoded. '%' is kept, as convert stores
+# the values as they were in the GFF, already encoded.
+attribute_safe = "".join(chr(code) for code in range(32, 127) if chr(code) not in ";=&,")
+
+##################################
+### Functions to build a query ###
+##################################
+def region_query(contig=None, start=None, end=None):
+
+    # Features overlapping [start, end] (1-based, inclusive), served by the (recid, start, end) index
+    query = {}
+    if contig != None:
+        query["recid"] = contig
+        if end != None:
+            query["start"] = {"$lte": int(end)}
+        if start != None:
+            query["end"] = {"$gte": int(start)}
+
+    return query
+
+def attribute_query(attributes):
+
+    query = {}
+    for atts in str(attributes).split(";"):
+        key, value = atts.split("=", 1)
+        key, value = key.strip(), value.strip()
+        if key in db_reference_keys and ":" in value:
+            dbtag, id = value.split(":", 1)
+            query[f"attributes.{key}"] = {"$elemMatch": {"DBTAG": dbtag, "ID": id}}
+        else:
+            # Also matches a value among the list of a multi valued attribute
+            query[f"attributes.{key}"] = value
+
+    return query
+
+###################################
+### Functions to write features ###
+###################################
+def dict_to_att(attributes):
+
+    # Back to the 9th column, as att_to_dict of convert reads it
+    atts = []
+    for key, value in attributes.items():
+        values = value if isinstance(value, list) else [value]
+        values = [f"{x['DBTAG']}:{x['ID']}" if isinstance(x, dict) else str(x) for x in values]
+        atts.append(f"{key}=" + ",".join(urllib.parse.quote(x, safe=attribute_safe) for x in values))
+
+    return ";".join(atts)
+
+def feature_to_gff(feature):
+    columns = [str(feature[col]) for col in gff_cols[:-1]] + [dict_to_att(feature["attributes"])]
+    return "\t".join(columns) + "\n"
+
+################
+### Def main ###
+################
+def mongo_query(db_name, genome_name, mongo_path, contig=None, start=None, end=None, feature_type=None, attributes=None,
+                format="gff", output=None, batch_size=1000, mongo_uri=None, timeout=mongo_timeout):
+
+    format = str(format).lower()
+    if format not in ["gff", "json"]:
+        print(f"""
+Error: --format must be either 'gff' or 'json'. {format} is incorrect.
+        """)
+
+    elif any(value != None and not str(value).isdigit() for value in [start, end, batch_size]) or int(batch_size) == 0:
+        print(f"""
+Error: --start, --end and --batch_size must be positive integers.
+        """)
+
+    elif (start != None or end != None) and contig == None:
+        print(f"""
+Error: --start and --end can only be used with --contig.
+        """)
+
+    elif attributes != None and any("=" not in atts for atts in str(attributes).split(";")):
+        print(f"""
+Error: --attribute must be written as key=value pairs, separated by semicolons. {attributes} is incorrect.
+        """)
+
+    elif not str(timeout).replace(".", "", 1).isdigit():
+        print(f"""
+Error: --mongo_timeout must be a number of seconds. {timeout} is incorrect.
+        """)
+
+    else:
+        query = region_query(contig, start, end)
+        if feature_type != None:
+            query["type"] = {"$in": str(feature_type).split(",")}
+        if attributes != None:
+            query.update(attribute_query(attributes))
+
+        try:
+            client = mongo_client(uri=mongo_uri, mongo_path=mongo_path, db_name=db_name, log_name=f"mongo_{genome_name}", timeout=float(timeout))
+
+            # The server gives the features a batch at a time, in the order they were loaded
+            cursor = client[db_name][genome_name].find(query, {"_id": 0}, batch_size=int(batch_size))
+            with output_opener(output) as out:
+                if format == "json":
+                    write_json_lines(cursor, out)
+                else:
+                    out.write("##gff-version 3\n")
+                    for feature in cursor:
+                        out.write(feature_to_gff(feature))
+
+        except ConnectionError as error:
+            print(f"""
+Error: {error}.
+        """)
+        finally:
+            close_clients()
@@ -0,0 +1,494 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import re
+import os
+import gzip
+import random
+from math import sqrt
+from collections import Counter, deque
+from itertools import groupby
+from operator import itemgetter, sub
+from concurrent.futures import ProcessPoolExecutor
+
+##################################
+### Feature summary statistics ###
+##################################
+# Same limits (and keys) as BCBio's GFFExaminer.available_limits
+limit_keys = ["gff_id", "gff_source_type", "gff_source", "gff_type"]
+
+# Strands counted apart, anything else is counted as '.'
+strands = ["+", "-", ".", "?"]
+
+# The GFF is read in blocks of whole lines, parsed column-wise
+summary_block_size = 4 * 1024 * 1024
+
+# Feature lines: seqid, source, type, start, end, strand and attributes (comments and lines
+# with less than 8 columns don't match). Attribute keys are read with a ';' before each line.
+feature_row     = re.compile(rb'^(?!#)([^\t\n]*)\t([^\t\n]*)\t([^\t\n]*)\t([^\t\n]*)\t([^\t\n]*)\t[^\t\n]*\t([^\t\n]*)\t[^\t\n]*(?:\t([^\n]*))?$', re.M)
+
+# The same lines, but only the columns of the limits: seqid, source, type and strand
+feature_columns = re.compile(rb'^(?!#)([^\t\n]*)\t([^\t\n]*)\t([^\t\n]*)\t[^\t\n]*\t[^\t\n]*\t[^\t\n]*\t([^\t\n]*)\t[^\t\n]*(?:\t[^\n]*)?$', re.M)
+attribute_key   = re.compile(rb';([^;=\n]*)=')
+sequence_region = re.compile(rb'##sequence-region[ \t]+(\S+)[ \t]+(\d+)[ \t]+(\d+)')
+
+##################################
+### Sampled summary statistics ###
+##################################
+# Bytes parsed by a sampled overview, and the largest size of each sampled block.
+# Smaller budgets use smaller blocks, so there are always enough of them to give intervals.
+sample_bytes      = 64 * 1024 * 1024
+sample_block_size = 1024 * 1024
+sample_min_blocks = 32
+
+# Estimates are given with 95% confidence intervals
+sample_confidence = 0.95
+sample_z          = 1.96
+
+##############################################
+### Function to summarise a GFF, in a pass ###
+##############################################
+def gff_summary(handle, threads=1, statistics=False):
+
+    # Everything is counted from the raw lines (bytes), a block at a time: the limits
+    # of the examiner and, with statistics, lengths, strands, attribute keys and the nest
+    # of the features. Blocks are independent, so they can be counted by many processes
+    # and merged in order.
+    counts = _block_counts()
+    for part in _counted_blocks(_blocks(handle), threads, statistics):
+        _merge_counts(counts, part)
+
+    return _summary(counts, statistics)
+
+def _counted_blocks(blocks, threads, statistics=True):
+
+    if threads <= 1:
+        for block in blocks:
+            yield _count_block(block, statistics)
+        return
+
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=threads) as pool:
+        for block in blocks:
+            pending.append(pool.submit(_count_block, block, statistics))
+            if len(pending) >= 2 * threads:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+
+def _block_counts():
+    return {
+        "columns"   : Counter(), # (seqid, source, type, strand) -> features
+        "lengths"   : Counter(), # (type, end - start) -> features
+        "ends"      : {},        # seqid -> largest end
+        "regions"   : {},        # seqid -> length, from ##sequence-region
+        "keys"      : Counter(), # attribute key -> features having it
+        "parents"   : {},        # ID of a child feature -> its Parent IDs
+        "children"  : Counter(), # Parent IDs -> child lines
+        "features"  : 0,
+        "malformed" : 0,
+        "bytes"     : 0
+    }
+
+def _count_block(block, statistics=True):
+
+    counts = _block_counts()
+    counts["bytes"] = len(block)
+
+    # The limits alone only need four columns, counted as they are matched
+    if not statistics:
+        rows = feature_columns.findall(block)
+        counts["features"]  = len(rows)
+        counts["malformed"] = _feature_lines(block) - len(rows)
+        counts["columns"].update(rows)
+        return counts
+
+    for seqid, start, end in sequence_region.findall(block):
+        counts["regions"][seqid] = int(end) - int(start) + 1
+
+    rows = feature_row.findall(block)
+    counts["features"]  = len(rows)
+    counts["malformed"] = _feature_lines(block) - len(rows)
+    counts["columns"].update(map(itemgetter(0, 1, 2, 5), rows))
+
+    # Lengths, and the largest end of each run of lines of a sequence
+    types, starts, stops = list(map(itemgetter(2), rows)), _integers(map(itemgetter(3), rows)), _integers(map(itemgetter(4), rows))
+    if None in starts or None in stops:
+        types, starts, stops = zip(*[(type, start, stop) for type, start, stop in zip(types, starts, stops)
+                                     if start is not None and stop is not None]) or ((), (), ())
+    counts["lengths"].update(zip(types, map(sub, stops, starts)))
+
+    ends = counts["ends"]
+    for seqid, lines in groupby(zip(map(itemgetter(0), rows), stops), key=itemgetter(0)):
+        stop = max((stop for seqid, stop in lines if stop is not None), default=0)
+        if stop > ends.get(seqid, 0):
+            ends[seqid] = stop
+
+    # Attribute keys of every feature, IDs and Parents only of the children
+    attributes = list(map(itemgetter(6), rows))
+    counts["keys"].update(attribute_key.findall(b";" + b"\n;".join(attributes)))
+    for atts in attributes:
+        if b"Parent=" not in atts:
+            continue
+        atts  = b";" + atts + b";"
+        start = atts.find(b";Parent=")
+        if start < 0:
+            continue
+        parent = tuple(atts[start + 8:atts.find(b";", start + 8)].strip().split(b","))
+        counts["children"][parent] += 1
+        start = atts.find(b";ID=")
+        if start >= 0:
+            counts["parents"].setdefault(atts[start + 4:atts.find(b";", start + 4)].strip(), parent)
+
+    return counts
+
+def _merge_counts(counts, part):
+    for key in ["columns", "lengths", "keys", "children"]:
+        counts[key].update(part[key])
+    for seqid, stop in part["ends"].items():
+        if stop > counts["ends"].get(seqid, 0):
+            counts["ends"][seqid] = stop
+    for id, parent in part["parents"].items():
+        counts["parents"].setdefault(id, parent)
+    counts["regions"].update(part["regions"])
+    counts["features"]  += part["features"]
+    counts["malformed"] += part["malformed"]
+    counts["bytes"]     += part["bytes"]
+
+def _blocks(handle, size=None):
+
+    # Blocks end at a line end, annotations end at ##FASTA
+    while True:
+        block = handle.read(summary_block_size if size is None else size)
+        if not block:
+            return
+        block += handle.readline()
+
+        if block.startswith(b"##FASTA"):
+            return
+        fasta = block.find(b"\n##FASTA")
+        if fasta >= 0:
+            yield block[:fasta + 1]
+            return
+        yield block
+
+def _feature_lines(block):
+
+    # Lines that are neither empty nor comments, the malformed ones are those not matched
+    lines    = block.count(b"\n") + (0 if block.endswith(b"\n") else 1)
+    comments = block.count(b"\n#") + block.startswith(b"#")
+    blank    = block.count(b"\n\n") + block.startswith(b"\n")
+    return lines - comments - blank
+
+def _integers(values):
+    values = list(values)
+    try:
+        return list(map(int, values))
+    except ValueError:
+        return [int(value) if value.strip().isdigit() else None for value in values]
+
+#######################################################
+### Function to estimate a summary from GFF samples ###
+#######################################################
+def gff_sample_summary(handle, budget=sample_bytes, seed=None, threads=1):
+
+    # Only about 'budget' bytes are parsed, in blocks of whole lines. Plain files are
+    # sampled at random offsets; streams (stdin, gzip) go through a reservoir of blocks.
+    rng  = random.Random(seed)
+    size = max(1, min(sample_block_size, budget // sample_min_blocks))
+    if isinstance(handle, gzip.GzipFile) or not handle.seekable():
+        method = "reservoir"
+        blocks, total, population = _reservoir_blocks(handle, budget, size, rng)
+    else:
+        method = "offsets"
+        total  = os.fstat(handle.fileno()).st_size
+        blocks, population = _offset_blocks(handle, total, budget, size, rng)
+
+    parts = list(_counted_blocks(blocks, threads))
+    return _sample_summary(parts, total, population, method)
+
+def _offset_blocks(handle, total, budget, size, rng):
+
+    # Block i holds the lines starting in (i * size, (i + 1) * size], so each line is in a single block
+    population = max(1, -(-total // size))
+    wanted     = max(1, budget // size)
+    chosen     = range(population) if wanted >= population else sorted(rng.sample(range(population), wanted))
+
+    def blocks():
+        for index in chosen:
+            handle.seek(index * size)
+            if index > 0:
+                handle.readline()
+            if handle.tell() > (index + 1) * size:
+                yield b""
+                continue
+            yield handle.read((index + 1) * size - handle.tell()) + handle.readline()
+
+    return blocks(), population
+
+def _reservoir_blocks(handle, budget, size, rng):
+
+    # Streams are read to the end once, but only the blocks kept in the reservoir are parsed
+    wanted    = max(1, budget // size)
+    reservoir = []
+    total     = 0
+    seen      = 0
+    for block in _blocks(handle, size):
+        total += len(block)
+        if len(reservoir) < wanted:
+            reservoir.append(block)
+        else:
+            index = rng.randrange(seen + 1)
+            if index < wanted:
+                reservoir[index] = block
+        seen += 1
+
+    return reservoir, total, max(1, seen)
+
+def _block_tallies(part):
+
+    # What is estimated, per block: feature counts of the limits and attribute keys, and lengths per type
+    tallies = Counter({("features",): part["features"]})
+    for (seqid, source, type, sign), count in part["columns"].items():
+        seqid, source, type = _text(seqid), _text(source), _text(type)
+        tallies[("gff_id", (seqid,))] += count
+        tallies[("gff_source_type", (source, type))] += count
+        tallies[("gff_source", (source,))] += count
+        tallies[("gff_type", (type,))] += count
+    for key, count in part["keys"].items():
+        tallies[("attribute", _text(key))] += count
+    for (type, length), count in part["lengths"].items():
+        tallies[("length", _text(type))] += (length + 1) * count
+        tallies[("measured", _text(type))] += count
+
+    return tallies
+
+def _ratio(values, bases, fraction):
+
+    # Ratio estimator of cluster (block) sampling, with its standard error
+    n    = len(values)
+    base = sum(bases)
+    if base == 0:
+        return 0, None
+    ratio = sum(values) / base
+    if fraction >= 1:
+        return ratio, 0
+    if n < 2:
+        return ratio, None
+    variance = sum((value - ratio * size) ** 2 for value, size in zip(values, bases)) / (n - 1)
+    return ratio, sqrt((1 - fraction) * variance / n) / (base / n)
+
+def _estimate(ratio, error, scale, floor=0, digits=0):
+    estimate = round(ratio * scale, digits) if digits > 0 else round(ratio * scale)
+    if error is None:
+        return {"estimate": estimate, "low": None, "high": None}
+    low  = max(floor, (ratio - sample_z * error) * scale)
+    high = (ratio + sample_z * error) * scale
+    return {"estimate": estimate,
+            "low"     : round(low, digits) if digits > 0 else round(low),
+            "high"    : round(high, digits) if digits > 0 else round(high)}
+
+def _sample_summary(parts, total, population, method):
+
+    tallies  = [_block_tallies(part) for part in parts]
+    sizes    = [part["bytes"] for part in parts]
+    fraction = len(parts) / population
+    names    = set().union(*tallies)
+
+    # Counts are estimated per byte of the file, the observed count being the least possible
+    def count(name):
+        values = [tally[name] for tally in tallies]
+        return _estimate(*_ratio(values, sizes, fraction), scale=total, floor=sum(values))
+
+    # Attribute keys, as the fraction of the features having them, and the mean length of each type
+    def per_feature(name, bases, digits):
+        return _estimate(*_ratio([tally[name] for tally in tallies], [tally[bases] for tally in tallies], fraction),
+                         scale=1, digits=digits)
+
+    limits = {key: {} for key in limit_keys}
+    for name in sorted(name for name in names if name[0] in limit_keys):
+        limits[name[0]][name[1]] = count(name)
+
+    return {
+        "sample"     : {"method": method, "blocks": len(parts), "bytes": sum(sizes), "total_bytes": total,
+                        "fraction": round(sum(sizes) / total, 4) if total > 0 else None, "confidence": sample_confidence},
+        "features"   : count(("features",)),
+        "limits"     : limits,
+        "types"      : {type: {"count": limits["gff_type"][(type,)],
+                               "length_mean": per_feature(("length", type), ("measured", type), digits=2)}
+                        for (type,) in limits["gff_type"]},
+        "attributes" : {key: {"count": count(("attribute", key)), "fraction": per_feature(("attribute", key), ("features",), digits=4)}
+                        for key in sorted(name[1] for name in names if name[0] == "attribute")}
+    }
+
+##################################################
+### Functions to put the counts into a summary ###
+##################################################
+def _text(value):
+    return value.decode(errors="replace").strip()
+
+def _summary(counts, statistics=True):
+
+    # Same limits as the examiner, which strips the columns of spaces
+    limits = {key: Counter() for key in limit_keys}
+    strand = {}
+    for (seqid, source, type, sign), count in counts["columns"].items():
+        seqid, source, type, sign = _text(seqid), _text(source), _text(type), _text(sign)
+        limits["gff_id"][(seqid,)] += count
+        limits["gff_source_type"][(source, type)] += count
+        limits["gff_source"][(source,)] += count
+        limits["gff_type"][(type,)] += count
+        strand.setdefault(type, Counter())[sign if sign in strands else "."] += count
+
+    if not statistics:
+        return {
+            "limits"    : {key: dict(counts) for key, counts in limits.items()},
+            "features"  : counts["features"],
+            "malformed" : counts["malformed"]
+        }
+
+    type_lengths = {}
+    for (type, length), count in counts["lengths"].items():
+        type_lengths.setdefault(_text(type), Counter())[length + 1] += count
+
+    # Densities use the ##sequence-region lengths, or the largest end of each sequence
+    seqids = {seqid: {"features": count, "length": 0} for (seqid,), count in limits["gff_id"].items()}
+    for seqid, stop in counts["ends"].items():
+        seqids[_text(seqid)]["length"] = max(seqids[_text(seqid)]["length"], stop)
+    for seqid, length in counts["regions"].items():
+        if _text(seqid) in seqids:
+            seqids[_text(seqid)]["length"] = length
+    genome = sum(stats["length"] for stats in seqids.values())
+
+    # Features without a Parent are at depth 1, children one below their deepest parent
+    depths = _depths(counts["parents"])
+    depth  = Counter({1: counts["features"] - sum(counts["children"].values())})
+    for parent, count in counts["children"].items():
+        depth[1 + max(depths.get(id, 1) for id in parent)] += count
+    depth  = {level: count for level, count in sorted(depth.items()) if count > 0}
+
+    attribute_keys = Counter()
+    for key, count in counts["keys"].items():
+        attribute_keys[_text(key)] += count
+
+    return {
+        "limits"     : {key: dict(counts) for key, counts in limits.items()},
+        "features"   : counts["features"],
+        "malformed"  : counts["malformed"],
+        "seqids"     : seqids,
+        "types"      : {type: _type_summary(count, type_lengths.get(type, Counter()), strand[type], genome)
+                        for (type,), count in limits["gff_type"].items()},
+        "attributes" : dict(attribute_keys.most_common()),
+        "hierarchy"  : {"max_depth": max(depth, default=0), "depth": depth}
+    }
+
+def _type_summary(count, lengths, strand, genome):
+
+    # Lengths in power of 2 bins (1, 2-3, 4-7, ...)
+    measured  = sum(lengths.values())
+    total     = sum(length * features for length, features in lengths.items())
+    histogram = Counter()
+    for length, features in lengths.items():
+        histogram[max(length, 0).bit_length()] += features
+
+    return {
+        "count"  : count,
+        "length" : {
+            "min"       : min(lengths) if measured > 0 else None,
+            "max"       : max(lengths) if measured > 0 else None,
+            "mean"      : round(total / measured, 2) if measured > 0 else None,
+            "total"     : total,
+            "histogram" : {_bin_label(bin): histogram[bin] for bin in sorted(histogram)}
+        },
+        "strand" : {key: strand[key] for key in strands},
+        "per_mb" : round(count * 1e6 / genome, 2) if genome > 0 else None
+    }
+
+def _bin_label(bin):
+    return "0" if bin == 0 else f"{1 << (bin - 1)}-{(1 << bin) - 1}"
+
+def _depths(parents):
+
+    # Depth of the children that are parents too. Parents without a Parent
+    # are top level (depth 1), cycles are broken where they close.
+    depths = {}
+    for id in parents:
+        stack = [id]
+        while len(stack) > 0:
+            current = stack[-1]
+            if current in depths:
+                stack.pop()
+                continue
+            pending = [p for p in parents[current] if p in parents and p not in depths and p not in stack]
+            if len(pending) > 0:
+                stack.extend(pending)
+                continue
+            depths[current] = 1 + max(depths.get(p, 1) for p in parents[current])
+            stack.pop()
+
+    return depths
+
+######################################################
+### Functions to write the summary, as JSON or TSV ###
+######################################################
+def summary_json(summary):
+
+    # Limits are keyed by tuples, joined by tabs as the columns they come from
+    json_ready = dict(summary)
+    json_ready["limits"] = {key: {"\t".join(value): count for value, count in counts.items()}
+                            for key, counts in summary["limits"].items()}
+    return json_ready
+
+def summary_rows(summary):
+
+    # Long format: section, name, statistic, value
+    yield ("features", "all", "count", summary["features"])
+    yield ("features", "all", "malformed", summary["malformed"])
+    seqids = summary.get("seqids", {seqid: {"features": count} for (seqid,), count in summary["limits"]["gff_id"].items()})
+    for seqid, stats in seqids.items():
+        for statistic, value in stats.items():
+            yield ("seqid", seqid, statistic, value)
+    for source_type, count in summary["limits"]["gff_source_type"].items():
+        yield ("source_type", ":".join(source_type), "count", count)
+
+    # Without statistics, only the counts of the limits
+    if "types" not in summary:
+        for (type,), count in summary["limits"]["gff_type"].items():
+            yield ("type", type, "count", count)
+        return
+
+    for type, stats in summary["types"].items():
+        yield ("type", type, "count", stats["count"])
+        for statistic in ["min", "max", "mean", "total"]:
+            yield ("type", type, f"length_{statistic}", stats["length"][statistic])
+        for bin, count in stats["length"]["histogram"].items():
+            yield ("type", type, f"length_bin_{bin}", count)
+        for strand, count in stats["strand"].items():
+            yield ("type", type, f"strand_{strand}", count)
+        yield ("type", type, "per_mb", stats["per_mb"])
+    for key, count in summary["attributes"].items():
+        yield ("attribute", key, "count", count)
+    yield ("hierarchy", "all", "max_depth", summary["hierarchy"]["max_depth"])
+    for depth, count in summary["hierarchy"]["depth"].items():
+        yield ("hierarchy", str(depth), "count", count)
+
+def sample_rows(summary):
+
+    # Same long format, each estimate followed by the bounds of its interval
+    def estimate(section, name, statistic, value):
+        yield (section, name, statistic, value["estimate"])
+        yield (section, name, f"{statistic}_low", value["low"])
+        yield (section, name, f"{statistic}_high", value["high"])
+
+    for statistic, value in summary["sample"].items():
+        yield ("sample", "all", statistic, value)
+    yield from estimate("features", "all", "count", summary["features"])
+    for key, counts in summary["limits"].items():
+        for name, value in counts.items():
+            yield from estimate(key, ":".join(name), "count", value)
+    for type, stats in summary["types"].items():
+        yield from estimate("type", type, "length_mean", stats["length_mean"])
+    for key, stats in summary["attributes"].items():
+        yield from estimate("attribute", key, "count", stats["count"])
+        yield from estimate("attribute", key, "fraction", stats["fraction"])
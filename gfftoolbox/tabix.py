@@ -0,0 +1,193 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import gzip
+from struct import unpack_from
+from Bio import bgzf
+from .inputs import is_bgzf
+
+###################################
+### Tabix (.tbi) and .csi setup ###
+###################################
+# Indexes made by 'tabix -p gff' (or 'tabix --csi') over a bgzipped, sorted GFF.
+# A .tbi always bins the genome with 16 kb windows in 6 levels, a .csi says it.
+tabix_suffixes = [".tbi", ".csi"]
+tbi_min_shift  = 14
+tbi_depth      = 5
+
+#################################################
+### Function to find the index of a BGZF file ###
+#################################################
+def tabix_index_path(input):
+
+    # An index older than the file it indexes is not trusted, as tabix does
+    if not is_bgzf(input):
+        return None
+
+    for suffix in tabix_suffixes:
+        path = str(input) + suffix
+        if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(input):
+            return path
+
+    return None
+
+##################################
+### Functions to read an index ###
+##################################
+def _tabix_header(data, pos):
+
+    # Format, sequence/begin/end columns (1-based), comment char, skipped lines and sequence names
+    fmt, col_seq, col_beg, col_end, meta, skip, l_nm = unpack_from("<7i", data, pos)
+    names = data[pos + 28:pos + 28 + l_nm].split(b"\0")[:-1]
+
+    header = {
+        "zero_based" : fmt & 0x10000 != 0,
+        "columns"    : (col_seq - 1, col_beg - 1, col_end - 1),
+        "meta"       : chr(meta),
+        "skip"       : skip,
+        "seqids"     : {name.decode(): n for n, name in enumerate(names)}
+    }
+
+    return header, pos + 28 + l_nm
+
+def read_tabix(path):
+
+    # Both formats are themselves BGZF compressed
+    with gzip.open(path, 'rb') as handle:
+        data = handle.read()
+
+    magic = data[:4]
+    if magic == b"TBI\x01":
+        csi = False
+        min_shift, depth = tbi_min_shift, tbi_depth
+        n_ref, = unpack_from("<i", data, 4)
+        index, pos = _tabix_header(data, 8)
+    elif magic == b"CSI\x01":
+        csi = True
+        min_shift, depth, l_aux = unpack_from("<3i", data, 4)
+        index, _ = _tabix_header(data, 16)
+        n_ref, = unpack_from("<i", data, 16 + l_aux)
+        pos = 20 + l_aux
+    else:
+        raise ValueError(f"{path} is not a tabix (.tbi) or .csi index")
+
+    # Per sequence: the chunks (pairs of virtual offsets) of each bin, and the
+    # smallest offset to start reading from (linear index for .tbi, per bin for .csi)
+    refs = []
+    for _ in range(n_ref):
+        n_bin, = unpack_from("<i", data, pos)
+        pos += 4
+        bins, loffsets = {}, {}
+        for _ in range(n_bin):
+            if csi:
+                bin, loffsets[bin], n_chunk = unpack_from("<IQi", data, pos)
+                pos += 16
+            else:
+                bin, n_chunk = unpack_from("<Ii", data, pos)
+                pos += 8
+            chunks = unpack_from(f"<{2 * n_chunk}Q", data, pos)
+            pos += 16 * n_chunk
+            bins[bin] = list(zip(chunks[0::2], chunks[1::2]))
+
+        linear = []
+        if not csi:
+            n_intv, = unpack_from("<i", data, pos)
+            linear = unpack_from(f"<{n_intv}Q", data, pos + 4)
+            pos += 4 + 8 * n_intv
+
+        refs.append({"bins": bins, "linear": linear, "loffsets": loffsets})
+
+    index.update({"min_shift": min_shift, "depth": depth, "csi": csi, "refs": refs})
+    return index
+
+#########################################
+### Functions to query the index bins ###
+#########################################
+def reg2bins(beg, end, min_shift=tbi_min_shift, depth=tbi_depth):
+
+    # Bins, at every level, that may hold features overlapping [beg, end) (0-based)
+    bins  = []
+    end  -= 1
+    shift = min_shift + depth * 3
+    first = 0
+    for level in range(depth + 1):
+        bins.extend(range(first + (beg >> shift), first + (end >> shift) + 1))
+        first += 1 << (level * 3)
+        shift -= 3
+
+    return bins
+
+def _min_offset(index, ref, beg):
+
+    # Features overlapping the region can't be stored before this virtual offset
+    if not index["csi"]:
+        linear = ref["linear"]
+        return linear[min(beg >> tbi_min_shift, len(linear) - 1)] if len(linear) > 0 else 0
+
+    # Lowest level bin holding 'beg', or its closest parent with an offset
+    shift = index["min_shift"]
+    first = ((1 << (index["depth"] * 3)) - 1) // 7
+    bin   = first + (beg >> shift)
+    while bin > 0 and bin not in ref["loffsets"]:
+        bin = (bin - 1) >> 3
+    return ref["loffsets"].get(bin, 0)
+
+def region_chunks(index, seqid, start=None, end=None):
+
+    # Merged, sorted virtual offset ranges holding the lines of a region (1-based, inclusive)
+    ref = index["seqids"].get(seqid)
+    if ref is None:
+        return [], 0, 0
+
+    beg = 0 if start is None else max(int(start) - 1, 0)
+    end = 1 << (index["min_shift"] + index["depth"] * 3) if end is None else int(end)
+    ref = index["refs"][ref]
+    min_off = _min_offset(index, ref, beg)
+
+    chunks = sorted(chunk for bin in reg2bins(beg, end, index["min_shift"], index["depth"])
+                    for chunk in ref["bins"].get(bin, ()) if chunk[1] > min_off)
+
+    merged = []
+    for chunk_beg, chunk_end in chunks:
+        if len(merged) > 0 and chunk_beg <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], chunk_end)
+        else:
+            merged.append([max(chunk_beg, min_off), chunk_end])
+
+    return merged, beg, end
+
+######################################
+### Function to read a BGZF region ###
+######################################
+def tabix_lines(input, seqids, start=None, end=None, index=None):
+
+    # The header (directives) at the top of the file, then the lines of each
+    # sequence overlapping the region, read only from the blocks the index points to
+    index = read_tabix(tabix_index_path(input)) if index is None else index
+    col_seq, col_beg, col_end = index["columns"]
+    offset = 0 if index["zero_based"] else 1
+
+    with bgzf.BgzfReader(input, 'rb') as handle:
+        for line in handle:
+            if not line.startswith(index["meta"].encode()):
+                break
+            yield line.decode()
+
+        for seqid in seqids:
+            chunks, beg, stop = region_chunks(index, seqid, start, end)
+            for chunk_beg, chunk_end in chunks:
+                handle.seek(chunk_beg)
+                while handle.tell() < chunk_end:
+                    line = handle.readline()
+                    if not line:
+                        break
+
+                    # Chunks hold whole bins, the features themselves are checked
+                    columns = line.rstrip(b"\r\n").split(b"\t")
+                    if line.startswith(index["meta"].encode()) or columns[col_seq].decode() != seqid:
+                        continue
+                    feature_beg = int(columns[col_beg]) - offset
+                    feature_end = int(columns[col_end]) if col_end >= 0 else feature_beg + 1
+                    if feature_beg < stop and feature_end > beg:
+                        yield line.decode()
@@ -0,0 +1,63 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import warnings
+import numpy as np
+from functools import lru_cache
+from Bio import BiopythonWarning
+from Bio.Seq import Seq
+
+###############################
+### Batch translation setup ###
+###############################
+# Number of sequences translated together by the callers
+translation_batch_size = 10000
+
+# Base -> code of the 64 unambiguous codons (either case, Biopython reads them upper case)
+_base_codes = np.full(256, 255, dtype=np.uint8)
+for code, base in enumerate(b"ACGT"):
+    _base_codes[base] = code
+    _base_codes[base + 32] = code
+
+_partial_codon = ("Partial codon, len(sequence) not a multiple of three. Explicitly trim the sequence or add trailing N "
+                  "before translation. This may become an error in future.")
+
+#####################################
+### Codon tables, built once each ###
+#####################################
+@lru_cache(maxsize=None)
+def codon_lookup(table):
+
+    # Amino acid of each unambiguous codon, taken from Biopython itself so both always agree
+    codons = [a + b + c for a in "ACGT" for b in "ACGT" for c in "ACGT"]
+    return np.frombuffer("".join(str(Seq(codon).translate(table=table)) for codon in codons).encode(), dtype=np.uint8)
+
+@lru_cache(maxsize=None)
+def _translate_codon(codon, table):
+    # Codons with ambiguous bases (N, R, Y, ...) are rare, Biopython resolves them
+    return str(Seq(codon).translate(table=table))
+
+####################################################
+### Function to translate many sequences at once ###
+####################################################
+def translate_batch(sequences, table):
+
+    # Same as str(Seq(sequence).translate(table=table)) for each sequence, but all
+    # the codons of the batch are looked up in a single numpy pass
+    counts = np.array([len(sequence) // 3 for sequence in sequences], dtype=np.int64)
+    if any(len(sequence) % 3 != 0 for sequence in sequences):
+        warnings.warn(_partial_codon, BiopythonWarning)
+
+    text   = "".join(sequence[:3 * count] for sequence, count in zip(sequences, counts)).encode()
+    codes  = _base_codes[np.frombuffer(text, dtype=np.uint8)].reshape(-1, 3)
+    lookup = codon_lookup(table)
+
+    ambiguous = np.any(codes == 255, axis=1)
+    index     = (codes[:, 0].astype(np.int64) << 4) | (codes[:, 1].astype(np.int64) << 2) | codes[:, 2]
+    proteins  = lookup[np.where(ambiguous, 0, index)]
+    for n in np.flatnonzero(ambiguous):
+        proteins[n] = ord(_translate_codon(text[3 * n:3 * n + 3].decode().upper(), table))
+
+    proteins = proteins.tobytes().decode()
+    bounds   = np.concatenate(([0], np.cumsum(counts)))
+    return [proteins[bounds[n]:bounds[n + 1]] for n in range(len(sequences))]
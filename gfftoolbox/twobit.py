@@ -0,0 +1,326 @@
+##################################
+### Loading Necessary Packages ###
+##################################
+import os
+import sys
+import struct
+import shutil
+import tempfile
+import numpy as np
+from io import BytesIO
+from contextlib import contextmanager
+from Bio.Seq import Seq
+from Bio.SeqRecord import SeqRecord
+from .inputs import is_stdin
+from .faidx import fasta_opener
+from .outputs import replace_file
+
+#########################
+### 2bit genome setup ###
+#########################
+# UCSC .2bit layout: 2 bits per base (T, C, A, G), with N-runs and soft-masked
+# (lowercase) runs kept aside. Files are read the same way as faToTwoBit writes them.
+twobit_suffix    = ".2bit"
+twobit_signature = 0x1A412743
+twobit_bases     = b"TCAG"
+
+# Base -> code, any other letter is not representable (N is stored as a run)
+_codes = np.full(256, 255, dtype=np.uint8)
+for code, base in enumerate(twobit_bases):
+    _codes[base] = code
+    _codes[base + 32] = code
+
+# Packed byte -> its 4 bases
+_quads = np.array([[twobit_bases[(byte >> shift) & 3] for shift in (6, 4, 2, 0)] for byte in range(256)], dtype=np.uint8)
+
+# Bases packed at a time (a multiple of 4), so the temporary arrays stay small on long chromosomes
+pack_slice_size = 1024 * 1024
+
+# Complement of every IUPAC letter, case kept
+_complement = str.maketrans("ACGTURYSWKMBDHVNacgturyswkmbdhvn", "TGCAAYRSWMKVHDBNtgcaayrswmkvhdbn")
+
+############################################
+### Function to reverse complement bases ###
+############################################
+def reverse_complement(sequence):
+    return sequence.translate(_complement)[::-1]
+
+######################################
+### Functions to pack the sequence ###
+######################################
+def _runs(flags, offset=0):
+
+    # Starts and ends of the runs of True in a boolean array
+    edges  = np.diff(np.concatenate(([False], flags, [False])).astype(np.int8))
+    starts = np.flatnonzero(edges == 1)
+    ends   = np.flatnonzero(edges == -1)
+    return starts + offset, ends + offset
+
+def _joined_runs(runs):
+
+    # Runs of consecutive slices, the ones cut at a slice boundary joined back, as starts and sizes
+    starts = np.concatenate([run[0] for run in runs] + [np.zeros(0, dtype=np.int64)])
+    ends   = np.concatenate([run[1] for run in runs] + [np.zeros(0, dtype=np.int64)])
+    if len(starts) > 0:
+        apart  = starts[1:] != ends[:-1]
+        starts = starts[np.concatenate(([True], apart))]
+        ends   = ends[np.concatenate((apart, [True]))]
+    return starts.astype(np.uint32), (ends - starts).astype(np.uint32)
+
+def pack_sequence(name, sequence):
+
+    # 2 bits per base, 4 bases per byte (first base in the highest bits)
+    n_runs, mask_runs, packed = [], [], bytearray()
+    for offset in range(0, len(sequence), pack_slice_size):
+        piece = sequence[offset:offset + pack_slice_size]
+        bases = np.frombuffer(piece.encode() if isinstance(piece, str) else piece, dtype=np.uint8)
+        codes = _codes[bases]
+        upper = bases & 0xDF
+
+        n_runs.append(_runs(upper == ord("N"), offset))
+        mask_runs.append(_runs((bases >= ord("a")) & (bases <= ord("z")), offset))
+        if np.any((codes == 255) & (upper != ord("N"))):
+            raise ValueError(f"Sequence '{name}' has bases other than A, C, G, T and N, which 2bit can't store")
+
+        codes = np.where(codes == 255, 0, codes)
+        codes = np.concatenate((codes, np.zeros(-len(codes) % 4, dtype=np.uint8))).reshape(-1, 4)
+        packed += ((codes[:, 0] << 6) | (codes[:, 1] << 4) | (codes[:, 2] << 2) | codes[:, 3]).astype(np.uint8).tobytes()
+
+    return len(sequence), _joined_runs(n_runs), _joined_runs(mask_runs), packed
+
+def _record_size(length, n_runs, mask_runs, packed):
+    return 16 + 8 * len(n_runs[0]) + 8 * len(mask_runs[0]) + len(packed)
+
+def _write_record(output, length, n_runs, mask_runs, packed):
+    output.write(struct.pack("<II", length, len(n_runs[0])))
+    output.write(n_runs[0].tobytes() + n_runs[1].tobytes())
+    output.write(struct.pack("<I", len(mask_runs[0])))
+    output.write(mask_runs[0].tobytes() + mask_runs[1].tobytes())
+    output.write(struct.pack("<I", 0))
+    output.write(packed)
+
+#######################################
+### Function to write a 2bit genome ###
+#######################################
+def write_twobit(records, output):
+
+    # records: (name, length, n_runs, mask_runs, packed), given one at a time. The
+    # index at the top needs all of them, so the packed sequences are spooled first.
+    # Version 1 (64-bit offsets) is only used when the file is over 4 Gb.
+    names, sizes = [], []
+    with tempfile.TemporaryFile(prefix="gfftoolbox_") as spool:
+        for record in records:
+            names.append(record[0].encode())
+            sizes.append(_record_size(*record[1:]))
+            _write_record(spool, *record[1:])
+
+        total   = 16 + sum(1 + len(name) + 8 for name in names) + sum(sizes)
+        version = 1 if total >= 2**32 else 0
+        width   = "<Q" if version == 1 else "<I"
+
+        output.write(struct.pack("<IIII", twobit_signature, version, len(names), 0))
+        offset = 16 + sum(1 + len(name) + struct.calcsize(width) for name in names)
+        for name, size in zip(names, sizes):
+            output.write(struct.pack("<B", len(name)) + name + struct.pack(width, offset))
+            offset += size
+
+        spool.seek(0)
+        shutil.copyfileobj(spool, output)
+
+def pack_genome(genome):
+
+    # Sequences of an indexed fasta are read and packed one at a time
+    for name in genome:
+        yield (name,) + pack_sequence(name, genome.fetch(name))
+
+########################
+### 2bit genome file ###
+########################
+def is_twobit(input):
+
+    if is_stdin(input) or not os.path.isfile(str(input)):
+        return False
+
+    with open(input, 'rb') as handle:
+        magic = handle.read(4)
+    return len(magic) == 4 and twobit_signature in struct.unpack("<I", magic) + struct.unpack(">I", magic)
+
+class TwoBitGenome:
+    """Packed genome (.2bit file, or its bytes in memory) with the FastaIndex interface.
+
+    Sequences are unpacked only for the requested slices, with N and soft-masked runs applied.
+    """
+
+    def __init__(self, source):
+        self.handle = BytesIO(source) if isinstance(source, bytes) else open(source, 'rb')
+
+        # Byte order is told by the signature
+        signature, = struct.unpack("<I", self.handle.read(4))
+        self.endian = "<" if signature == twobit_signature else ">"
+        version, count, reserved = self._unpack("III")
+        width = "Q" if version == 1 else "I"
+
+        self.offsets = {}
+        for _ in range(count):
+            size, = self._unpack("B")
+            name  = self.handle.read(size).decode()
+            self.offsets[name], = self._unpack(width)
+
+        self.headers = {}
+
+    def _unpack(self, fmt, count=1):
+        fmt  = self.endian + fmt * count
+        return struct.unpack(fmt, self.handle.read(struct.calcsize(fmt)))
+
+    def _runs(self):
+        count, = self._unpack("I")
+        starts = np.array(self._unpack("I", count), dtype=np.int64)
+        sizes  = np.array(self._unpack("I", count), dtype=np.int64)
+        return starts, starts + sizes
+
+    def _header(self, name):
+
+        # Length, N runs, mask runs and where the packed bases start
+        if name not in self.headers:
+            self.handle.seek(self.offsets[name])
+            length, = self._unpack("I")
+            n_runs, mask_runs = self._runs(), self._runs()
+            self._unpack("I")
+            self.headers[name] = (length, n_runs, mask_runs, self.handle.tell())
+        return self.headers[name]
+
+    def __contains__(self, name):
+        return name in self.offsets
+
+    def __iter__(self):
+        return iter(self.offsets)
+
+    def length(self, name):
+        return self._header(name)[0]
+
+    def fetch(self, name, start=0, end=None):
+
+        # Bases [start, end) of a sequence (0-based, as python slices)
+        length, n_runs, mask_runs, packed_start = self._header(name)
+        start = min(max(int(start), 0), length)
+        end   = length if end is None else min(max(int(end), start), length)
+        if start == end:
+            return ""
+
+        self.handle.seek(packed_start + start // 4)
+        packed = np.frombuffer(self.handle.read((end - 1) // 4 - start // 4 + 1), dtype=np.uint8)
+        bases  = _quads[packed].ravel()[start % 4:start % 4 + end - start]
+
+        for (run_starts, run_ends), apply in [(n_runs, "N"), (mask_runs, "mask")]:
+            first = np.searchsorted(run_ends, start, side="right")
+            last  = np.searchsorted(run_starts, end, side="left")
+            for run_start, run_end in zip(run_starts[first:last], run_ends[first:last]):
+                lo, hi = max(run_start, start) - start, min(run_end, end) - start
+                if apply == "N":
+                    bases[lo:hi] = ord("N")
+                else:
+                    bases[lo:hi] |= 0x20
+
+        return bases.tobytes().decode()
+
+    def fetch_reverse_complement(self, name, start=0, end=None):
+        return reverse_complement(self.fetch(name, start, end))
+
+    def description(self, name):
+        # .2bit files only keep the sequence names
+        return name
+
+    def record(self, name):
+        return SeqRecord(Seq(self.fetch(name)), id=name, name=name, description=self.description(name))
+
+    def close(self):
+        self.handle.close()
+
+#####################
+### Genome opener ###
+#####################
+@contextmanager
+def genome_opener(input, twobit=False):
+
+    # A .2bit genome is read as it is. With 'twobit', a fasta is packed once
+    # into <fasta>.2bit (reused while newer than the fasta), or kept packed in
+    # memory if it can't be saved (always, for stdin). Otherwise the fasta is
+    # read through its .fai.
+    if is_twobit(input):
+        genome = TwoBitGenome(input)
+    elif twobit and is_stdin(input):
+        yield from _packed_stdin(input)
+        return
+    elif twobit:
+        genome = _packed_genome(input)
+    else:
+        genome = None
+
+    if genome is None:
+        with fasta_opener(input) as genome:
+            yield genome
+        return
+
+    try:
+        yield genome
+    finally:
+        genome.close()
+
+def _packed_genome(input):
+
+    path = str(input) + twobit_suffix
+    if os.path.isfile(path) and os.path.getmtime(path) >= os.path.getmtime(input):
+        return TwoBitGenome(path)
+
+    # Bases 2bit can't store (IUPAC codes other than N) keep the fasta index
+    def write(output):
+        with fasta_opener(input) as fasta:
+            write_twobit(pack_genome(fasta), output)
+
+    try:
+        return _saved_genome(input, path, write)
+    except ValueError as error:
+        print(f"Warning: {error}. The fasta is read through its index instead.", file=sys.stderr)
+        return None
+
+def _packed_stdin(input):
+
+    # Stdin can only be read once: it is copied to an indexed temporary fasta, packed
+    # in memory from there, and that same fasta is used if it can't be packed
+    with fasta_opener(input) as fasta:
+        packed = BytesIO()
+        try:
+            write_twobit(pack_genome(fasta), packed)
+        except ValueError as error:
+            print(f"Warning: {error}. The fasta is read through its index instead.", file=sys.stderr)
+            yield fasta
+            return
+
+        genome = TwoBitGenome(packed.getvalue())
+        try:
+            yield genome
+        finally:
+            genome.close()
+
+def _saved_genome(input, path, write):
+
+    # Written to a temporary file first, so a broken .2bit is never left behind
+    try:
+        handle = tempfile.NamedTemporaryFile(mode="wb", dir=os.path.dirname(os.path.abspath(path)), delete=False)
+    except OSError:
+        handle = None
+    if handle is not None:
+        try:
+            with handle:
+                write(handle)
+            replace_file(handle.name, path)
+            return TwoBitGenome(path)
+        except OSError:
+            os.remove(handle.name)
+        except BaseException:
+            os.remove(handle.name)
+            raise
+
+    packed = BytesIO()
+    write(packed)
+    return TwoBitGenome(packed.getvalue())
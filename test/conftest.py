@@ -0,0 +1,17 @@
+import os
+import pytest
+from gfftoolbox import cache
+
+# GFFs shipped in this folder
+data_dir = os.path.dirname(os.path.abspath(__file__))
+
+@pytest.fixture
+def data():
+    return lambda name: os.path.join(data_dir, name)
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+
+    # Results are cached in a throwaway folder, never in the user cache
+    monkeypatch.setattr(cache, "cache_dir", str(tmp_path / "cache"))
+    return tmp_path / "cache"
@@ -0,0 +1,74 @@
+import os
+from gfftoolbox import cache
+from gfftoolbox.cache import cached, cache_key
+
+def counter():
+    calls = []
+    def compute():
+        calls.append(1)
+        return {"calls": len(calls)}
+    return compute, calls
+
+def test_cached_once(tmp_path, cache_dir):
+    path = tmp_path / "a.gff"
+    path.write_text("chr1\tsrc\tgene\t1\t10\t.\t+\t.\tID=a\n")
+    compute, calls = counter()
+
+    assert cached("overview", str(path), compute) == {"calls": 1}
+    assert cached("overview", str(path), compute) == {"calls": 1}
+    assert len(calls) == 1
+
+    # Other options, or the cache disabled, are computed again
+    assert cached("overview", str(path), compute, options={"statistics": True}) == {"calls": 2}
+    assert cached("overview", str(path), compute, enabled=False) == {"calls": 3}
+    assert len(list(cache_dir.iterdir())) == 2
+
+def test_changed_input(tmp_path):
+    path = tmp_path / "a.gff"
+    path.write_text("chr1\tsrc\tgene\t1\t10\t.\t+\t.\tID=a\n")
+    compute, calls = counter()
+    cached("overview", str(path), compute)
+
+    # A different size or modification time is a different key
+    path.write_text("chr1\tsrc\tgene\t1\t10\t.\t+\t.\tID=b;Name=b\n")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert cached("overview", str(path), compute) == {"calls": 2}
+
+def test_stdin_never_cached(cache_dir):
+    compute, calls = counter()
+    assert cache_key("overview", "stdin") is None
+    cached("overview", "stdin", compute)
+    cached("overview", "stdin", compute)
+    assert len(calls) == 2
+    assert not cache_dir.exists()
+
+def test_broken_result(tmp_path):
+    path = tmp_path / "a.gff"
+    path.write_text("chr1\tsrc\tgene\t1\t10\t.\t+\t.\tID=a\n")
+    compute, calls = counter()
+    cached("overview", str(path), compute)
+
+    # A truncated result is computed (and saved) again
+    result = os.path.join(cache.cache_dir, cache_key("overview", str(path)) + cache.cache_suffix)
+    with open(result, "wb") as handle:
+        handle.write(b"\x80")
+    assert cached("overview", str(path), compute) == {"calls": 2}
+    assert cached("overview", str(path), compute) == {"calls": 2}
+
+def test_eviction(tmp_path, cache_dir, monkeypatch):
+
+    # The least recently used results go first
+    monkeypatch.setattr(cache, "cache_size_limit", 2500)
+    paths = []
+    for n in range(3):
+        paths.append(tmp_path / f"{n}.gff")
+        paths[-1].write_text(f"chr{n}\n")
+        cached("overview", str(paths[-1]), lambda: "x" * 1000)
+        os.utime(os.path.join(cache.cache_dir, cache_key("overview", str(paths[-1])) + cache.cache_suffix), ns=(n * 10 ** 9, n * 10 ** 9))
+
+    cached("overview", str(paths[0]), lambda: "x" * 1000)
+    names = set(os.listdir(cache_dir))
+    assert cache_key("overview", str(paths[1])) + cache.cache_suffix not in names
+    assert cache_key("overview", str(paths[0])) + cache.cache_suffix in names
+    assert cache_key("overview", str(paths[2])) + cache.cache_suffix in names
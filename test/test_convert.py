@@ -0,0 +1,96 @@
+import json
+import random
+import pytest
+from Bio import SeqIO
+from Bio.Seq import Seq
+from gfftoolbox.convert import convert
+
+def settings(**options):
+    values = dict(fasta_features="CDS", translation_table=11, db_name="annotation_db", genome_name="Genome", mongo_path="./mongodb")
+    values.update(options)
+    return values
+
+@pytest.fixture
+def genome(tmp_path):
+
+    # Two sequences, with nested and flat features (no fasta inside the GFF)
+    random.seed(3)
+    sequences = {"chr1": "".join(random.choice("ACGT") for n in range(3000)), "chr2": "".join(random.choice("ACGT") for n in range(600))}
+    fasta = tmp_path / "genome.fa"
+    fasta.write_text("".join(f">{name}\n" + "\n".join(seq[i:i + 60] for i in range(0, len(seq), 60)) + "\n" for name, seq in sequences.items()))
+
+    gff = tmp_path / "genome.gff"
+    gff.write_text(
+        "##gff-version 3\n"
+        "chr2\tsrc\tgene\t11\t310\t.\t+\t.\tID=g2\n"
+        "chr1\tsrc\tregion\t1\t3000\t.\t+\t.\tID=chr1\n"
+        "chr1\tsrc\tgene\t101\t400\t.\t+\t.\tID=g1;Name=A\n"
+        "chr1\tsrc\tCDS\t101\t400\t.\t+\t0\tParent=g1;product=x\n"
+        "chr1\tsrc\ttRNA\t1001\t1076\t.\t-\t.\tID=t1\n"
+    )
+    return str(gff), str(fasta), sequences
+
+def fasta_records(path):
+    return [(record.id, str(record.seq)) for record in SeqIO.parse(path, "fasta")]
+
+def test_fasta_nt(genome, tmp_path):
+    gff, fasta, sequences = genome
+    output = tmp_path / "out.fa"
+    convert(gff, "fasta-nt", fasta, output=str(output), **settings(fasta_features="gene,CDS,tRNA"))
+
+    # Sequences sorted by id, each feature followed by its nest. Features without ID are named by their location.
+    assert fasta_records(output) == [("g1", sequences["chr1"][100:400]), ("CDS_chr1:100-400", sequences["chr1"][100:400]),
+                                     ("t1", sequences["chr1"][1000:1076]), ("g2", sequences["chr2"][10:310])]
+
+def test_fasta_aa(genome, tmp_path):
+    gff, fasta, sequences = genome
+    output = tmp_path / "out.fa"
+    convert(gff, "fasta-aa", fasta, output=str(output), **settings())
+    assert fasta_records(output) == [("CDS_chr1:100-400", str(Seq(sequences["chr1"][100:400]).translate(table=11)))]
+
+def test_fasta_twobit(genome, tmp_path):
+    gff, fasta, sequences = genome
+    outputs = [tmp_path / "fai.fa", tmp_path / "2bit.fa"]
+    for output, twobit in zip(outputs, [False, True]):
+        convert(gff, "fasta-nt", fasta, output=str(output), twobit=twobit, **settings(fasta_features="gene,CDS,tRNA"))
+    assert outputs[0].read_text() == outputs[1].read_text()
+
+def test_fasta_inferred_parent(genome, tmp_path):
+
+    # Children of a missing parent are nested by BCBio, under the parent it infers
+    gff, fasta, sequences = genome
+    with open(gff, "a") as handle:
+        handle.write("chr2\tsrc\texon\t11\t100\t.\t+\t.\tParent=zz\nchr2\tsrc\texon\t201\t310\t.\t+\t.\tParent=zz\n")
+    output = tmp_path / "out.fa"
+    convert(gff, "fasta-nt", fasta, output=str(output), **settings(fasta_features="exon"))
+    assert fasta_records(output) == [("exon_chr2:10-100", sequences["chr2"][10:100]), ("exon_chr2:200-310", sequences["chr2"][200:310])]
+
+def test_json(genome, tmp_path):
+    gff, fasta, sequences = genome
+    output = tmp_path / "out.json"
+    convert(gff, "json", fasta, output=str(output), **settings())
+
+    features = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [(feature["recid"], feature["type"]) for feature in features] == [("chr2", "gene"), ("chr1", "region"), ("chr1", "gene"),
+                                                                             ("chr1", "CDS"), ("chr1", "tRNA")]
+    assert features[3]["attributes"] == {"Parent": "g1", "product": "x"}
+    assert features[3]["sequence"] == str(Seq(sequences["chr1"][100:400]).translate(table=11))
+    assert features[2]["sequence"] == sequences["chr1"][100:400]
+    assert "sequence" not in features[1]
+
+def test_genbank(genome, tmp_path):
+    gff, fasta, sequences = genome
+    output = tmp_path / "out.gbk"
+    convert(gff, "genbank", fasta, output=str(output), **settings())
+
+    records = {record.id: record for record in SeqIO.parse(output, "genbank")}
+    assert sorted(records) == ["chr1", "chr2"]
+    assert str(records["chr1"].seq) == sequences["chr1"]
+    assert [feature.type for feature in records["chr1"].features] == ["region", "gene", "CDS", "tRNA"]
+    cds = records["chr1"].features[2]
+    assert cds.qualifiers["translation"] == [str(Seq(sequences["chr1"][100:400]).translate(table=11))]
+
+def test_bad_format(genome, capsys):
+    gff, fasta, sequences = genome
+    convert(gff, "xml", fasta, **settings())
+    assert "Error: I can't understand xml format" in capsys.readouterr().out
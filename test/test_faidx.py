@@ -0,0 +1,25 @@
+import gzip
+import random
+from gfftoolbox.faidx import fasta_opener
+
+def test_single_line_gzip_fasta(tmp_path):
+
+    # Plain gzip, with unwrapped and unevenly wrapped sequences, is rewrapped before indexing
+    random.seed(1)
+    long  = "".join(random.choice("ACGT") for n in range(1_000_003))
+    short = "".join(random.choice("ACGT") for n in range(150))
+    path  = tmp_path / "genome.fa.gz"
+    with gzip.open(path, "wt") as handle:
+        handle.write(f">chr1 first\n{long}\n>chr2\n{short[:100]}\n{short[100:]}\n")
+
+    with fasta_opener(str(path)) as genome:
+        assert genome.fetch("chr1") == long
+        assert genome.fetch("chr1", 999_990, 1_000_003) == long[999_990:]
+        assert genome.fetch("chr2", 95, 105) == short[95:105]
+        assert genome.description("chr1") == "chr1 first"
+
+def test_plain_fasta(tmp_path):
+    path = tmp_path / "genome.fa"
+    path.write_text(">chr1\nACGTAC\nGTA\n")
+    with fasta_opener(str(path)) as genome:
+        assert genome.fetch("chr1", 4, 8) == "ACGT"
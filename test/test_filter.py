@@ -0,0 +1,247 @@
+from io import StringIO
+from gfftoolbox.filter import filter_loose_mode
+
+missing_coordinates = (
+    "chr1\tsrc\tgene\t10\t100\t.\t+\t.\tID=a\n"
+    "chr1\tsrc\tgene\t\t200\t.\t+\t.\tID=b\n"
+    "chr1\tsrc\tgene\t5\t\t.\t-\t.\tID=c\n"
+    "chr1\tsrc\tgene\t7\t70\t.\t-\t.\tID=d\n"
+)
+
+def loose(path, **options):
+    settings = dict(column=9, pattern=None, sort=False, header=False, strand=None, start_pos=None, end_pos=None, chunk_size=2)
+    settings.update(options)
+    output = StringIO()
+    filter_loose_mode(path, output=output, **settings)
+    return output.getvalue()
+
+def test_loose_missing_coordinates(tmp_path):
+
+    # Missing starts and ends are kept as they are, but never pass a position filter
+    path = tmp_path / "missing.gff"
+    path.write_text(missing_coordinates)
+    assert loose(str(path)) == missing_coordinates
+    assert [line.split("\t")[8] for line in loose(str(path), start_pos=6).splitlines()] == ["ID=a", "ID=d"]
+    assert [line.split("\t")[8] for line in loose(str(path), end_pos=150).splitlines()] == ["ID=a", "ID=d"]
+    assert [line.split("\t")[8] for line in loose(str(path), sort=True).splitlines()] == ["ID=c", "ID=d", "ID=a", "ID=b"]
+
+def test_loose_large_coordinates(tmp_path):
+
+    # Coordinates past 4 Gb (large contigs, pseudo-chromosomes) are kept and compared as they are
+    path = tmp_path / "large.gff"
+    path.write_text("chr1\tsrc\tgene\t10\t100\t.\t+\t.\tID=a\n"
+                    "chr1\tsrc\tgene\t5000000000\t5000001000\t.\t+\t.\tID=b\n"
+                    "chr1\tsrc\tgene\t4294967295\t4294967296\t.\t-\t.\tID=c\n")
+    assert loose(str(path)) == path.read_text()
+    assert [line.split("\t")[8] for line in loose(str(path), start_pos=4294967296).splitlines()] == ["ID=b"]
+    assert [line.split("\t")[8] for line in loose(str(path), sort=True).splitlines()] == ["ID=a", "ID=c", "ID=b"]
+
+def test_loose_fixed_strings(tmp_path):
+
+    # With -F the patterns are literal strings, as with grep -F
+    path = tmp_path / "literal.gff"
+    path.write_text("chr1\tsrc\tgene\t10\t100\t.\t+\t.\tID=a;Note=a.b\n"
+                    "chr1\tsrc\tgene\t10\t100\t.\t+\t.\tID=b;Note=axb\n"
+                    "chr1\tsrc\tgene\t10\t100\t.\t+\t.\tID=c;Note=x\n")
+    ids = lambda text: [line.split("\t")[8].split(";")[0] for line in text.splitlines()]
+    assert ids(loose(str(path), pattern="a.b,zz", fixed_strings=True)) == ["ID=a"]
+    assert ids(loose(str(path), pattern="a.b,zz")) == ["ID=a", "ID=b"]
+
+def test_loose_pattern(data):
+    lines = loose(data("Kp_ref.gff"), pattern="transcriptional regulator", strand="plus", chunk_size=1000).splitlines()
+    assert len(lines) > 0
+    assert all("transcriptional regulator" in line and line.split("\t")[6] != "-" for line in lines)
+
+###################
+### Exact mode ###
+###################
+import io
+import os
+import sys
+import shutil
+import pytest
+from BCBio import GFF
+from gfftoolbox.filter import filter_exact_mode, filter_chunk, filter_record, read_att_file
+from gfftoolbox import gffindex
+
+nested = (
+    "##gff-version 3\n"
+    "chr1\tsrc\tgene\t100\t900\t.\t+\t.\tID=g1;Name=A\n"
+    "chr1\tsrc\tmRNA\t100\t900\t.\t+\t.\tID=m1;Parent=g1;product=\"x; y\"\n"
+    "chr1\tsrc\texon\t100\t300\t.\t+\t.\tID=e1;Parent=m1\n"
+    "chr1\tsrc\tCDS\t150\t300\t.\t+\t0\tID=c1;Parent=m1;Dbxref=A:1,B:2\n"
+    "chr1\tsrc\tgene\t1000\t2000\t.\t-\t.\tID=g2;Name=B;Note=a%2Cb\n"
+    "chr1\tsrc\tCDS\t1000\t2000\t.\t-\t0\tID=c2 ; Parent=g2\n"
+    "chr1\tsrc\trepeat\t2100\t2200\t.\t.\t.\tNote=flat\n"
+    "chr1\tsrc\tncRNA\t2500\t2600\t.\t-\t.\tID=n1;Parent=missing\n"
+)
+
+# Nests BCBio has to fix itself, filtered by BCBio as before
+fallbacks = {
+    "multi_parent"    : "chr1\tsrc\texon\t100\t200\t.\t+\t.\tID=x1;Parent=m1,g2\n",
+    "inferred_parent" : "chr1\tsrc\texon\t100\t200\t.\t+\t.\tParent=zz\nchr1\tsrc\texon\t300\t400\t.\t+\t.\tParent=zz\n",
+    "duplicated_id"   : "chr1\tsrc\tCDS\t400\t500\t.\t+\t0\tID=c1;Parent=m1\n",
+    "gff2"            : "chr1\tsrc\tgene\t3000\t3100\t.\t+\t.\tgene_id \"g9\"; transcript_id \"t9\"\n",
+}
+
+filters = [(None, None, None, None), (None, "plus", None, None), (None, "minus", None, None), (None, None, 150, None),
+           (None, None, None, 950), ({"Name": {"A"}}, None, None, None), ({"ID": {"e1", "n1"}}, None, None, None),
+           ({"Dbxref": {"B:2"}}, "plus", 100, 2000), ({"product": {"x; y"}}, None, None, None), ({"Note": {"a,b"}}, None, None, None)]
+
+def written(records):
+    out = StringIO()
+    for rec in records:
+        if len(rec.features) > 0:
+            GFF.write([rec], out)
+    return out.getvalue()
+
+@pytest.mark.parametrize("extra", [""] + list(fallbacks.values()), ids=["compact"] + list(fallbacks))
+@pytest.mark.parametrize("att_filter, strand, start_pos, end_pos", filters)
+def test_filter_chunk_as_bcbio(extra, att_filter, strand, start_pos, end_pos):
+
+    # The compact features give the same GFF as filtering the BCBio records
+    chunk    = nested + extra
+    expected = written(filter_record(rec, att_filter, strand, start_pos, end_pos) for rec in GFF.parse(StringIO(chunk)))
+    assert written(filter_chunk(chunk, att_filter, strand, start_pos, end_pos)) == expected
+
+@pytest.fixture
+def kp(data, tmp_path):
+    path = tmp_path / "Kp_ref.gff"
+    shutil.copy(data("Kp_ref.gff"), path)
+    return str(path)
+
+def exact(path, **options):
+    settings = dict(chr_limits=None, source_limits=None, type_limits=None, start_pos=None, end_pos=None, strand=None, att_file=None)
+    settings.update(options)
+    output = StringIO()
+    filter_exact_mode(path, output=output, **settings)
+    return output.getvalue()
+
+def features(text):
+
+    # Feature lines, but the one BCBio writes for the record annotations
+    lines = [line.split("\t") for line in text.splitlines() if line.strip() and not line.startswith("#")]
+    return [line for line in lines if line[1:3] != ["annotation", "remark"]]
+
+def test_exact_limits(kp):
+    lines = features(exact(kp, chr_limits="NC_016845.1", type_limits="CDS"))
+    assert len(lines) > 0
+    assert all(line[0] == "NC_016845.1" and line[2] == "CDS" for line in lines)
+
+def test_exact_region(kp):
+    lines = features(exact(kp, type_limits="gene", start_pos=5900, end_pos=50000, strand="minus"))
+    assert len(lines) > 0
+    assert all(int(line[3]) >= 5900 and int(line[4]) <= 50000 and line[6] != "+" for line in lines)
+
+def test_exact_fixed_strings(kp):
+    assert features(exact(kp, type_limits="t.NA", fixed_strings=True)) == []
+    assert {line[2] for line in features(exact(kp, type_limits="t.NA"))} == {"tRNA"}
+    assert {line[2] for line in features(exact(kp, type_limits="tRNA,rRNA", fixed_strings=True))} == {"tRNA", "rRNA"}
+
+def test_exact_attributes(kp, data):
+    products = read_att_file(data("atts.txt"))["product"]
+    lines    = features(exact(kp, att_file=data("atts.txt")))
+    assert len(lines) > 0
+    assert {value for line in lines for value in products if f"product={value}" in line[8]} == products
+
+@pytest.mark.parametrize("use_index", [True, False])
+def test_exact_threads(kp, use_index):
+    options = dict(type_limits="CDS,gene", strand="plus", start_pos=1000, use_index=use_index)
+    assert exact(kp, threads=2, **options) == exact(kp, threads=1, **options)
+
+def test_exact_directives(kp):
+
+    # Every sequence is written with all the sequence regions of the GFF, as when BCBio parses all of it
+    remarks = [line for line in exact(kp, type_limits="gene", end_pos=9000, use_index=False).splitlines() if "\tremark\t" in line]
+    assert len(remarks) == 7
+    assert all(remark.count("sequence-region") == 1 and remark.count("%28%27NC_") == 7 for remark in remarks)
+
+def test_exact_index_in_cache(kp, cache_dir, monkeypatch):
+
+    # The index is built once into the user cache, never next to the GFF
+    first = exact(kp, type_limits="gene", start_pos=1000)
+    assert not os.path.exists(kp + ".gffidx")
+    assert [name.endswith(".gffidx") for name in os.listdir(cache_dir)] == [True]
+
+    def build_index(input):
+        raise AssertionError("index built again")
+    monkeypatch.setattr(gffindex, "build_index", build_index)
+    assert exact(kp, type_limits="gene", start_pos=1000) == first
+
+def test_exact_index_touched(kp, cache_dir):
+
+    # A cached index is touched on each use, so the cache evicts the least recently used first
+    assert gffindex.load_index(kp) is not None
+    path = gffindex.cached_index_path(kp)
+    os.utime(path, (1, 1))
+    assert gffindex.load_index(kp, build=False) is not None
+    assert os.stat(path).st_mtime > 1
+
+def test_exact_unindexable(tmp_path, cache_dir):
+
+    # Features without coordinates can't be indexed, the GFF is filtered without the index as BCBio does
+    path = tmp_path / "dot.gff"
+    path.write_text("##gff-version 3\n"
+                    "chr1\tsrc\tgene\t100\t900\t.\t+\t.\tID=g1\n"
+                    "chr1\tsrc\tgap\t.\t.\t.\t+\t.\tID=x1\n"
+                    "chr1\tsrc\tCDS\t100\t900\t.\t+\t0\tID=c1;Parent=g1\n"
+                    "chr1\tsrc\tgene\t2000\t2900\t.\t-\t.\tID=g2\n")
+    text = exact(str(path), start_pos=50, end_pos=1000)
+    assert text == exact(str(path), start_pos=50, end_pos=1000, use_index=False)
+    assert [line[8] for line in features(text)] == ["ID=g1", "ID=c1;Parent=g1"]
+    assert not cache_dir.exists()
+
+# Lines of a sequence need not be together, e.g. gene and CDS GFFs concatenated
+interleaved = (
+    "##gff-version 3\n"
+    "chr1\tsrc\tgene\t100\t900\t.\t+\t.\tID=g1\n"
+    "chr2\tsrc\tgene\t100\t900\t.\t+\t.\tID=g2\n"
+    "chr1\tsrc\tCDS\t100\t900\t.\t+\t0\tID=c1;Parent=g1\n"
+    "chr2\tsrc\tCDS\t100\t900\t.\t+\t0\tID=c2;Parent=g2\n"
+)
+
+@pytest.fixture
+def mixed(tmp_path):
+    path = tmp_path / "interleaved.gff"
+    path.write_text(interleaved)
+    (tmp_path / "atts.txt").write_text("##ID\ng1\n")
+    return str(path)
+
+def records(text):
+
+    # Each sequence record, with its features (seqid, ID)
+    result = []
+    for line in features(text):
+        if len(result) == 0 or result[-1][0] != line[0]:
+            result.append((line[0], []))
+        result[-1][1].append(line[8].split(";")[0])
+    return result
+
+@pytest.mark.parametrize("options, expected", [
+    (dict(strand="plus"), [("chr1", ["ID=g1", "ID=c1"]), ("chr2", ["ID=g2", "ID=c2"])]),
+    (dict(start_pos=50, use_index=True), [("chr1", ["ID=g1", "ID=c1"]), ("chr2", ["ID=g2", "ID=c2"])]),
+    (dict(start_pos=50, use_index=False), [("chr1", ["ID=g1", "ID=c1"]), ("chr2", ["ID=g2", "ID=c2"])]),
+    (dict(attributes=True), [("chr1", ["ID=g1", "ID=c1"])]),
+], ids=["strand", "index", "no_index", "attributes"])
+def test_exact_interleaved(mixed, options, expected):
+
+    # One record per sequence, with the children of the features that pass
+    if options.pop("attributes", False):
+        options["att_file"] = os.path.join(os.path.dirname(mixed), "atts.txt")
+    text = exact(mixed, **options)
+    assert records(text) == expected
+    assert text.count("##gff-version") == len(expected)
+
+def test_exact_interleaved_stdin(mixed, monkeypatch):
+    with open(mixed, "rb") as handle:
+        monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BufferedReader(io.BytesIO(handle.read()))))
+    assert records(exact("stdin", strand="plus")) == [("chr1", ["ID=g1", "ID=c1"]), ("chr2", ["ID=g2", "ID=c2"])]
+
+@pytest.mark.parametrize("options", [dict(strand="plus"), dict(start_pos=50, use_index=True), dict(start_pos=50, use_index=False)],
+                         ids=["strand", "index", "no_index"])
+def test_exact_interleaved_threads(mixed, options):
+
+    # The workers get whole sequences too, and give the same GFF as a single process
+    text = exact(mixed, threads=2, **options)
+    assert records(text) == [("chr1", ["ID=g1", "ID=c1"]), ("chr2", ["ID=g2", "ID=c2"])]
+    assert text == exact(mixed, **options)
@@ -0,0 +1,43 @@
+import gzip
+import pytest
+from gfftoolbox.gffindex import region_lines
+
+small = (
+    "##gff-version 3\n"
+    "chr1\tsrc\tgene\t100\t900\t.\t+\t.\tID=g1\n"
+    "chr1\tsrc\tCDS\t100\t300\t.\t+\t0\tID=c1;Parent=g1\n"
+    "chr1\tsrc\texon\t800\t900\t.\t+\t.\tID=e1;Parent=g1\n"
+    "chr2\tsrc\tgene\t850\t950\t.\t+\t.\tID=g9\n"
+    "chr1\tsrc\tgene\t1000\t1500\t.\t-\t.\tID=g2\n"
+    "chr1\tsrc\tCDS\t1000\t1500\t.\t-\t0\tID=c2;Parent=g2\n"
+    "chr1\tsrc\trepeat\t1200\t1300\t.\t.\t.\tID=r1\n"
+    "chr1\tsrc\tgene\t5000\t6000\t.\t+\t.\tID=g3\n"
+)
+
+@pytest.fixture(params=["plain", "gzip"])
+def gff(request, tmp_path):
+    if request.param == "plain":
+        path = tmp_path / "small.gff"
+        path.write_text(small)
+    else:
+        path = tmp_path / "small.gff.gz"
+        path.write_bytes(gzip.compress(small.encode()))
+    return str(path)
+
+def ids(lines):
+    return [line.split("\t")[8].strip().split(";")[0][3:] for line in lines if not line.startswith("#")]
+
+def test_region_overlap(gff):
+
+    # Features overlapping the region with their whole nest, in file order, plus the
+    # feature of the sequence ending last (BCBio takes the sequence length from it)
+    assert ids(region_lines(gff, seqids={"chr1"}, start=850, end=1100)) == ["g1", "c1", "e1", "g2", "c2", "g3"]
+
+def test_region_types(gff):
+    types = {"gene"}.__contains__
+    assert ids(region_lines(gff, seqids={"chr1"}, type_match=types, start=1100, end=1250)) == ["g2", "g3"]
+    assert ids(region_lines(gff, seqids={"chr2"}, type_match=types, start=0, end=10000)) == ["g9"]
+
+def test_region_all(gff):
+    assert ids(region_lines(gff, seqids={"chr1"})) == ["g1", "c1", "e1", "g2", "c2", "r1", "g3"]
+    assert ids(region_lines(gff, seqids={"chr3"}, start=1, end=100)) == []
@@ -0,0 +1,99 @@
+import pytest
+from pymongo import UpdateOne
+from gfftoolbox.ingest import annotation_updates, ingest_annotations
+
+annotations = [
+    "FeatureId\tAnnotId\tIdType\tDescription\n",
+    "gene-1\tPTHR1\tPANTHER\tTRANSPORTER\n",
+    "gene-1\tGO:0006810\tGO\ttransport\n",
+    "gene-1\tPTHR1\tPANTHER\tTRANSPORTER\n",
+    "gene-2\tGO:0003735\tGO\t\n",
+    "gene-1\t3.4.16.2\tEC\tpeptidase\n",
+]
+
+class StubCollection:
+
+    # In memory collection, only for the bulk updates of mongo-ingest: each UpdateOne
+    # is applied to the first matching document, with $addToSet and $each.
+    def __init__(self, documents=()):
+        self.documents = [dict(document, attributes=dict(document["attributes"])) for document in documents]
+        self.batches   = []
+
+    def _matches(self, document, query):
+        return all((document["attributes"].get(key[len("attributes."):]) if key.startswith("attributes.") else document.get(key)) == value
+                   for key, value in query.items())
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append(operations)
+        matched = 0
+        for operation in operations:
+            document = next((document for document in self.documents if self._matches(document, operation._filter)), None)
+            if document is None:
+                continue
+            matched += 1
+            for field, values in operation._doc["$addToSet"].items():
+                current = document["attributes"].setdefault(field[len("attributes."):], [])
+                current.extend(value for value in values["$each"] if value not in current)
+        return type("BulkWriteResult", (), {"matched_count": matched})()
+
+def test_annotation_updates():
+
+    # One update per feature, with all its (distinct) annotations
+    counts  = {"annotations": 0, "features": 0}
+    updates = list(annotation_updates(annotations, "gene", has_header=True, batch_size=1000, counts=counts))
+    assert counts == {"annotations": 5, "features": 2}
+    assert updates == [
+        UpdateOne({"type": "gene", "attributes.ID": "gene-1"},
+                  {"$addToSet": {"attributes.Dbxref": {"$each": [{"DBTAG": "PANTHER", "ID": "PTHR1", "Description": "TRANSPORTER"},
+                                                                 {"DBTAG": "EC", "ID": "3.4.16.2", "Description": "peptidase"}]},
+                                 "attributes.Ontology_term": {"$each": [{"DBTAG": "GO", "ID": "GO:0006810", "Description": "transport"}]}}}),
+        UpdateOne({"type": "gene", "attributes.ID": "gene-2"},
+                  {"$addToSet": {"attributes.Ontology_term": {"$each": [{"DBTAG": "GO", "ID": "GO:0003735"}]}}}),
+    ]
+
+def test_annotation_updates_in_batches():
+
+    # Features are sent once 'batch_size' of them are grouped, so one split apart is updated twice
+    counts  = {"annotations": 0, "features": 0}
+    updates = list(annotation_updates(annotations, "gene", has_header=True, batch_size=1, counts=counts))
+    assert [update._filter["attributes.ID"] for update in updates] == ["gene-1", "gene-2", "gene-1"]
+    assert counts == {"annotations": 5, "features": 3}
+
+def test_annotation_updates_whole_features():
+
+    # A full batch is only sent when the next feature starts, never in the middle of one
+    counts  = {"annotations": 0, "features": 0}
+    lines   = [f"gene-1\tGO:{n}\tGO\t\n" for n in range(4)] + [f"gene-2\tPTHR{n}\tPANTHER\t\n" for n in range(3)]
+    updates = list(annotation_updates(lines, "gene", has_header=False, batch_size=1, counts=counts))
+    assert [update._filter["attributes.ID"] for update in updates] == ["gene-1", "gene-2"]
+    assert [len(update._doc["$addToSet"]["attributes.Ontology_term"]["$each"]) for update in updates[:1]] == [4]
+    assert len(updates[1]._doc["$addToSet"]["attributes.Dbxref"]["$each"]) == 3
+    assert counts == {"annotations": 7, "features": 2}
+
+def test_annotation_updates_bad_line(capsys):
+    counts  = {"annotations": 0, "features": 0}
+    updates = list(annotation_updates(["gene-1\tGO:1\n"], "gene", has_header=False, batch_size=10, counts=counts))
+    assert updates == []
+    assert "Error: Could not unpack" in capsys.readouterr().out
+
+@pytest.mark.parametrize("threads", [1, 2])
+def test_ingest_annotations(tmp_path, threads):
+    collection = StubCollection([
+        {"recid": "chr1", "type": "gene", "start": 1, "end": 90, "attributes": {"ID": "gene-1", "Dbxref": [{"DBTAG": "GeneID", "ID": "7"}]}},
+        {"recid": "chr1", "type": "gene", "start": 100, "end": 190, "attributes": {"ID": "gene-2"}},
+        {"recid": "chr1", "type": "CDS", "start": 1, "end": 90, "attributes": {"ID": "gene-1"}},
+    ])
+    path = tmp_path / "annotations.tsv"
+    path.write_text("".join(annotations) + "gene-3\tGO:1\tGO\tmissing\n")
+
+    # Ingesting twice adds nothing new, annotations are a set. Only genes are updated.
+    for n in range(2):
+        assert ingest_annotations(collection, str(path), "gene", batch_size=2, threads=threads) == 2
+
+    gene, other, cds = collection.documents
+    assert gene["attributes"]["Dbxref"] == [{"DBTAG": "GeneID", "ID": "7"},
+                                            {"DBTAG": "PANTHER", "ID": "PTHR1", "Description": "TRANSPORTER"},
+                                            {"DBTAG": "EC", "ID": "3.4.16.2", "Description": "peptidase"}]
+    assert gene["attributes"]["Ontology_term"] == [{"DBTAG": "GO", "ID": "GO:0006810", "Description": "transport"}]
+    assert other["attributes"]["Ontology_term"] == [{"DBTAG": "GO", "ID": "GO:0003735"}]
+    assert cds["attributes"] == {"ID": "gene-1"}
@@ -0,0 +1,50 @@
+import io
+import os
+import sys
+import gzip
+import pytest
+from gfftoolbox.inputs import gzip_opener, spill_stdin
+
+text = "##gff-version 3\nchr1\tsrc\tgene\t1\t10\t.\t+\t.\tID=g1\n"
+
+@pytest.fixture
+def stdin(monkeypatch):
+
+    # Feeds bytes to the commands through sys.stdin.buffer, as a pipe would
+    def feed(data):
+        monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BufferedReader(io.BytesIO(data))))
+    return feed
+
+@pytest.mark.parametrize("input", [None, "stdin", "-"])
+def test_plain_stdin(stdin, input):
+    stdin(text.encode())
+    assert gzip_opener(input, "rt").read() == text
+
+def test_plain_stdin_bytes(stdin):
+    stdin(text.encode())
+    assert gzip_opener("stdin", "rb").read() == text.encode()
+
+@pytest.mark.parametrize("mode, expected", [("rt", text), ("rb", text.encode())])
+def test_gzip_stdin(stdin, mode, expected):
+    stdin(gzip.compress(text.encode()))
+    assert gzip_opener("stdin", mode).read() == expected
+
+@pytest.mark.parametrize("data", [text.encode(), gzip.compress(text.encode())], ids=["plain", "gzip"])
+def test_spill_stdin(stdin, data):
+
+    # Stdin is copied as it is, to a file that can be read many times and is removed afterwards
+    stdin(data)
+    with spill_stdin("stdin") as path:
+        assert path != "stdin"
+        with open(path, "rb") as handle:
+            assert handle.read() == data
+        assert gzip_opener(path, "rt").read() == text
+        assert gzip_opener(path, "rt").read() == text
+    assert not os.path.exists(path)
+
+def test_spill_file(tmp_path):
+    path = tmp_path / "genome.gff"
+    path.write_text(text)
+    with spill_stdin(str(path)) as spilled:
+        assert spilled == str(path)
+    assert path.exists()
@@ -0,0 +1,55 @@
+import random
+import pytest
+import pandas as pd
+from gfftoolbox import matcher
+from gfftoolbox.matcher import LiteralMatcher, compile_patterns, pattern_matcher, series_matcher
+
+@pytest.fixture(params=["native", "python"])
+def automaton(request, monkeypatch):
+
+    # Both the pyahocorasick automaton and the pure-Python one
+    if request.param == "native":
+        pytest.importorskip("ahocorasick")
+    else:
+        monkeypatch.setattr(matcher, "ahocorasick", None)
+    return LiteralMatcher
+
+def naive(patterns, text):
+    return any(pattern in text for pattern in patterns)
+
+@pytest.mark.parametrize("patterns", [
+    ["he", "she", "his", "hers"],      # overlapping, one inside another
+    ["aab", "ab", "b"],                # suffixes of each other, found by failure links
+    ["abcd", "bc"],                    # one found inside a failed longer match
+    ["a.b", "(x)", "c*"],              # regex characters are literal
+    [""],                              # empty pattern: any text
+    ["xyz", ""],
+    [],                                # no pattern: no text
+])
+def test_literal_cases(automaton, patterns):
+    texts = ["", "ushers", "she", "hi", "aaab", "xab", "abcx", "xbcx", "abd", "a.b", "axb", "(x)", "c", "xy", "zz"]
+    search = automaton(patterns).search
+    assert [search(text) for text in texts] == [naive(patterns, text) for text in texts]
+
+def test_literal_random(automaton):
+    rng = random.Random(11)
+    for n in range(200):
+        patterns = ["".join(rng.choice("ab") for _ in range(rng.randint(0, 4))) for _ in range(rng.randint(1, 5))]
+        search   = automaton(patterns).search
+        for m in range(20):
+            text = "".join(rng.choice("abc") for _ in range(rng.randint(0, 12)))
+            assert search(text) == naive(patterns, text), (patterns, text)
+
+def test_compile_patterns():
+    assert compile_patterns(["a.c"], fixed_strings=True)("abc") is False
+    assert compile_patterns(["a.c"], fixed_strings=False)("abc") is True
+
+def test_pattern_matcher(automaton):
+    matches = pattern_matcher(["RNA"], fixed_strings=True)
+    assert [matches(value) for value in ["tRNA", "gene", "tRNA", "rRNA"]] == [True, False, True, True]
+
+def test_series_matcher(automaton):
+    search = LiteralMatcher(["RNA"]).search
+    values = ["tRNA", None, "gene", "rRNA"]
+    assert list(series_matcher(pd.Series(values), search)) == [True, False, False, True]
+    assert list(series_matcher(pd.Series(values, dtype="category"), search)) == [True, False, False, True]
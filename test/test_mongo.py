@@ -0,0 +1,41 @@
+import pytest
+from gfftoolbox.mongo import insert_batches
+
+class StubCollection:
+
+    # In memory collection, only for insert_many: keeps each batch, and can
+    # fail on one of them as a server would
+    def __init__(self, fail_at=None):
+        self.batches = []
+        self.fail_at = fail_at
+
+    def insert_many(self, documents, ordered=True):
+        if len(self.batches) == self.fail_at:
+            raise RuntimeError("insert failed")
+        self.batches.append(list(documents))
+        return type("InsertManyResult", (), {"inserted_ids": [document["n"] for document in documents]})()
+
+@pytest.mark.parametrize("background", [False, True])
+def test_insert_batches(background):
+
+    # Documents are taken from a generator and sent in order, 'batch_size' at a time
+    collection = StubCollection()
+    inserted   = insert_batches(collection, ({"n": n} for n in range(25)), batch_size=10, background=background)
+    assert inserted == 25
+    assert [len(batch) for batch in collection.batches] == [10, 10, 5]
+    assert [document["n"] for batch in collection.batches for document in batch] == list(range(25))
+
+@pytest.mark.parametrize("background", [False, True])
+def test_insert_nothing(background):
+    collection = StubCollection()
+    assert insert_batches(collection, iter(()), batch_size=10, background=background) == 0
+    assert collection.batches == []
+
+@pytest.mark.parametrize("background", [False, True])
+def test_insert_error(background):
+
+    # An error in the writer thread reaches the caller, and no batch is sent after it
+    collection = StubCollection(fail_at=2)
+    with pytest.raises(RuntimeError, match="insert failed"):
+        insert_batches(collection, ({"n": n} for n in range(100)), batch_size=10, background=background)
+    assert len(collection.batches) == 2
@@ -0,0 +1,19 @@
+import gzip
+from io import BytesIO
+from Bio import bgzf
+from gfftoolbox.outputs import BgzfTextWriter, bgzf_block_size, bgzf_eof
+
+def test_bgzf_writer():
+
+    # Several blocks, readable by any BGZF reader and closed with the empty EOF block
+    text   = "".join(f"chr1\ttest\tgene\t{i}\t{i + 10}\t.\t+\t.\tID=gene-{i}\n" for i in range(20000))
+    stream = BytesIO()
+    writer = BgzfTextWriter(stream, threads=2)
+    writer.write(text)
+    writer.close()
+
+    data = stream.getvalue()
+    assert len(text) > 2 * bgzf_block_size
+    assert data.endswith(bgzf_eof) and len(bgzf_eof) == 28
+    assert gzip.decompress(data).decode() == text
+    assert bgzf.BgzfReader(fileobj=BytesIO(data), mode="rb").read(len(text)).decode() == text
@@ -0,0 +1,85 @@
+import sys
+import gzip
+import pytest
+from gfftoolbox.__main__ import main
+from gfftoolbox.overview import overview, parse_size
+from gfftoolbox.summary import gff_sample_summary, sample_min_blocks
+
+def run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["gff-toolbox"] + list(argv))
+    main()
+
+def test_parse_size():
+    assert parse_size("64M") == 64 * 1024 ** 2
+    assert parse_size("100k") == 100 * 1024
+    assert parse_size("512") == 512
+    assert parse_size("1X") is None
+
+def test_sample_without_seed(data, cache_dir, monkeypatch, capsys):
+
+    # Estimates without a seed are never cached, and must not need one
+    run(monkeypatch, "overview", "-i", data("Kp_ref.gff"), "--sample", "--format", "tsv")
+    out = capsys.readouterr().out
+    assert "Error" not in out
+    assert out.startswith("#section\tname\tstatistic\tvalue")
+    assert not cache_dir.exists()
+
+def test_sample_with_seed_is_cached(data, cache_dir, capsys):
+    overview(data("Kp_ref.gff"), format="json", sample=True, seed=7)
+    first = capsys.readouterr().out
+    assert len(list(cache_dir.iterdir())) == 1
+
+    overview(data("Kp_ref.gff"), format="json", sample=True, seed=7)
+    assert capsys.readouterr().out == first
+
+@pytest.mark.parametrize("opener", [open, gzip.open])
+def test_small_sample_has_intervals(data, tmp_path, opener):
+
+    # A budget under the largest block size is still split into blocks, so intervals can be given
+    path = tmp_path / "Kp_ref.gff.gz"
+    with open(data("Kp_ref.gff"), "rb") as plain, gzip.open(path, "wb") as packed:
+        packed.write(plain.read())
+
+    with opener(data("Kp_ref.gff") if opener is open else path, "rb") as handle:
+        summary = gff_sample_summary(handle, budget=100 * 1024, seed=3)
+    assert summary["sample"]["blocks"] >= sample_min_blocks
+    assert summary["sample"]["bytes"] < 200 * 1024
+    assert summary["features"]["low"] <= summary["features"]["estimate"] <= summary["features"]["high"]
+
+def test_exact_overview(data, capsys):
+    overview(data("Kp_ref_tRNA.gff"), format="tsv", statistics=True)
+    rows = [line.split("\t") for line in capsys.readouterr().out.splitlines()[1:]]
+    assert ["features", "all", "count", "62"] in rows
+    assert ["type", "tRNA", "strand_+", "35"] in rows
+    assert ["type", "tRNA", "strand_-", "27"] in rows
+
+def test_bad_format(data, capsys):
+    overview(data("Kp_ref.gff"), format="xml")
+    assert "Error: --format" in capsys.readouterr().out
+
+def test_limits_as_the_examiner(data):
+    from BCBio.GFF import GFFExaminer
+    from gfftoolbox.summary import gff_summary
+
+    # The default pass only counts the limits, the same the examiner gives
+    with open(data("Kp_ref.gff")) as handle:
+        expected = GFFExaminer().available_limits(handle)
+    with open(data("Kp_ref.gff"), "rb") as handle:
+        summary = gff_summary(handle)
+    assert summary["limits"] == expected
+    assert set(summary) == {"limits", "features", "malformed"}
+
+def test_statistics(data, capsys):
+    overview(data("Kp_ref_tRNA.gff"), format="text")
+    assert "Statistics" not in capsys.readouterr().out
+
+    overview(data("Kp_ref_tRNA.gff"), format="text", statistics=True)
+    assert "Statistics" in capsys.readouterr().out
+
+def test_statistics_in_parallel(data):
+    from gfftoolbox.summary import gff_summary
+    with open(data("Kp_ref.gff"), "rb") as handle:
+        single = gff_summary(handle, statistics=True)
+    with open(data("Kp_ref.gff"), "rb") as handle:
+        parallel = gff_summary(handle, threads=2, statistics=True)
+    assert single == parallel
@@ -0,0 +1,45 @@
+import gzip
+import shutil
+import pytest
+from BCBio import GFF
+from gfftoolbox.inputs import gzip_opener
+from gfftoolbox.plot import region_features
+
+def as_bcbio(path, contig, feature, start_nt, end_nt):
+
+    # What plot did before the index: the whole GFF parsed by BCBio, limited to the sequence and types
+    limit_info = dict(gff_id=[contig], gff_type=feature.split(','))
+    for rec in GFF.parse(gzip_opener(path, "rt"), limit_info=limit_info):
+        for f in rec.features:
+            if int(f.location.start) >= start_nt and int(f.location.end) <= end_nt:
+                yield int(f.location.start), int(f.location.end), f.location.strand, f.qualifiers
+
+def ordered(features):
+    return sorted(features, key=lambda f: (f[0], f[1], f[2], sorted(f[3].items())))
+
+@pytest.fixture(params=["plain", "gzip"])
+def kp(request, data, tmp_path):
+
+    # Plain GFFs are read through their index, gzipped ones are indexed on the fly
+    if request.param == "plain":
+        path = tmp_path / "Kp_ref.gff"
+        shutil.copy(data("Kp_ref.gff"), path)
+    else:
+        path = tmp_path / "Kp_ref.gff.gz"
+        with open(data("Kp_ref.gff"), "rb") as plain, gzip.open(path, "wb") as packed:
+            packed.write(plain.read())
+    return str(path)
+
+@pytest.mark.parametrize("contig, feature, start_nt, end_nt", [
+    ("NC_016845.1", "gene", 5900, 50000),
+    ("NC_016845.1", "gene,CDS", 0, 20000),
+    ("NC_016845.1", "tRNA,rRNA", 0, 6000000),
+    ("NC_016838.1", "CDS", 10000, 30000),
+    ("NC_016845.1", "gene", 1000000, 1000100),
+    ("missing", "gene", 0, 1000),
+])
+def test_region_features(kp, data, contig, feature, start_nt, end_nt):
+    features = ordered(region_features(kp, contig, feature, start_nt, end_nt))
+    assert features == ordered(as_bcbio(data("Kp_ref.gff"), contig, feature, start_nt, end_nt))
+    if contig != "missing" and end_nt - start_nt > 1000:
+        assert len(features) > 0
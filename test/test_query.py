@@ -0,0 +1,37 @@
+from gfftoolbox.features import _split_attributes
+from gfftoolbox.query import region_query, attribute_query, dict_to_att, feature_to_gff
+
+feature = {"recid": "chr1", "source": "RefSeq", "type": "CDS", "start": 100, "end": 400, "score": ".", "strand": "+", "phase": "0",
+           "attributes": {"ID": "cds-1", "Parent": ["gene-1", "gene-2"], "product": "flavodoxin (FldA)",
+                          "Dbxref": [{"DBTAG": "GeneID", "ID": "7"}, {"DBTAG": "GO", "ID": "GO:0006810", "Description": "transport"}]}}
+
+def test_region_query():
+
+    # Features overlapping [start, end], each bound only when given
+    assert region_query() == {}
+    assert region_query("chr1") == {"recid": "chr1"}
+    assert region_query("chr1", "10", "20") == {"recid": "chr1", "start": {"$lte": 20}, "end": {"$gte": 10}}
+    assert region_query("chr1", start=10) == {"recid": "chr1", "end": {"$gte": 10}}
+    assert region_query(start=10, end=20) == {}
+
+def test_attribute_query():
+
+    # Database references are matched by DBTAG and ID, other values as they are
+    assert attribute_query(" gbkey = CDS ;product=a=b") == {"attributes.gbkey": "CDS", "attributes.product": "a=b"}
+    assert attribute_query("Dbxref=GO:GO:0006810;Ontology_term=GO:1") == {
+        "attributes.Dbxref": {"$elemMatch": {"DBTAG": "GO", "ID": "GO:0006810"}},
+        "attributes.Ontology_term": {"$elemMatch": {"DBTAG": "GO", "ID": "1"}},
+    }
+    assert attribute_query("Dbxref=nocolon") == {"attributes.Dbxref": "nocolon"}
+
+def test_feature_to_gff():
+    assert feature_to_gff(feature) == ("chr1\tRefSeq\tCDS\t100\t400\t.\t+\t0\t"
+                                       "ID=cds-1;Parent=gene-1,gene-2;product=flavodoxin (FldA);Dbxref=GeneID:7,GO:GO:0006810\n")
+
+def test_dict_to_att_encoding():
+
+    # Values with the GFF3 reserved characters are percent encoded, and read back as they were
+    attributes = {"Note": "a;b=c,d&e\tf", "product": ["x,y", "z"], "gene": "already%2Cencoded"}
+    column = dict_to_att(attributes)
+    assert column == "Note=a%3Bb%3Dc%2Cd%26e%09f;product=x%2Cy,z;gene=already%2Cencoded"
+    assert _split_attributes(column) == {"Note": ["a;b=c,d&e\tf"], "product": ["x,y", "z"], "gene": ["already,encoded"]}
@@ -0,0 +1,64 @@
+import os
+import gzip
+import shutil
+import pytest
+from gfftoolbox.tabix import read_tabix, region_chunks, tabix_lines, tabix_index_path
+
+# Kp_ref_genes.gff.gz: gene lines of Kp_ref.gff (ID and Name only), bgzipped and indexed
+# with htslib ('tabix -p gff', and 'tabix -p gff --csi' for the .csi)
+seqids = ["NC_016845.1", "NC_016838.1", "NC_016846.1", "NC_016839.1", "NC_016840.1", "NC_016847.1", "NC_016841.1"]
+
+@pytest.fixture(params=[".tbi", ".csi"])
+def indexed(request, data, tmp_path):
+
+    # Only one of the indexes, newer than the GFF as tabix wants it
+    path = tmp_path / "genes.gff.gz"
+    shutil.copy(data("Kp_ref_genes.gff.gz"), path)
+    shutil.copy(data("Kp_ref_genes.gff.gz" + request.param), str(path) + request.param)
+    os.utime(path, (1, 1))
+    return str(path)
+
+def naive(path, wanted, start=None, end=None):
+    with gzip.open(path, "rt") as handle:
+        lines = [line for line in handle if not line.startswith("#")]
+    return [line for seqid in wanted for line in lines if line.split("\t")[0] == seqid and
+            (start is None or int(line.split("\t")[4]) >= start) and (end is None or int(line.split("\t")[3]) <= end)]
+
+def test_read_tabix(indexed):
+    index = read_tabix(tabix_index_path(indexed))
+    assert list(index["seqids"]) == seqids
+    assert index["csi"] == tabix_index_path(indexed).endswith(".csi")
+    assert index["meta"] == "#"
+
+def test_old_index_ignored(indexed):
+
+    # An index older than the GFF is not trusted
+    os.utime(indexed, (2**31, 2**31))
+    assert tabix_index_path(indexed) is None
+
+def test_region_chunks(indexed):
+    index = read_tabix(tabix_index_path(indexed))
+    assert region_chunks(index, "missing", 1, 100)[0] == []
+
+    chunks = region_chunks(index, "NC_016845.1", 100000, 200000)[0]
+    assert len(chunks) > 0
+    assert all(chunk_beg < chunk_end for chunk_beg, chunk_end in chunks)
+    assert all(previous[1] < following[0] for previous, following in zip(chunks, chunks[1:]))
+
+@pytest.mark.parametrize("wanted, start, end", [
+    (["NC_016845.1"], 100000, 200000),
+    (["NC_016845.1"], 1000000, 1490000),
+    (["NC_016845.1"], None, None),
+    (["NC_016838.1"], 1, 5000),
+    (["NC_016838.1", "NC_016841.1", "NC_016845.1"], 1, 30000),
+    (["NC_016845.1"], 9000000, 9000100),
+    (["missing"], 1, 100),
+])
+def test_tabix_lines(indexed, wanted, start, end):
+
+    # The header, then every line of the wanted sequences overlapping the region, in the order asked
+    lines = list(tabix_lines(indexed, wanted, start=start, end=end))
+    assert lines[0] == "##gff-version 3\n"
+    assert lines[1:] == naive(indexed, wanted, start, end)
+    if wanted == ["NC_016845.1"] and start == 100000:
+        assert len(lines) > 50
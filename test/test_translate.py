@@ -0,0 +1,35 @@
+import random
+import warnings
+import pytest
+from Bio import BiopythonWarning
+from Bio.Seq import Seq
+from gfftoolbox.translate import translate_batch
+
+def biopython(sequences, table):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", BiopythonWarning)
+        return [str(Seq(sequence).translate(table=table)) for sequence in sequences]
+
+@pytest.mark.parametrize("table", [1, 2, 4, 11, 25])
+def test_same_as_biopython(table):
+
+    # Ambiguous codons, lower case and partial trailing codons, in several codon tables
+    random.seed(table)
+    sequences = ["".join(random.choice("ACGTacgtNRYKMSWnry") for n in range(random.randint(0, 200))) for m in range(50)]
+    sequences += ["ATGTGAAGAAGGTAG", "atgtgaagaaggtag", "ATGNNNRAYTTY", "ATGCA", "", "TGANNN"]
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", BiopythonWarning)
+        assert translate_batch(sequences, table) == biopython(sequences, table)
+
+def test_partial_codon_warning():
+
+    # A partial trailing codon warns as Biopython does, whole codons don't
+    with pytest.warns(BiopythonWarning):
+        assert translate_batch(["ATGCA"], 11) == ["M"]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert translate_batch(["ATGTAA"], 11) == ["M*"]
+
+def test_empty_batch():
+    assert translate_batch([], 11) == []
@@ -0,0 +1,59 @@
+import io
+import sys
+import random
+from io import BytesIO
+from Bio.Seq import reverse_complement
+from gfftoolbox import twobit
+
+def test_pack_slices(monkeypatch):
+
+    # N and soft-masked runs across slice boundaries are joined back, as when packed at once
+    random.seed(5)
+    sequences = {"chr1": "".join(random.choice("ACGTacgtNn") for n in range(1001)) + "N" * 50 + "acgt" * 30,
+                 "chr2": "ACGTN", "empty": ""}
+    whole = [(name,) + twobit.pack_sequence(name, seq) for name, seq in sequences.items()]
+
+    monkeypatch.setattr(twobit, "pack_slice_size", 12)
+    output = BytesIO()
+    twobit.write_twobit([(name,) + twobit.pack_sequence(name, seq) for name, seq in sequences.items()], output)
+
+    at_once = BytesIO()
+    twobit.write_twobit(whole, at_once)
+    assert output.getvalue() == at_once.getvalue()
+
+    genome = twobit.TwoBitGenome(output.getvalue())
+    assert {name: genome.fetch(name) for name in genome} == sequences
+    assert genome.fetch("chr1", 7, 1040) == sequences["chr1"][7:1040]
+
+def test_fetch_reverse_complement():
+
+    # N runs and soft-masked bases come back complemented, reversed and in their case
+    sequence = "ACGTNNNNacgtnnGGccAAtt" * 7 + "TTAGNac"
+    output = BytesIO()
+    twobit.write_twobit([("chr1",) + twobit.pack_sequence("chr1", sequence)], output)
+    genome = twobit.TwoBitGenome(output.getvalue())
+
+    assert genome.fetch_reverse_complement("chr1") == reverse_complement(sequence)
+    assert genome.fetch_reverse_complement("chr1", 3, 61) == reverse_complement(sequence[3:61])
+    assert twobit.reverse_complement("ACGTRYSWKMBDHVNacgtrykmn") == reverse_complement("ACGTRYSWKMBDHVNacgtrykmn")
+
+def test_stdin_not_packable(monkeypatch, capsys):
+
+    # Stdin is read once: a fasta that can't be packed is still fetched, through its copy
+    fasta = ">chr1 first\nACGTRACGTN\n>chr2\nacgtACGT\n"
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BufferedReader(io.BytesIO(fasta.encode()))))
+    with twobit.genome_opener("stdin", twobit=True) as genome:
+        assert genome.fetch("chr1", 2, 9) == "GTRACGT"
+        assert genome.fetch("chr2") == "acgtACGT"
+    assert "Warning:" in capsys.readouterr().err
+
+def test_stdin_packed(monkeypatch, tmp_path):
+
+    # A packable fasta on stdin is packed in memory, nothing is written next to the copy
+    fasta = ">chr1\nACGTNNacgt\n"
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BufferedReader(io.BytesIO(fasta.encode()))))
+    monkeypatch.setattr(twobit.tempfile, "tempdir", str(tmp_path))
+    with twobit.genome_opener("stdin", twobit=True) as genome:
+        assert isinstance(genome, twobit.TwoBitGenome)
+        assert genome.fetch_reverse_complement("chr1", 1, 9) == reverse_complement("CGTNNacg")
+    assert not list(tmp_path.glob("*" + twobit.twobit_suffix))